@@ -0,0 +1,128 @@
+# time alignment of replicates before averaging (ignition time scatter smears averaged peaks)
+#
+#   python Alignment.py Cone_50kW_hor Cone_60kW_hor          shifts of the cone replicates (ignition)
+#   python Alignment.py Cone_50kW_hor --method xcorr --max-shift 60
+#
+# Replicates are aligned within groups (a set or a condition). All groups are stacked
+# into one (group x replicate x time) array on a common grid:
+#   xcorr     the shift of each replicate is the lag of the maximum of its cross-correlation
+#             with the mean of the group, computed for all replicates of all groups with one
+#             FFT; the mean is rebuilt from the aligned replicates until no shift changes
+#   ignition  the shift is the time the curve first reaches a threshold (e.g. HRR >= 24 kW/m2)
+# The cross-correlation needs replicates of similar shape: cone replicates whose peaks differ
+# in height can be registered on the wrong peak, they are aligned on their ignition time.
+# Shifts are whole grid steps, centered on the median of the group (aligned x = x - shift),
+# so aligned replicates stay on the grid of the running statistics (Streaming.py).
+from __future__ import annotations
+
+import argparse
+
+from Lazy import lazy_import
+
+np = lazy_import("numpy")
+
+
+METHODS = ("xcorr", "ignition")
+ITERATIONS = 10
+
+
+def _stack(groups, step:float):
+    """(group x replicate x point) values (0 where missing), mask of the values and first grid index"""
+    index = [[np.rint(np.asarray(x, dtype=np.float64) / step).astype(np.int64) for x, _ in g] for g in groups]
+    lo = min(i.min() for g in index for i in g if len(i))
+    hi = max(i.max() for g in index for i in g if len(i))
+    size = (len(groups), max(len(g) for g in groups), hi - lo + 1)
+    values, mask = np.zeros(size), np.zeros(size, dtype=bool)
+    for s, (g, gi) in enumerate(zip(groups, index)):
+        for r, ((_, y), i) in enumerate(zip(g, gi)):
+            y = np.asarray(y, dtype=np.float64)
+            ok = ~np.isnan(y)
+            values[s, r, i[ok] - lo], mask[s, r, i[ok] - lo] = y[ok], True
+    return values, mask, lo
+
+
+def _centered(shifts, replicates):
+    """Shifts relative to the median shift of their group (0 for the padding replicates)"""
+    shifts = np.where(replicates, shifts, np.nan)
+    with np.errstate(invalid='ignore'):
+        median = np.rint(np.nanmedian(shifts, axis=1, keepdims=True))
+    return np.where(replicates, shifts - median, 0).astype(np.int64)
+
+
+def _shifted_mean(values, mask, shifts):
+    """Mean of each group after moving replicate r by -shifts[s, r] points"""
+    t = np.arange(values.shape[-1]) + shifts[..., None]
+    inside = (t >= 0) & (t < values.shape[-1])
+    t = np.clip(t, 0, values.shape[-1] - 1)
+    v = np.where(inside, np.take_along_axis(values, t, axis=-1), 0.0)
+    n = np.where(inside, np.take_along_axis(mask, t, axis=-1), False)
+    return v.sum(axis=1) / np.maximum(n.sum(axis=1), 1)
+
+
+def xcorr_shifts(values, mask, max_shift:int=None, iterations:int=ITERATIONS):
+    """Shifts (grid points) maximizing the cross-correlation with the iteratively aligned group mean"""
+    points = values.shape[-1]
+    size = 2 * points   # zero padding, the correlation is not circular
+    spectra = np.fft.rfft(values, size, axis=-1)
+    lags = np.arange(size)
+    lags[lags > size // 2] -= size
+    allowed = np.abs(lags) <= (points - 1 if max_shift is None else max_shift)
+    replicates = mask.any(axis=-1)
+    shifts = np.zeros(values.shape[:2], dtype=np.int64)
+    for _ in range(iterations):
+        reference = np.fft.rfft(_shifted_mean(values, mask, shifts), size, axis=-1)
+        correlation = np.fft.irfft(spectra * np.conj(reference)[:, None], size, axis=-1)
+        new = _centered(lags[np.argmax(np.where(allowed, correlation, -np.inf), axis=-1)], replicates)
+        if np.array_equal(new, shifts):
+            break
+        shifts = new
+    return shifts
+
+
+def threshold_shifts(values, mask, threshold:float):
+    """Shifts (grid points) of the first value >= threshold (0 for replicates that never reach it)"""
+    above = mask & (values >= threshold)
+    return _centered(np.argmax(above, axis=-1), above.any(axis=-1))
+
+
+def align(groups, step:float=1, method:str="xcorr", threshold:float=None, max_shift:float=None):
+    """
+    Time shifts of the replicates of each group.
+
+    Parameters
+    ----------
+    groups : list of list of (x, y)
+        Replicates of each group, x on multiples of `step`
+    method : str
+        'xcorr' (cross-correlation with the group mean) or 'ignition' (first y >= threshold)
+    max_shift : float, optional
+        Largest shift considered by 'xcorr' (x units)
+
+    Returns
+    -------
+    list of numpy.ndarray
+        Shifts of the replicates of each group (x units, multiples of step);
+        the aligned replicate is x - shift
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown alignment {method}, use {METHODS}")
+    values, mask, _ = _stack(groups, step)
+    if method == "xcorr":
+        shifts = xcorr_shifts(values, mask, None if max_shift is None else int(max_shift / step))
+    else:
+        if threshold is None:
+            raise ValueError("alignment on the ignition time needs a threshold")
+        shifts = threshold_shifts(values, mask, threshold)
+    return [shifts[s, :len(g)] * step for s, g in enumerate(groups)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time shifts of cone replicates (FFT cross-correlation or ignition)")
+    parser.add_argument("series", nargs="+", help="sets or conditions, e.g. Cone_50kW_hor")
+    parser.add_argument("--method", default="ignition", choices=METHODS)
+    parser.add_argument("--max-shift", type=float, help="largest shift of xcorr (s)")
+    args = parser.parse_args()
+
+    from Cone_functions import cone_shifts
+    for path, shift in cone_shifts(args.series, args.method, max_shift=args.max_shift).items():
+        print(f"{path.stem:60s} {shift:8.0f} s")
@@ -0,0 +1,207 @@
+# single-file, chunked and compressed archive of all data series
+#
+#   python Archive.py export macfp_data.zip           snapshot of all data collections
+#   python Archive.py read macfp_data.zip PMMA/Calibration_Data/TIFP_TGA_N2_10K_1 --x Temp --range 400 900
+#
+# The archive is a zip file in the Zarr v2 layout (one group per experiment, the
+# values as one 2D array with row chunks, each chunk zlib compressed), so it can
+# also be opened with zarr.ZipStore where zarr is installed. Every chunk stores
+# the min/max of each column in the array attributes, so a slice like T > 400 K
+# only decompresses the chunks that overlap the range.
+import argparse
+import json
+import zipfile
+import zlib
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from Lazy import lazy_import
+from Store import ROOTS, data_files, parse_path, read_file
+from Utils import PROJECT_ROOT, SCRIPT_DIR
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+ARCHIVE_FILE = SCRIPT_DIR / "macfp_data.zip"
+CHUNK_ROWS = 2048
+
+
+def _json(obj):
+    return json.dumps(obj, indent=1, allow_nan=True).encode()
+
+
+def export(archive_file:Path=ARCHIVE_FILE, roots=ROOTS, chunk_rows:int=CHUNK_ROWS, level:int=5):
+    """
+    Write all data files of `roots` to one archive, one group per file
+    ({material}/{collection}/{stem}) with the metadata from the file name as attributes.
+
+    Returns the number of exported files.
+    """
+    files = data_files(roots)
+    with zipfile.ZipFile(archive_file, "w", compression=zipfile.ZIP_STORED) as zf:
+        zf.writestr(".zgroup", _json({"zarr_format": 2}))
+        groups = set()
+        for path in files:
+            meta = parse_path(path)
+            group = f"{meta['material']}/{meta['collection']}/{path.stem}"
+            for parent in (meta["material"], f"{meta['material']}/{meta['collection']}"):
+                if parent not in groups:
+                    zf.writestr(f"{parent}/.zgroup", _json({"zarr_format": 2}))
+                    groups.add(parent)
+            names, units, values = read_file(path)
+            n_rows, n_cols = values.shape
+
+            chunks = max(1, -(-n_rows // chunk_rows))
+            ranges = []
+            for k in range(chunks):
+                block = values[k * chunk_rows:(k + 1) * chunk_rows]
+                # edge chunks are padded to the full chunk shape with the fill value
+                padded = np.full((chunk_rows, n_cols), np.nan)
+                padded[:len(block)] = block
+                zf.writestr(f"{group}/data/{k}.0", zlib.compress(padded.tobytes(order="C"), level))
+                with np.errstate(invalid="ignore"):
+                    ranges.append([[float(np.nanmin(c)) if np.isfinite(c).any() else None,
+                                    float(np.nanmax(c)) if np.isfinite(c).any() else None]
+                                   for c in block.T])
+
+            zf.writestr(f"{group}/.zgroup", _json({"zarr_format": 2}))
+            zf.writestr(f"{group}/.zattrs", _json(dict(meta, path=path.relative_to(PROJECT_ROOT).as_posix())))
+            zf.writestr(f"{group}/data/.zarray", _json({
+                "zarr_format": 2, "shape": [n_rows, n_cols], "chunks": [chunk_rows, n_cols],
+                "dtype": "<f8", "compressor": {"id": "zlib", "level": level},
+                "fill_value": "NaN", "order": "C", "filters": None,
+            }))
+            zf.writestr(f"{group}/data/.zattrs", _json({"columns": names, "units": units, "chunk_ranges": ranges}))
+    return len(files)
+
+
+class Archive:
+    """
+    Read access to an archive written by export().
+
+    Instances can be passed to worker processes (each process reopens the file).
+    """
+
+    def __init__(self, archive_file:Path=ARCHIVE_FILE):
+        self.archive_file = Path(archive_file)
+        self._zf = zipfile.ZipFile(self.archive_file, "r")
+
+    def __getstate__(self):
+        return {"archive_file": self.archive_file}
+
+    def __setstate__(self, state):
+        self.__init__(state["archive_file"])
+
+    def close(self):
+        self._zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _load_json(self, name):
+        return json.loads(self._zf.read(name))
+
+    def groups(self):
+        """Names of all experiment groups"""
+        return sorted(n[:-len("/data/.zarray")] for n in self._zf.namelist() if n.endswith("/data/.zarray"))
+
+    def attrs(self, group:str):
+        """Metadata of an experiment (parsed from its file name)"""
+        return self._load_json(f"{group}/.zattrs")
+
+    def catalog(self):
+        """Metadata of all experiments, indexed by group"""
+        groups = self.groups()
+        return pd.DataFrame([self.attrs(g) for g in groups], index=pd.Index(groups, name="group"))
+
+    def columns(self, group:str):
+        return self._load_json(f"{group}/data/.zattrs")["columns"]
+
+    def read(self, group:str, x:str=None, lo:float=-float("inf"), hi:float=float("inf"), columns=None):
+        """
+        Values of an experiment, optionally only the rows with lo <= x <= hi.
+        Only chunks whose range of `x` overlaps [lo, hi] are decompressed.
+
+        Parameters
+        ----------
+        group : str
+            Experiment group, e.g. 'Wood/Calibration_Data/FSRI_Wood_TGA_N2_10K_R1'
+        x : str, optional
+            Column to select rows by, e.g. 'Temperature (K)' or 'Time (s)'
+        lo, hi : float
+            Range of `x`
+        columns : list[str], optional
+            Columns to return (all if None)
+
+        Returns
+        -------
+        pandas.DataFrame
+        """
+        meta = self._load_json(f"{group}/data/.zarray")
+        attrs = self._load_json(f"{group}/data/.zattrs")
+        names = attrs["columns"]
+        n_rows, n_cols = meta["shape"]
+        chunk_rows = meta["chunks"][0]
+        if columns is None:
+            columns = names
+        missing = [c for c in list(columns) + ([x] if x else []) if c not in names]
+        if missing:
+            raise ValueError(f"Columns {missing} not in {group}")
+        ix = names.index(x) if x else None
+
+        blocks = []
+        for k, ranges in enumerate(attrs["chunk_ranges"]):
+            if ix is not None:
+                low, high = ranges[ix]
+                if low is None or high < lo or low > hi:
+                    continue
+            raw = zlib.decompress(self._zf.read(f"{group}/data/{k}.0"))
+            block = np.frombuffer(raw, dtype="<f8").reshape(chunk_rows, n_cols)
+            block = block[:min(chunk_rows, n_rows - k * chunk_rows)]
+            if ix is not None:
+                block = block[(block[:, ix] >= lo) & (block[:, ix] <= hi)]
+            blocks.append(block)
+
+        values = np.concatenate(blocks) if blocks else np.empty((0, n_cols))
+        df = pd.DataFrame(values, columns=names)
+        return df[list(columns)]
+
+
+def _read_one(args):
+    archive, group, kwargs = args
+    return archive.read(group, **kwargs)
+
+
+def read_many(archive_file:Path, groups, workers:int=4, **kwargs):
+    """Read several experiments in a process pool (same arguments as Archive.read)"""
+    archive = Archive(archive_file)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(_read_one, [(archive, g, kwargs) for g in groups]))
+    archive.close()
+    return dict(zip(groups, frames))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunked, compressed archive of all data series")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="write a snapshot of all data collections")
+    p_export.add_argument("archive", nargs="?", default=str(ARCHIVE_FILE))
+    p_export.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    p_read = sub.add_parser("read", help="print (a slice of) one experiment")
+    p_read.add_argument("archive")
+    p_read.add_argument("group")
+    p_read.add_argument("--x", help="column to slice by")
+    p_read.add_argument("--range", nargs=2, type=float, default=[-float("inf"), float("inf")])
+    args = parser.parse_args()
+
+    if args.command == "export":
+        n = export(Path(args.archive), chunk_rows=args.chunk_rows)
+        print(f"{n} files exported to {args.archive} ({Path(args.archive).stat().st_size / 2**20:.1f} MiB)")
+    else:
+        with Archive(Path(args.archive)) as archive:
+            print(archive.read(args.group, args.x, *args.range))
@@ -0,0 +1,45 @@
+# data availability overview: number of files for any combination of the name fields
+#
+#   python Availability.py                                                  institutes x devices
+#   python Availability.py --columns atmosphere,heating_rate --where device=TGA material=Wood
+#   python Availability.py --rows device --columns flux,orientation --format latex -o cone.tex
+#   python Availability.py --db macfp_data.sqlite --rows collection,institute    (all collections of the store)
+import argparse
+
+from pathlib import Path
+
+from Utils import DATA_DIR, device_data, catalog, availability_table, render_table
+
+
+def _fields(text:str):
+    return [f.strip() for f in text.split(",") if f.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Number of data files per institute, device, condition, ...")
+    parser.add_argument("--rows", default="institute", help="comma separated fields, e.g. institute,material")
+    parser.add_argument("--columns", default="device", help="comma separated fields, e.g. atmosphere,heating_rate")
+    parser.add_argument("--where", nargs="*", default=[], help="field=value (value1,value2 for any of)")
+    parser.add_argument("--format", default="console", choices=["console", "csv", "latex"])
+    parser.add_argument("--names", action="store_true", help="institute names instead of their codes")
+    parser.add_argument("--db", help="experiments of a Store.py database instead of the files of the data directory")
+    parser.add_argument("--output", "-o", help="file to write the table to (default: print it)")
+    args = parser.parse_args()
+
+    if args.db:
+        from Store import connect, find
+        with connect(Path(args.db)) as con:
+            cat = find(con)
+    else:
+        cat = catalog(device_data(DATA_DIR, ""))
+    select = {k: v.split(",") for k, v in (w.split("=", 1) for w in args.where)}
+    try:
+        table = availability_table(cat, _fields(args.rows), _fields(args.columns), codes=not args.names, **select)
+    except ValueError as e:
+        parser.error(str(e))
+
+    text = render_table(table, args.format)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        print(text)
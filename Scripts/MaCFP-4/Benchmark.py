@@ -0,0 +1,176 @@
+# runtime and peak memory of the analysis kernels on synthetic data of a given scale
+#
+#   python Benchmark.py --institutes 100 --conditions 20 --replicates 10
+#
+# Results are appended as one JSON line per run to benchmark_results.jsonl
+# (keyed by git commit and scale), so runs of different commits can be compared.
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+from Synthetic_data import write_dataset
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+RESULTS_FILE = SCRIPT_DIR / "benchmark_results.jsonl"
+SCRIPTS = ['TGA_analysis.py', 'MCC_analysis.py', 'DSC_analysis.py', 'Cone_analysis.py']
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def measure(func, repeat:int=3):
+    """Best wall time of `repeat` calls and the peak traced memory of one call"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': min(times), 'peak_MiB': peak / 2**20}
+
+
+def kernels(repeat:int):
+    """Time the kernels on the data tree in MACFP_DATA_DIR (imported here, after it is set)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    from Utils import interpolation, make_institution_table, get_series_names
+    from Readers import read_series, stream_resample
+    from Screening import screen
+    from TGA_functions import TGA_Data, TGA_columns, Calculate_dm_dt, average_tga_series
+    from MCC_functions import MCC_Data, MCC_columns, average_MCC_series
+    from MCC_functions import calculate_int_HRR as calculate_int_HRR_MCC
+    from DSC_functions import DSC_Data, DSC_columns, Integral_DSC, average_dsc_series
+    from Cone_functions import Cone_Data, Cone_columns, average_cone_series
+    from Cone_functions import calculate_int_HRR as calculate_int_HRR_cone
+
+    tga = read_series(TGA_Data[0], TGA_columns)
+    mcc = read_series(MCC_Data[0], MCC_columns)
+    dsc = read_series(DSC_Data[0], DSC_columns)
+    cone = read_series(Cone_Data[0], Cone_columns)
+    tga_series = get_series_names(TGA_Data)[0].split('_', 1)[1]
+    mcc_series = get_series_names(MCC_Data)[0].split('_', 1)[1]
+    dsc_series = get_series_names(DSC_Data)[0].split('_', 1)[1]
+    cone_series = get_series_names(Cone_Data)[0].split('_', 1)[1]
+    heating_rates = sorted({p.stem.split('_')[4] for p in TGA_Data})
+
+    def figure():
+        fig, ax = plt.subplots(figsize=(6, 4))
+        for path in TGA_Data[:50]:
+            df = read_series(path, TGA_columns)
+            ax.plot(df['Temperature (K)'], df['Mass (mg)'], lw=0.8)
+        fig.savefig(io.BytesIO(), format='png', dpi=300)
+        plt.close(fig)
+
+    cases = {
+        'read_series': lambda: read_series(TGA_Data[0], TGA_columns),
+        'stream_resample': lambda: stream_resample(Cone_Data[0], 'Time (s)', 1, Cone_columns),
+        'interpolation': lambda: interpolation(tga),
+        'Calculate_dm_dt': lambda: Calculate_dm_dt(tga),
+        'calculate_int_HRR (MCC)': lambda: calculate_int_HRR_MCC(mcc),
+        'calculate_int_HRR (Cone)': lambda: calculate_int_HRR_cone(cone),
+        'Integral_DSC': lambda: Integral_DSC(dsc),
+        'average_tga_series': lambda: average_tga_series(tga_series),
+        'average_MCC_series': lambda: average_MCC_series(mcc_series),
+        'average_dsc_series': lambda: average_dsc_series(dsc_series),
+        'average_cone_series': lambda: average_cone_series(cone_series),
+        'make_institution_table': lambda: make_institution_table(TGA_Data, ['Wood'], ['N2', 'O2-21'], heating_rates),
+        'screen': lambda: screen(TGA_Data + MCC_Data + DSC_Data + Cone_Data),
+        'figure (300 dpi)': figure,
+    }
+    results = {}
+    for name, func in cases.items():
+        results[name] = measure(func, repeat)
+        print(f"{name:28s} {results[name]['seconds']:9.4f} s {results[name]['peak_MiB']:9.1f} MiB")
+    return results
+
+
+def scripts(data_dir:Path, work_dir:Path):
+    """
+    Wall time and peak RSS of the complete analysis scripts (figures are written below work_dir).
+
+    The scripts average fixed series (e.g. Wood_MCC_N2_30K), so they only run through
+    on synthetic data with enough conditions to contain them (--conditions 20).
+    """
+    # the scripts write to ../../../matl-db-organizing-committee/SCRIPT_FIGURES relative to cwd
+    cwd = work_dir / 'a' / 'b' / 'c'
+    cwd.mkdir(parents=True, exist_ok=True)
+    env = dict(os.environ, MACFP_DATA_DIR=str(data_dir), MPLBACKEND='Agg',
+               PYTHONPATH=os.pathsep.join(filter(None, [str(SCRIPT_DIR), os.environ.get('PYTHONPATH')])))
+    results = {}
+    for script in SCRIPTS:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, str(SCRIPT_DIR / script)], cwd=cwd, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # wait4 gives the resource usage of this child only (ru_maxrss in KiB on Linux)
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - t0
+        returncode = os.waitstatus_to_exitcode(status)
+        results[script] = {'seconds': seconds, 'peak_MiB': usage.ru_maxrss / 1024, 'returncode': returncode}
+        print(f"{script:28s} {seconds:9.4f} s {usage.ru_maxrss / 1024:9.1f} MiB (exit {returncode})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MaCFP-4 analysis on synthetic data")
+    parser.add_argument('--institutes', '-i', type=int, default=10)
+    parser.add_argument('--conditions', '-c', type=int, default=4)
+    parser.add_argument('--replicates', '-r', type=int, default=3)
+    parser.add_argument('--cone-frequency', type=float, default=1.0, help="cone sample rate (Hz)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scripts', action='store_true', help="also run the complete analysis scripts")
+    parser.add_argument('--data', help="existing data tree instead of a generated one")
+    parser.add_argument('--output', '-o', default=str(RESULTS_FILE))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='macfp_bench_') as tmp:
+        tmp = Path(tmp)
+        data_dir = Path(args.data) if args.data else tmp / 'data'
+        if not args.data:
+            t0 = time.perf_counter()
+            files = write_dataset(data_dir, args.institutes, args.conditions, args.replicates,
+                                  cone_frequency=args.cone_frequency)
+            print(f"{len(files)} synthetic files in {time.perf_counter() - t0:.1f} s")
+        os.environ['MACFP_DATA_DIR'] = str(data_dir)
+        # measure the computation, not reads of the cache of derived series (Cache.py)
+        os.environ['MACFP_CACHE'] = '0'
+
+        record = {
+            'commit': git_commit(),
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'scale': {'institutes': args.institutes, 'conditions': args.conditions,
+                      'replicates': args.replicates, 'cone_frequency': args.cone_frequency,
+                      'data': args.data},
+            'python': sys.version.split()[0],
+            'kernels': kernels(args.repeat),
+        }
+        if args.scripts:
+            record['scripts'] = scripts(data_dir, tmp / 'work')
+
+    with open(args.output, 'a') as fh:
+        fh.write(json.dumps(record) + '\n')
+    print(f"results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# bootstrap confidence intervals over replicates (whole replicates are resampled, not points)
+#
+#   python Bootstrap.py TGA Wood_Pekin_TGA_N2_10K      percentile CI of the averaged curves of a set
+#   python Bootstrap.py MCC --sets                     percentile CI of the values of every set
+#   python Bootstrap.py TGA Wood_Pekin_TGA_N2_10K -B 20000 --seed 1 --level 0.9 -o ci.csv
+#
+# A bootstrap sample draws n of the n replicates with replacement, i.e. a vector of
+# how often each replicate is drawn; B samples are a (B x n) matrix of counts. The
+# averaged curves (mean of all values in rows i-w..i+w, Streaming.py) are the ratio of
+# two sums that are linear in the replicates, so the curves of all B samples are two
+# matrix products with the per replicate window sums and numbers of values. The grid is
+# processed in blocks of at most MAX_ELEMENTS / B points, which bounds the memory for
+# any B. The counts depend only on the seed, B and n, so results are reproducible.
+from __future__ import annotations
+
+import argparse
+
+from Lazy import lazy_import
+from Utils import GRID_STEP, render_table, series_paths
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+SAMPLES = 2000
+LEVEL = 0.95
+SEED = 0
+MAX_ELEMENTS = 2**22   # bootstrap estimates held at once (32 MiB)
+
+# averaged curves per device: grid column and step, window (rows on each side) and
+# the replicate columns pooled into each averaged column, as the average_*_series
+CURVES = {
+    "TGA": ("Temperature (K)", GRID_STEP, 2,
+            {'Normalized Mass': ['Normalized mass'], 'MLR (1/s)': ['dm/dt', 'dm/dt unfiltered']}),
+    "MCC": ("Temperature (K)", GRID_STEP, 0,
+            {'HRR (W/g)': ['HRR (W/g)'], 'int HRR': ['Int HRR']}),
+    "DSC": ("Temperature (K)", GRID_STEP, 2,
+            {'Heat Flow Rate (W/g)': ['Heat Flow Rate (W/g)'], 'Int Heat Flow (J/g)': ['Int Heat Flow (J/g)']}),
+    "Cone": ("Time (s)", 1, 2,
+             {'HRR (kW/m2)': ['HRR (kW/m2)']}),
+}
+
+
+def resample_counts(n:int, samples:int=SAMPLES, seed:int=SEED):
+    """(samples x n) number of times each of n replicates is drawn in each bootstrap sample"""
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, n, size=(samples, n)) + n * np.arange(samples)[:, None]
+    return np.bincount(index.ravel(), minlength=samples * n).reshape(samples, n).astype(np.float64)
+
+
+def percentiles(samples, q):
+    """Percentiles q (linear interpolation) along the first axis without NaN, NaN where all are"""
+    ordered = np.sort(samples, axis=0)   # NaN last
+    valid = (~np.isnan(samples)).sum(axis=0)
+    last = np.maximum(valid - 1, 0)
+    result = []
+    for p in q:
+        position = p * last
+        lo = np.floor(position).astype(np.int64)
+        hi = np.minimum(lo + 1, last)
+        v_lo = np.take_along_axis(ordered, lo[None], axis=0)[0]
+        v_hi = np.take_along_axis(ordered, hi[None], axis=0)[0]
+        result.append(np.where(valid > 0, v_lo + (position - lo) * (v_hi - v_lo), np.nan))
+    return result
+
+
+def ratio_ci(counts, numerator, denominator, level:float=LEVEL, max_elements:int=MAX_ELEMENTS):
+    """
+    Percentile interval of sum(c * numerator) / sum(c * denominator) over the bootstrap
+    samples (rows of `counts`), for every column of the (replicate x point) arrays
+    """
+    samples, points = len(counts), numerator.shape[1]
+    block = max(1, max_elements // samples)
+    low, high = np.full(points, np.nan), np.full(points, np.nan)
+    q = ((1 - level) / 2, (1 + level) / 2)
+    for start in range(0, points, block):
+        cols = slice(start, start + block)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            estimates = (counts @ numerator[:, cols]) / (counts @ denominator[:, cols])
+        low[cols], high[cols] = percentiles(estimates, q)
+    return low, high
+
+
+def ensemble(frames, key:str, step:float, quantities:dict):
+    """
+    Grid points of any replicate and, per quantity, the sum and number of the
+    values of its columns of each replicate at each point (replicate x point)
+    """
+    index = [np.rint(f[key].to_numpy(dtype=np.float64) / step).astype(np.int64) for f in frames]
+    lo = min(i.min() for i in index if len(i))
+    hi = max(i.max() for i in index if len(i))
+    present = np.zeros(hi - lo + 1, dtype=bool)
+    sums = {name: np.zeros((len(frames), hi - lo + 1)) for name in quantities}
+    numbers = {name: np.zeros((len(frames), hi - lo + 1)) for name in quantities}
+    for r, (frame, i) in enumerate(zip(frames, index)):
+        present[i - lo] = True
+        for name, columns in quantities.items():
+            values = frame[columns].to_numpy(dtype=np.float64)
+            sums[name][r, i - lo] = np.nansum(values, axis=1)
+            numbers[name][r, i - lo] = (~np.isnan(values)).sum(axis=1)
+    grid = (np.flatnonzero(present) + lo) * step
+    return grid, {name: (sums[name][:, present], numbers[name][:, present]) for name in quantities}
+
+
+def _window(a, n:int):
+    """Sum over the columns j-n..j+n of each row"""
+    if n == 0:
+        return a
+    c = np.cumsum(np.pad(a, ((0, 0), (n + 1, n))), axis=1)
+    return c[:, 2 * n + 1:] - c[:, :-(2 * n + 1)]
+
+
+def curve_ci(frames, key:str, step:float, quantities:dict, window:int=2,
+             samples:int=SAMPLES, level:float=LEVEL, seed:int=SEED):
+    """
+    Averaged curves of replicates (mean of all values in the rows i-window..i+window)
+    with percentile bootstrap confidence intervals.
+
+    Parameters
+    ----------
+    frames : list of pandas.DataFrame
+        Replicates with the grid column `key` (multiples of `step`)
+    quantities : dict
+        Averaged column -> replicate columns pooled into it
+
+    Returns
+    -------
+    pandas.DataFrame
+        `key`, and per quantity '<name>', '<name> ci low', '<name> ci high'
+    """
+    grid, pooled = ensemble(frames, key, step, quantities)
+    counts = resample_counts(len(frames), samples, seed)
+    df = pd.DataFrame({key: grid})
+    for name, (sums, numbers) in pooled.items():
+        sums, numbers = _window(sums, window), _window(numbers, window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            df[name] = sums.sum(axis=0) / numbers.sum(axis=0)
+        df[f'{name} ci low'], df[f'{name} ci high'] = ratio_ci(counts, sums, numbers, level)
+    return df
+
+
+def values_ci(records, samples:int=SAMPLES, level:float=LEVEL, seed:int=SEED):
+    """
+    Percentile bootstrap confidence interval of the mean of each value over the
+    replicates (`records` as for replicate_statistics), as {'ci low key': .., 'ci high key': ..};
+    NaN if a replicate has no value (like the mean)
+    """
+    if not records:
+        return {}
+    names = list(records[0])
+    values = np.array([[r[name] for name in names] for r in records], dtype=np.float64)
+    low, high = ratio_ci(resample_counts(len(records), samples, seed), values,
+                         np.ones_like(values), level)
+    return {k: v for j, name in enumerate(names) for k, v in ((f'ci low {name}', low[j]), (f'ci high {name}', high[j]))}
+
+
+def set_curve_ci(device:str, series:str, **kwargs):
+    """curve_ci of the replicates of a set (as averaged by Metrics.average_curves)"""
+    import importlib
+    from Interlab import CURVES as MODULES, replicate
+    data = set(getattr(importlib.import_module(MODULES[device][0]), MODULES[device][1]))
+    paths = sorted(p for p in series_paths(series) if p in data)
+    if len(paths) == 0:
+        raise Exception((f"No files found for series {series}", "red"))
+    key, step, window, quantities = CURVES[device]
+    return curve_ci([replicate(device, p) for p in paths], key, step, quantities, window, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals over replicates")
+    parser.add_argument("device", choices=list(CURVES))
+    parser.add_argument("series", nargs="?", help="set of the averaged curves, e.g. Wood_Pekin_TGA_N2_10K")
+    parser.add_argument("--sets", action="store_true", help="values of every set instead of curves")
+    parser.add_argument("-B", "--samples", type=int, default=SAMPLES, help=f"bootstrap samples (default {SAMPLES})")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--level", type=float, default=LEVEL, help=f"confidence level (default {LEVEL})")
+    parser.add_argument("--format", default="console", choices=["console", "csv", "latex"])
+    parser.add_argument("-o", "--output", help="CSV file of the table")
+    args = parser.parse_args()
+    options = dict(samples=args.samples, level=args.level, seed=args.seed)
+
+    if args.sets:
+        from Metrics import SET_METRICS, set_ci_table
+        if args.device not in SET_METRICS:
+            parser.error(f"no set values of {args.device}, use {list(SET_METRICS)}")
+        table = set_ci_table(args.device, **options)
+        print(render_table(table, args.format))
+    else:
+        if args.series is None:
+            parser.error("series is required without --sets")
+        table = set_curve_ci(args.device, args.series, **options)
+        print(render_table(table.describe().T, args.format))
+    if args.output:
+        table.to_csv(args.output, index=False)
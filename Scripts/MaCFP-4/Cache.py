@@ -0,0 +1,166 @@
+# persistent cache of derived series (resampled, smoothed, differentiated replicates)
+#
+#   python Cache.py               entries and size of the cache
+#   python Cache.py --clear       remove all entries
+#
+# An entry is keyed by the content hash of the source file and the processing
+# recipe (function, columns, grid step, smoothing window and order, normalization
+# rows, temperature cut), so a changed file or a changed parameter is a miss.
+# Entries are uncompressed .npz files (float64 values and the column names);
+# a hit refreshes the modification time and the least recently used entries are
+# removed when the cache grows over MACFP_CACHE_MB (default 512). The directory is
+# scanned once per process, then the size of the stored entries is counted and it is
+# only scanned again for an eviction, when the count passes the limit (which removes
+# entries down to LOW_WATER of the limit, so the scans are rare on a cold run).
+#
+#   MACFP_CACHE=0           no cache (always compute)
+#   MACFP_CACHE_DIR=path    cache directory (default .derived_cache next to the scripts)
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+
+from pathlib import Path
+
+from Lazy import lazy_import
+from Instrument import stage
+from Utils import SCRIPT_DIR
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+VERSION = 2   # part of every key, increase when the format of the entries or the computation of a recipe changes
+ENABLED = os.environ.get("MACFP_CACHE", "1").strip().lower() not in ("0", "false", "off")
+CACHE_DIR = Path(os.environ.get("MACFP_CACHE_DIR", SCRIPT_DIR / ".derived_cache"))
+MAX_BYTES = int(float(os.environ.get("MACFP_CACHE_MB", 512)) * 2**20)
+LOW_WATER = 0.9
+
+stats = {"hits": 0, "misses": 0}
+_hashes = {}   # content hash by (path, size, mtime) of this process
+_size = None   # bytes of the entries (scanned on the first store, then counted)
+_lock = threading.Lock()
+
+
+def file_hash(path:Path):
+    """sha1 of the content of a file (computed once per process and file version)"""
+    st = os.stat(path)
+    key = (str(path), st.st_size, st.st_mtime_ns)
+    if key not in _hashes:
+        _hashes[key] = hashlib.sha1(Path(path).read_bytes()).hexdigest()
+    return _hashes[key]
+
+
+def entry_key(path:Path, recipe:dict):
+    text = json.dumps({"version": VERSION, "file": file_hash(path), "recipe": recipe}, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _load(entry:Path):
+    with np.load(entry, allow_pickle=False) as data:
+        return pd.DataFrame(data["values"], columns=list(data["columns"]))
+
+
+def _store(entry:Path, df:pd.DataFrame):
+    entry.parent.mkdir(parents=True, exist_ok=True)
+    tmp = entry.with_name(f"{entry.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, values=df.to_numpy(dtype=np.float64), columns=np.array(df.columns, dtype=str))
+    os.replace(tmp, entry)
+
+
+def _size_of(cache_dir:Path=CACHE_DIR):
+    if not cache_dir.exists():
+        return 0
+    return sum(e.stat().st_size for e in os.scandir(cache_dir) if e.name.endswith(".npz"))
+
+
+def evict(max_bytes:int=MAX_BYTES, cache_dir:Path=CACHE_DIR):
+    """Remove the least recently used entries until the cache is at most max_bytes, returns its size"""
+    with _lock:
+        entries = []
+        for e in os.scandir(cache_dir) if cache_dir.exists() else []:
+            if e.name.endswith(".npz"):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(name)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+
+def _stored(size:int):
+    """Count a stored entry of `size` bytes, evict when the cache passes MAX_BYTES"""
+    global _size
+    with _lock:
+        # the first scan includes the new entry
+        _size = _size_of() if _size is None else _size + size
+        if _size <= MAX_BYTES:
+            return
+    remaining = evict(int(MAX_BYTES * LOW_WATER))
+    with _lock:
+        _size = remaining
+
+
+def derived(path:Path, recipe:dict, compute):
+    """
+    Derived series of a data file: compute() on a miss, the stored result on a hit.
+
+    Parameters
+    ----------
+    path : Path
+        Source data file (its content is part of the key)
+    recipe : dict
+        Everything else that determines the result (JSON serializable)
+    compute : callable
+        Returns the derived series as DataFrame of float columns (default index)
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    if not ENABLED:
+        return compute()
+    entry = CACHE_DIR / f"{entry_key(path, recipe)}.npz"
+    if entry.exists():
+        try:
+            with stage("cache hit", Path(path).name):
+                df = _load(entry)
+            os.utime(entry)
+            stats["hits"] += 1
+            return df
+        except (OSError, ValueError, KeyError):
+            pass   # incomplete or foreign file, computed again below
+    df = compute()
+    stats["misses"] += 1
+    _store(entry, df)
+    _stored(entry.stat().st_size)
+    return df
+
+
+def clear(cache_dir:Path=CACHE_DIR):
+    global _size
+    for e in cache_dir.glob("*.npz"):
+        e.unlink()
+    _size = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache of derived series")
+    parser.add_argument("--clear", action="store_true", help="remove all entries")
+    args = parser.parse_args()
+
+    if args.clear:
+        clear()
+    entries = list(CACHE_DIR.glob("*.npz"))
+    size = sum(e.stat().st_size for e in entries)
+    print(f"{CACHE_DIR}: {len(entries)} entries, {size / 2**20:.1f} MiB (limit {MAX_BYTES / 2**20:.0f} MiB)")
@@ -1,15 +1,26 @@
+#define whether to save files in pdf or png (--format png,pdf writes both)
+# the options are parsed before the imports below, --help does not wait for them
+from Figures import script_options
+args = script_options('Cone and gasification analysis')
+ex = args.formats[0]
+
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import re
 
-from Utils import device_data, get_series_names, make_institution_table, device_subset, label_def
-from Utils import SCRIPT_DIR, PROJECT_ROOT, DATA_DIR, FIGURES_DIR
-from scipy.signal import savgol_filter
+from Utils import get_series_names, make_institution_table, device_subset, label_def, replicate_statistics
+from Utils import SCRIPT_DIR, PROJECT_ROOT, FIGURES_DIR, parse_name, savgol, series_paths
+from Readers import read_series
+from Screening import quality_report
+from Cone_functions import Cone_columns, Cone_Data, Gasification_Data, average_cone_series, cone_replicate, Calculate_dm_dt, cone_metrics
+from Cone_functions import cone_shifts, gasification_shifts, gasification_mlr, GASIFICATION_AREA
+from Instrument import loop, instrument_figures
+from Figures import FigureWriter
+from Downsample import Overlay
+from Plotting import Ensemble, quantile_bands
 
-#define whether to save files in pdf or png
-ex = 'png' #options 'pdf' or 'png
 
 #when pushed to main repo replace
 '../../../matl-db-organizing-committee/' #with
@@ -18,6 +29,8 @@ ex = 'png' #options 'pdf' or 'png
 
 # check all subdirectories to save plots exist. 
 base_dir = Path('../../../matl-db-organizing-committee/SCRIPT_FIGURES')
+writer = FigureWriter(args.formats, args.writers, args.max_pending,
+                      manifest=base_dir / 'Cone' / 'figure_manifest.json', force=args.force)
 Individual_dir = base_dir / 'Cone' / 'Individual'
 Average_dir = base_dir / 'Cone' / 'Average'
 Individual_dir.mkdir(parents=True, exist_ok=True)
@@ -28,9 +41,9 @@ Average_dir.mkdir(parents=True, exist_ok=True)
 #region data
 # ------------------------------------
 #This section is used to determine what cone data is available. 
-Cone_Data = device_data(DATA_DIR, 'CONE')
-Gasification_Data = device_data(DATA_DIR, 'GASIFICATION') + device_data(DATA_DIR, 'CAPA')
 Cone_sets = get_series_names(Cone_Data)
+# Data quality report (exclusions and plot order)
+Quality = quality_report(Cone_Data)
 Gas_sets = get_series_names(Gasification_Data)
 print(Gas_sets)
 Gasification_sets = get_series_names(Gasification_Data)
@@ -64,81 +77,7 @@ def set_plot_style():
     })
 
 set_plot_style()
-
-
-# ------------------------------------
-#region functions
-# ------------------------------------
-
-
-def average_cone_series(series_name: str):
-    
-    paths = list(DATA_DIR.glob(f"*/*{series_name}_[rR]*.csv"))
-    paths = [p for p in paths if "TEMPLATE" not in str(p)]
-    paths = [p for p in paths if p in Cone_Data]
-
-    Dataframes = []
-    if len(paths) == 0:
-        raise Exception((f"No files found for series {series_name}", "red"))
-
-    # Read data
-
-    for i, path in enumerate(paths):
-        df_raw = pd.read_csv(path)
-
-        t_floor = df_raw["Time (s)"].iloc[0]
-        t_floor = np.ceil(t_floor) 
-        t_ceil = df_raw["Time (s)"].iloc[-1]
-        t_ceil = np.floor(t_ceil) 
-
-        InterpT = np.arange(t_floor, t_ceil+1, 1)
-        length = len(InterpT)
-        df_interp = pd.DataFrame(index=range(length))
-        for columns in df_raw.columns[:]:
-            df_interp[columns] = np.interp(
-                InterpT, df_raw["Time (s)"], df_raw[columns]
-            )
-        #interpolation
-        Dataframes.append(df_interp)
-
-    merged_df = Dataframes[0]
-    for df in Dataframes[1:]:
-        merged_df = pd.merge(
-            merged_df,
-            df,
-            on="Time (s)",
-            how="outer",
-            suffixes=("", f" {int(len(merged_df.columns)/2+0.5)}"),
-        )
-  
-    merged_df.rename(columns={'HRR (kW/m2)': "HRR (kW/m2) 1"}, inplace=True)
-    merged_df.rename(columns={'Mass (g)': "Mass (g) 1"}, inplace=True)
-
-    #average
-    time_cols = merged_df.filter(regex=r'^Time \(s\)').columns
-    mass_cols = merged_df.filter(regex=r'^Mass \(g\)').columns
-    HRR_cols = merged_df.filter(regex=r'^HRR \(kW/m2\)').columns
-    df_average = pd.DataFrame({'Time (s)': merged_df['Time (s)']})
-    n=2
-    sum = merged_df[HRR_cols].rolling(2*n+1, min_periods=1,center=True).sum().sum(axis=1)
-    cnt = merged_df[HRR_cols].rolling(2*n+1, min_periods=1,center=True).count().sum(axis=1)
-    df_average['HRR (kW/m2)'] = sum / cnt  # Series: mean of all non-NaN values in rows i-2..i+2 across all columns
-
-    diff = merged_df[HRR_cols].sub(df_average['HRR (kW/m2)'], axis=0)**2
-    sum_diff = diff.rolling(2*n+1, min_periods=1,center=True).sum().sum(axis=1)
-    df_average['unc HRR (kW/m2)'] = np.sqrt(sum_diff/(cnt*(cnt-1)))
-
-
-    return df_average
-
-
-def calculate_int_HRR(df:pd.DataFrame):
-    total_hrr = np.zeros(len(df))
-    for i in range(1, len(df)):
-        total_hrr[i] = total_hrr[i-1] + 0.5 * (df['HRR (kW/m2)'].iloc[i-1] + df['HRR (kW/m2)'].iloc[i]) * (df['Time (s)'].iloc[i] - df['Time (s)'].iloc[i-1])
-    df['Int HRR'] = total_hrr
-    return df
-
+instrument_figures()
 
 
 # Mass and HRR plots for all unique atmospheres and heating rates
@@ -148,44 +87,39 @@ for series in unique_conditions_cone_material:
     parts = series.split('_')
     material, dev, flux, orient  = parts[:4]
     Cone_subset_paths = [p for p in Cone_Data if f"{material}_" in p.name and f"_{flux}_{orient}_" in p.name]
+    # one collection per institute (and z-order) instead of one line per replicate
+    mlr, hrr = Ensemble(), Ensemble()
     for path in Cone_subset_paths:
-        df_raw = pd.read_csv(path)
+        df_raw = read_series(path, Cone_columns)
         df=df_raw
-        label, color = label_def(path.stem.split('_')[0])
-        ax1.plot(df['Time (s)'],savgol_filter((-1)*np.gradient(df['Mass (g)'],df['Time (s)']),53,3),'-', label = label, color=color)
-        if path.stem.split('_')[0] =='UMET':
+        label, color = label_def(parse_name(path)['institute'])
+        mlr.add(df['Time (s)'],savgol((-1)*np.gradient(df['Mass (g)'],df['Time (s)']),53,3), label, color)
+        if Quality.loc[path.stem, 'background']:
             zorder =1
         else:
             zorder =5
-        ax2.plot(df['Time (s)'], df['HRR (kW/m2)'], '.', label = label, color=color, zorder=zorder)
+        hrr.add(df['Time (s)'], df['HRR (kW/m2)'], label, color, marker='.', zorder=zorder)
 
+    mlr.draw(ax1)
     ax1.set_ylim(bottom=0)
     ax1.set_xlabel('Time [s]')
     ax1.set_ylabel('Mass loss rate [g/s]')
     fig1.tight_layout()
-    handles1, labels1 = ax1.get_legend_handles_labels()
-    by_label1 = dict(zip(labels1, handles1))
-    ax1.legend(by_label1.values(), by_label1.keys())
 
+    hrr.draw(ax2)
     ax2.set_ylim(bottom=0)
     ax2.set_xlabel('Time [s]')
     ax2.set_ylabel('HRR [kW/m$^2$]')
     fig2.tight_layout()
-    handles2, labels2 = ax2.get_legend_handles_labels()
-    by_label2 = dict(zip(labels2, handles2))
-    ax2.legend(by_label2.values(), by_label2.keys())
 
-    fig1.savefig(str(base_dir) + '/Cone/Cone_{}_{}_{}_Mass.{}'.format(material, flux,orient,ex))
-    fig2.savefig(str(base_dir) + '/Cone/Cone_{}_{}_{}_HRR.{}'.format(material, flux,orient,ex))
+    writer.save(fig1, str(base_dir) + '/Cone/Cone_{}_{}_{}_Mass.{}'.format(material, flux,orient,ex))
+    writer.save(fig2, str(base_dir) + '/Cone/Cone_{}_{}_{}_HRR.{}'.format(material, flux,orient,ex))
 
 
     plt.close(fig1)
     plt.close(fig2)
 
 
-
-
-
 # plot average per Cone_set (unique institutions, unique material, unique conditions)
 # and print a table with values of interest
 Average_values = pd.DataFrame({
@@ -193,10 +127,13 @@ Average_values = pd.DataFrame({
     'Duck':[label_def(t.split('_')[0])[0] for t in Cone_sets],
     'conditions':[t.split('_')[3:] for t in Cone_sets],
 })
-for idx,set in enumerate(Cone_sets):
+# time shifts of the replicates of each set (registration on the ignition time, all sets at once)
+Set_shifts = cone_shifts(Cone_sets)
+for idx,set in enumerate(loop('Cone set metrics', Cone_sets)):
     fig, ax_HRR = plt.subplots(figsize=(6, 4))
     ax_rate = ax_HRR.twinx()
     df_average = average_cone_series(set)
+    df_aligned = average_cone_series(set, shifts=Set_shifts)
 
     # plot average
     # Plot mass (left y-axis)
@@ -206,6 +143,8 @@ for idx,set in enumerate(Cone_sets):
                          df_average['HRR (kW/m2)']-2*df_average['unc HRR (kW/m2)'],
                          df_average['HRR (kW/m2)']+2*df_average['unc HRR (kW/m2)'],
                          color='limegreen', alpha = 0.3)
+    ax_HRR.plot(df_aligned['Time (s)'], df_aligned['HRR (kW/m2)'],
+                        label='HRR (aligned)', color='darkgreen', linestyle='--')
 
     # Plot mass loss rate (right y-axis, dashed)
     # ax_rate.plot(df_average['Temperature (K)'], df_average['MLR (1/s)'],
@@ -218,34 +157,20 @@ for idx,set in enumerate(Cone_sets):
 
 
     #plot individual
-    paths_CONE_set = list(DATA_DIR.glob(f"*/{set}_[rR]*.csv"))
-    ignition_time_list = []
-    HOC_list = []
+    paths_CONE_set = series_paths(set)
+    metrics = []
+    raw = Overlay()
 
     for path in paths_CONE_set:
-        df_raw = pd.read_csv(path)
-        df = calculate_int_HRR(df_raw)
-
-        ignition_index = df[df['HRR (kW/m2)'] >= 24].index[0]
-        ignition_time = df["Time (s)"].iloc[ignition_index]
-        m0 = np.mean(df["Mass (g)"][1:5])
-        index_start = df[df['HRR (kW/m2)'] >= 24].index[0]
-        index_end = df[df['HRR (kW/m2)'] >= 24].index[-1]
-        if path.stem.split('_')[0] == 'UDRI':
-            A_surf = 0.01
-        else:
-            A_surf = 0.00884
-        HOC = A_surf*(df['Int HRR'][index_end]-df['Int HRR'][index_start])/(df['Mass (g)'][index_start]-df['Mass (g)'][index_end])
+        df = cone_replicate(path)
 
-        ignition_time_list.append(ignition_time)
-        HOC_list.append(HOC)
+        metrics.append(cone_metrics(df, parse_name(path)['institute']))
 
-        ax_HRR.plot(df['Time (s)'], df['HRR (kW/m2)'], '.',color ='black',markersize=0.0002)
+        raw.add(df['Time (s)'], df['HRR (kW/m2)'], '.',color ='black',markersize=0.0002)
+    raw.draw(ax_HRR)
 
-    Average_values.at[idx, 'ignition time'] = np.mean(ignition_time_list)
-    Average_values.at[idx, 'std ignition time'] = np.std(ignition_time_list, ddof=1)
-    Average_values.at[idx, 'HOC'] = np.mean(HOC_list)
-    Average_values.at[idx, 'std HOC'] = np.std(HOC_list, ddof=1)
+    for key, value in replicate_statistics(metrics).items():
+        Average_values.at[idx, key] = value
 
     # Set lower limits of both y-axes to 0
     ax_HRR.set_ylim(bottom=0)
@@ -262,10 +187,12 @@ for idx,set in enumerate(Cone_sets):
     fig.legend()
 
     fig.tight_layout()
-    plt.savefig(str(base_dir) + f'/Cone/Average/{set}.{ex}')
+    writer.save(plt.gcf(), str(base_dir) + f'/Cone/Average/{set}.{ex}')
     plt.close(fig)
 Average_values.drop('set',axis=1)
 print(Average_values)
+print('Time shifts of the replicates (s, aligned time = time - shift)')
+print(pd.DataFrame({'replicate': [p.stem for p in Set_shifts], 'shift in set': list(Set_shifts.values())}))
 
 
 
@@ -276,30 +203,51 @@ print(Average_values)
 # HR plots for all unique HR
 color = {'30kW':'blue','50kW':'black','60kW':'red'}
 fig1, ax1 = plt.subplots(figsize=(6, 4))
+# same with the median, interquartile and 5-95 % range of all replicates
+fig2, ax2 = plt.subplots(figsize=(6, 4))
+# same with the replicates aligned in time (registration on the ignition time within the condition)
+fig3, ax3 = plt.subplots(figsize=(6, 4))
+Condition_shifts = cone_shifts(['Cone_30kW_hor','Cone_50kW_hor','Cone_60kW_hor'], quality=Quality)
+print(pd.DataFrame({'replicate': [p.stem for p in Condition_shifts], 'shift in condition': list(Condition_shifts.values())}))
+# raw points of all replicates of all fluxes, one artist per flux
+raw1, raw3 = Overlay(), Overlay()
 for series in ['Cone_30kW_hor','Cone_50kW_hor','Cone_60kW_hor']:
     parts = series.split('_')
     flux, orient  = parts[1:]
     for subset in [item for item in Cone_sets if series in item]:
-        paths = list(DATA_DIR.glob(f"*/{subset}_[rR]*.csv"))
+        paths = series_paths(subset)
         for i, path in enumerate(paths):
-            df = pd.read_csv(path)
-            df = calculate_int_HRR(df)
-            ax1.plot(df['Time (s)'], df['HRR (kW/m2)'], '.', color = color[flux], alpha=0.08, markersize = 0.1, zorder=4)
-    df_average = average_cone_series(series)
+            df = cone_replicate(path)
+            raw1.add(df['Time (s)'], df['HRR (kW/m2)'], '.', color = color[flux], alpha=0.08, markersize = 0.1, zorder=4)
+            if path in Condition_shifts:
+                raw3.add(df['Time (s)'] - Condition_shifts[path], df['HRR (kW/m2)'], '.', color = color[flux], alpha=0.08, markersize = 0.1, zorder=4)
+    df_aligned = average_cone_series(series, quality=Quality, shifts=Condition_shifts)
+    ax3.plot(df_aligned['Time (s)'], df_aligned['HRR (kW/m2)'], label = flux + '/m$^2$', color = color[flux], zorder = 3)
+    ax3.fill_between(df_aligned['Time (s)'],
+                    df_aligned['HRR (kW/m2)']-2*df_aligned['unc HRR (kW/m2)'],
+                    df_aligned['HRR (kW/m2)']+2*df_aligned['unc HRR (kW/m2)'],
+                    color=color[flux], alpha = 0.3, zorder=2)
+    df_average = average_cone_series(series, quality=Quality, bands=True)
+    quantile_bands(ax2, df_average['Time (s)'], df_average, 'HRR (kW/m2)', color[flux], flux + '/m$^2$')
     ax1.plot(df_average['Time (s)'], df_average['HRR (kW/m2)'], label = flux + '/m$^2$', color = color[flux], zorder = 3)
     ax1.fill_between(df_average['Time (s)'], 
                     df_average['HRR (kW/m2)']-2*df_average['unc HRR (kW/m2)'],
                     df_average['HRR (kW/m2)']+2*df_average['unc HRR (kW/m2)'],
                     color=color[flux], alpha = 0.3, zorder=2)
+raw1.draw(ax1)
+raw3.draw(ax3)
+
+for fig, ax in [(fig1, ax1), (fig2, ax2), (fig3, ax3)]:
+    ax.set_ylim(bottom=0)
+    ax.set_xlim(right=2500)
+    ax.set_xlabel('Time (s)')
+    ax.set_ylabel('HRR [kW/m$^2$]')
+    fig.tight_layout()
+    ax.legend()
 
-ax1.set_ylim(bottom=0)
-ax1.set_xlim(right=2500)
-ax1.set_xlabel('Time (s)')
-ax1.set_ylabel('HRR [kW/m$^2$]')
-fig1.tight_layout()
-ax1.legend()
-
-fig1.savefig(str(base_dir) + '/Cone/Cone_Average_HRR.{}'.format(ex))
+writer.save(fig1, str(base_dir) + '/Cone/Cone_Average_HRR.{}'.format(ex))
+writer.save(fig2, str(base_dir) + '/Cone/Cone_Average_HRR_bands.{}'.format(ex))
+writer.save(fig3, str(base_dir) + '/Cone/Cone_Average_HRR_aligned.{}'.format(ex))
 plt.close(fig1)
 
 
@@ -312,8 +260,8 @@ for series in unique_conditions_cone_material:
     Cone_subset_paths = [p for p in Cone_Data if dev in p.name and f"{material}_" in p.name and f"_{flux}_{orient}_" in p.name]
 
     for path in Cone_subset_paths:
-        label, color = label_def(path.stem.split('_')[0])
-        df = pd.read_csv(path)
+        label, color = label_def(parse_name(path)['institute'])
+        df = read_series(path)
         for i in range(1, 4):  # Check for Temperature 1, 2, 3
             temp_col = f'TC back {i} (K)'
             if temp_col in df.columns:
@@ -327,44 +275,48 @@ for series in unique_conditions_cone_material:
     ax1.legend()
     
     if dev == 'Cone':
-        fig1.savefig(str(base_dir) + '/Cone/Cone_{}_{}_{}_BackT.{}'.format(material, flux,orient,ex))
+        writer.save(fig1, str(base_dir) + '/Cone/Cone_{}_{}_{}_BackT.{}'.format(material, flux,orient,ex))
  
     plt.close(fig1)
 
 
 #region Gasification
 
-def Calculate_dm_dt(df:pd.DataFrame):
-    dt = df['Time (s)'].shift(-2) - df['Time (s)'].shift(2)
-    df['dm/dt'] = (df['Mass (g)'].shift(2) - df['Mass (g)'].shift(-2)) / dt
-    return df
-
 # Mass and mass loss rate plots for all unique atmospheres and heating rates (gasification)
+def gas_subset(series):
+    material, dev, flux, orient  = series.split('_')[:4]
+    return [p for p in Gasification_Data if f"{material}" in p.name and f"_{flux}_" in p.name]
+
+# time shifts of the replicates of each condition (FFT cross-correlation of the MLR, all conditions at once)
+Gas_shifts = gasification_shifts([gas_subset(series) for series in unique_conditions_gas_material])
+print(pd.DataFrame({'replicate': [p.stem for p in Gas_shifts], 'shift in condition': list(Gas_shifts.values())}))
 for series in unique_conditions_gas_material:
     fig1, ax1 = plt.subplots(figsize=(6, 4))
     fig2, ax2 = plt.subplots(figsize=(6, 4))
+    # same MLR with the replicates aligned in time
+    fig3, ax3 = plt.subplots(figsize=(6, 4))
     parts = series.split('_')
     material, dev, flux, orient  = parts[:4]
-    Gas_subset_paths = [p for p in Gasification_Data if f"{material}" in p.name and f"_{flux}_" in p.name]
+    Gas_subset_paths = gas_subset(series)
     for path in Gas_subset_paths:
-        institute = path.stem.split('_')[0]
-        df_raw = pd.read_csv(path)
+        institute = parse_name(path)['institute']
+        df_raw = read_series(path)
         df=Calculate_dm_dt(df_raw)
-        label, color = label_def(path.stem.split('_')[0])
-        if institute == 'TIFP+UCT':
-            ax1.plot(df['Time (s)'],savgol_filter(df['dm/dt']/0.01,41,3),'-', label = label, color=color)
-        elif institute == 'FSRI':
-            ax1.plot(df['Time (s)'],savgol_filter(df['dm/dt']/0.00385,41,3),'-', label = label, color=color)
-       # ax1.plot(df['Time (s)'],savgol_filter((-1)*np.gradient(df['Mass (g)'],df['Time (s)']),53,3),'-', label = label, color=color)
+        label, color = label_def(parse_name(path)['institute'])
+        if institute in GASIFICATION_AREA:
+            mlr = gasification_mlr(df, institute)
+            ax1.plot(df['Time (s)'], mlr,'-', label = label, color=color)
+            ax3.plot(df['Time (s)'] - Gas_shifts.get(path, 0), mlr,'-', label = label, color=color)
         ax2.plot(df['Time (s)'], df['Mass (g)'], '.', label = label, color=color)
 
-    ax1.set_ylim(bottom=0)
-    ax1.set_xlabel('Time [s]')
-    ax1.set_ylabel('Mass loss rate [g s$^{-1}$ m$^{-2}$]')
-    fig1.tight_layout()
-    handles1, labels1 = ax1.get_legend_handles_labels()
-    by_label1 = dict(zip(labels1, handles1))
-    ax1.legend(by_label1.values(), by_label1.keys())
+    for fig, ax in [(fig1, ax1), (fig3, ax3)]:
+        ax.set_ylim(bottom=0)
+        ax.set_xlabel('Time [s]')
+        ax.set_ylabel('Mass loss rate [g s$^{-1}$ m$^{-2}$]')
+        fig.tight_layout()
+        handles1, labels1 = ax.get_legend_handles_labels()
+        by_label1 = dict(zip(labels1, handles1))
+        ax.legend(by_label1.values(), by_label1.keys())
 
     ax2.set_ylim(bottom=0)
     ax2.set_xlabel('Time [s]')
@@ -374,12 +326,14 @@ for series in unique_conditions_gas_material:
     by_label2 = dict(zip(labels2, handles2))
     ax2.legend(by_label2.values(), by_label2.keys())
 
-    fig1.savefig(str(base_dir) + '/Cone/Gasification_{}_{}_MLR.{}'.format(material, flux,ex))
-    fig2.savefig(str(base_dir) + '/Cone/Gasification_{}_{}_Mass.{}'.format(material, flux,ex))
+    writer.save(fig1, str(base_dir) + '/Cone/Gasification_{}_{}_MLR.{}'.format(material, flux,ex))
+    writer.save(fig2, str(base_dir) + '/Cone/Gasification_{}_{}_Mass.{}'.format(material, flux,ex))
+    writer.save(fig3, str(base_dir) + '/Cone/Gasification_{}_{}_MLR_aligned.{}'.format(material, flux,ex))
 
 
     plt.close(fig1)
     plt.close(fig2)
+    plt.close(fig3)
 
 
 
@@ -395,9 +349,9 @@ for flux in [30,60]:
     Cone_subset_paths = [p for p in Gasification_Data if f"TIFP+UCT_Wood_" in p.name and f"_{flux}kW_hor_" in p.name]
     for path in Cone_subset_paths:
         label = path.stem.split('_')[5]
-        df_raw = pd.read_csv(path)
+        df_raw = read_series(path)
         df=Calculate_dm_dt(df_raw)
-        ax1.plot(df['Time (s)'],savgol_filter(df['dm/dt']/0.01,41,3),'-', label = label, color=color[label])
+        ax1.plot(df['Time (s)'],savgol(df['dm/dt']/0.01,41,3),'-', label = label, color=color[label])
         ax2.plot(df['Time (s)'], df['Mass (g)'], '.', label = label, color=color[label])
 
     ax1.set_ylim(bottom=0)
@@ -414,8 +368,8 @@ for flux in [30,60]:
     fig2.tight_layout()
     ax2.legend()
 
-    fig1.savefig(str(base_dir) + '/Cone/Gasification_{}_{}kW_{}_MLR_grain.{}'.format(material, flux,orient,ex))
-    fig2.savefig(str(base_dir) + '/Cone/Gasification_{}_{}kW_{}_Mass_grain.{}'.format(material, flux,orient,ex))
+    writer.save(fig1, str(base_dir) + '/Cone/Gasification_{}_{}kW_{}_MLR_grain.{}'.format(material, flux,orient,ex))
+    writer.save(fig2, str(base_dir) + '/Cone/Gasification_{}_{}kW_{}_Mass_grain.{}'.format(material, flux,orient,ex))
 
 
     plt.close(fig1)
@@ -429,8 +383,8 @@ for flux in [30,60]:
     fig1, ax1 = plt.subplots(figsize=(6, 4))
     Gas_subset_paths = [p for p in Gasification_Data if f"TIFP+UCT_Wood_" in p.name and f"_{flux}kW_hor_" in p.name]
     for path in Gas_subset_paths:
-        label = label_def(path.stem.split('_')[0])[0] +' ' + path.stem.split('_')[5]
-        df_raw = pd.read_csv(path)
+        label = label_def(parse_name(path)['institute'])[0] +' ' + path.stem.split('_')[5]
+        df_raw = read_series(path)
         df=Calculate_dm_dt(df_raw)
         ax1.plot(df['Time (s)'],df['TC back 1 (K)'],'-', label = label, color=color[path.stem.split('_')[5]])
         ax1.plot(df['Time (s)'],df['TC back 2 (K)'],'-',  color=color[path.stem.split('_')[5]])
@@ -439,8 +393,8 @@ for flux in [30,60]:
         flux = 40
     Capa_subset_paths = [p for p in Gasification_Data if f"FSRI_" in p.name and f"_{flux}kW_" in p.name]
     for path in Capa_subset_paths:
-        label = label_def(path.stem.split('_')[0])[0] +' '
-        df_raw = pd.read_csv(path)
+        label = label_def(parse_name(path)['institute'])[0] +' '
+        df_raw = read_series(path)
         df=Calculate_dm_dt(df_raw)
         ax1.plot(df['Time (s)'],df['TC Back (K)'],'-', label = label, color='#aec7e8')
         ax1.plot(df['Time (s)'],df['TC Top (K)'],'.', label = label + 'Top', color="#bcbd22")
@@ -455,6 +409,8 @@ for flux in [30,60]:
     ax1.legend(by_label.values(), by_label.keys())
     
 
-    fig1.savefig(str(base_dir) + '/Cone/Gasification_{}_{}_{}_BackT.{}'.format(material, flux,orient,ex))
+    writer.save(fig1, str(base_dir) + '/Cone/Gasification_{}_{}_{}_BackT.{}'.format(material, flux,orient,ex))
     
-    plt.close(fig1)
\ No newline at end of file
+    plt.close(fig1)
+
+writer.close()
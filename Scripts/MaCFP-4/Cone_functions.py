@@ -0,0 +1,139 @@
+# Cone and gasification analysis functions (used by Cone_analysis.py)
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from Instrument import timed
+from Utils import DATA_DIR, device_data, parse_name, savgol, series_paths
+from Readers import read_series, stream_resample
+from Screening import quality_filter
+from Cache import derived
+from Streaming import GridStatistics, CAPACITY
+
+
+# Columns used for HRR and mass (thermocouples are only read for the back side temperature plots)
+Cone_columns = ['Time (s)', 'Mass (g)', 'HRR (kW/m2)']
+Cone_Data = device_data(DATA_DIR, 'CONE')
+Gasification_Data = device_data(DATA_DIR, 'GASIFICATION') + device_data(DATA_DIR, 'CAPA')
+
+
+# HRR (kW/m2) at ignition
+HRR_IGNITION = 24
+
+
+def cone_paths(series_name: str, quality=None):
+    """Replicate files of a series (glob pattern), without the exclusions of the quality report"""
+    paths = series_paths(series_name, partial=True)
+    paths = [p for p in paths if "TEMPLATE" not in str(p)]
+    paths = [p for p in paths if p in Cone_Data]
+
+    # Apply exclusions of the quality report
+    if quality is not None:
+        paths = quality_filter(paths, quality)
+
+    if len(paths) == 0:
+        raise Exception((f"No files found for series {series_name}", "red"))
+    return paths
+
+
+@timed
+def cone_shifts(series_names, method="ignition", quality=None, max_shift=None):
+    """
+    Time shifts (s) of the replicates of each series, aligned within the series
+    (Alignment.py, all series in one batch), by path; aligned time = time - shift.
+    The ignition time is the default: the cross-correlation of replicates of
+    different shape (e.g. the height of the second peak) can lock onto the wrong peak.
+    """
+    from Alignment import align
+    groups = [cone_paths(s, quality) for s in series_names]
+    curves = [[(df['Time (s)'], df['HRR (kW/m2)'])
+               for df in (stream_resample(p, "Time (s)", 1, Cone_columns) for p in paths)] for paths in groups]
+    shifts = align(curves, 1, method, threshold=HRR_IGNITION, max_shift=max_shift)
+    return {p: s for paths, group in zip(groups, shifts) for p, s in zip(paths, group)}
+
+
+@timed
+def average_cone_series(series_name: str, quality=None, bands=False, shifts=None):
+    # bands: also the median, interquartile and 5-95 % range of the replicates
+    # shifts: time shift (s) of replicates by path (cone_shifts), subtracted before averaging
+    paths = cone_paths(series_name, quality)
+
+    # Read data, one replicate at a time into the running statistics
+    stats = GridStatistics('Time (s)', 1, CAPACITY if bands else None)
+    for i, path in enumerate(paths):
+        # resample to 1 s while reading (high frequency exports are never fully loaded)
+        df_interp = stream_resample(path, "Time (s)", 1, Cone_columns)
+        shift = shifts.get(path, 0) if shifts else 0
+        stats.add(df_interp['Time (s)'] - shift, {'HRR (kW/m2)': df_interp['HRR (kW/m2)']})
+
+    #average: mean of all non-NaN values in rows i-2..i+2 of all replicates
+    df_average = pd.DataFrame({'Time (s)': stats.grid()})
+    n=2
+    df_average['HRR (kW/m2)'], df_average['unc HRR (kW/m2)'] = stats.smoothed('HRR (kW/m2)', n)
+    if bands:
+        df_average = df_average.assign(**stats.band_columns('HRR (kW/m2)', 'HRR (kW/m2)'))
+
+
+    return df_average
+
+
+@timed
+def calculate_int_HRR(df:pd.DataFrame):
+    total_hrr = np.zeros(len(df))
+    for i in range(1, len(df)):
+        total_hrr[i] = total_hrr[i-1] + 0.5 * (df['HRR (kW/m2)'].iloc[i-1] + df['HRR (kW/m2)'].iloc[i]) * (df['Time (s)'].iloc[i] - df['Time (s)'].iloc[i-1])
+    df['Int HRR'] = total_hrr
+    return df
+
+
+def cone_replicate(path:Path):
+    """calculate_int_HRR of a replicate file, from the cache if unchanged"""
+    recipe = {'function': 'Cone calculate_int_HRR', 'columns': Cone_columns}
+    return derived(path, recipe, lambda: calculate_int_HRR(read_series(path, Cone_columns)))
+
+
+@timed
+def Calculate_dm_dt(df:pd.DataFrame):
+    dt = df['Time (s)'].shift(-2) - df['Time (s)'].shift(2)
+    df['dm/dt'] = (df['Mass (g)'].shift(2) - df['Mass (g)'].shift(-2)) / dt
+    return df
+
+
+# sample area (m2) of the gasification apparatus of each institute
+GASIFICATION_AREA = {'TIFP+UCT': 0.01, 'FSRI': 0.00385}
+
+
+def gasification_mlr(df:pd.DataFrame, institute:str):
+    """Smoothed mass loss rate per area (g/(s m2)) of a gasification replicate (output of Calculate_dm_dt)"""
+    return savgol(df['dm/dt'] / GASIFICATION_AREA[institute], 41, 3)
+
+
+@timed
+def gasification_shifts(groups, method="xcorr"):
+    """
+    Time shifts (s) of gasification replicates (groups of paths) aligned on their mass
+    loss rate per area within each group (Alignment.py, all groups in one batch), by
+    path; replicates of institutes without a sample area are not aligned
+    """
+    from Alignment import align
+    groups = [[p for p in paths if parse_name(p)['institute'] in GASIFICATION_AREA] for paths in groups]
+    groups = [paths for paths in groups if paths]
+    curves = []
+    for paths in groups:
+        curves.append([])
+        for path in paths:
+            df = Calculate_dm_dt(stream_resample(path, "Time (s)", 1, ['Time (s)', 'Mass (g)'])).dropna(subset=['dm/dt'])
+            curves[-1].append((df['Time (s)'], gasification_mlr(df, parse_name(path)['institute'])))
+    shifts = align(curves, 1, method) if groups else []
+    return {p: s for paths, group in zip(groups, shifts) for p, s in zip(paths, group)}
+
+
+def cone_metrics(df:pd.DataFrame, institute:str, HRR_ignition:float=HRR_IGNITION):
+    """Ignition time and effective heat of combustion of one replicate (output of calculate_int_HRR)"""
+    burning = df[df['HRR (kW/m2)'] >= HRR_ignition].index
+    ignition_time = df["Time (s)"].iloc[burning[0]]
+    index_start, index_end = burning[0], burning[-1]
+    A_surf = 0.01 if institute == 'UDRI' else 0.00884
+    HOC = A_surf*(df['Int HRR'][index_end]-df['Int HRR'][index_start])/(df['Mass (g)'][index_start]-df['Mass (g)'][index_end])
+    return {'ignition time': ignition_time, 'HOC': HOC}
@@ -0,0 +1,120 @@
+# DSC analysis functions (used by DSC_analysis.py)
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from Instrument import timed
+from Utils import DATA_DIR, GRID_STEP, device_data, interpolation, savgol, series_paths
+from Readers import read_series
+from Screening import quality_filter
+from Cache import derived
+from Streaming import GridStatistics, CAPACITY
+
+
+# Columns used in the DSC analysis (STA mass is only read for the heats of reaction)
+DSC_columns = ['Time (s)', 'Temperature (K)', 'Heat Flow Rate (W/g)']
+
+# All DSC data (including STA)
+DSC_Data = device_data(DATA_DIR, 'DSC') + device_data(DATA_DIR, 'STA')
+
+
+@timed
+def Integral_DSC(df:pd.DataFrame):
+    
+    df = interpolation(df)
+
+    int_heatflow = np.zeros(len(df))
+    for i in range(1, len(df)):
+        int_heatflow[i] = int_heatflow[i-1] + 0.5 * (df['Heat Flow Rate (W/g)'].iloc[i-1] + df['Heat Flow Rate (W/g)'].iloc[i]) * (df['Time (s)'].iloc[i] - df['Time (s)'].iloc[i-1])
+    df['Int Heat Flow (J/g)'] = int_heatflow
+
+    return df
+
+
+def dsc_replicate(path:Path, columns=DSC_columns):
+    """Integral_DSC of `columns` of a replicate file (all with None), from the cache if unchanged"""
+    recipe = {'function': 'DSC Integral_DSC', 'columns': columns, 'grid_step': GRID_STEP}
+    return derived(path, recipe, lambda: Integral_DSC(read_series(path, columns)))
+
+
+
+
+@timed
+def average_dsc_series(series_name: str, quality=None, bands=False):
+    # bands: also the median, interquartile and 5-95 % range of the replicates
+    
+    paths = series_paths(series_name, partial=True)
+    paths = [p for p in paths if "TEMPLATE" not in str(p)]
+    paths = [p for p in paths if p in DSC_Data]
+
+    # Apply exclusions of the quality report
+    if quality is not None:
+        paths = quality_filter(paths, quality)
+
+    if len(paths) == 0:
+        raise Exception((f"No files found for series {series_name}", "red"))
+
+    # Read data, one replicate at a time into the running statistics
+    stats = GridStatistics('Temperature (K)', GRID_STEP, CAPACITY if bands else None)
+    for i, path in enumerate(paths):
+        # calculate integral (or read from the cache)
+        df = dsc_replicate(path)
+        stats.add(df['Temperature (K)'], {'Heat Flow Rate (W/g)': df['Heat Flow Rate (W/g)'],
+                                          'Int Heat Flow (J/g)': df['Int Heat Flow (J/g)']})
+
+    #average: mean of all non-NaN values in rows i-2..i+2 of all replicates
+    df_average = pd.DataFrame({'Temperature (K)': stats.grid()})
+    n=2
+    df_average['Heat Flow Rate (W/g)'], df_average['unc Heat Flow Rate (W/g)'] = stats.smoothed('Heat Flow Rate (W/g)', n)
+    df_average['Int Heat Flow (J/g)'], df_average['unc Int Heat Flow (J/g)'] = stats.smoothed('Int Heat Flow (J/g)', n)
+    if bands:
+        df_average = df_average.assign(**stats.band_columns('Heat Flow Rate (W/g)', 'Heat Flow Rate (W/g)'))
+    return df_average
+
+
+def heat_of_reaction(df:pd.DataFrame):
+    """
+    Heat of reaction of one STA replicate (output of Integral_DSC with 'Mass (mg)'):
+    heat flow above a linear baseline between the points where the smoothed MLR
+    crosses 10 % of its peak, per normalized mass lost in between.
+    """
+    df['Normalized mass'] = df['Mass (mg)'] / np.mean(df['Mass (mg)'].iloc[0:5])
+    dt = df['Time (s)'].shift(-1) - df['Time (s)'].shift(1)
+    df['dm/dt unfiltered'] = (df['Normalized mass'].shift(1) - df['Normalized mass'].shift(-1)) / dt
+
+    df['dm/dt'] = savgol(df['dm/dt unfiltered'],41,3)
+
+    # Find peak MLR and its index
+    peak_MLR = df['dm/dt'].max()
+    peak_idx = df['dm/dt'].idxmax()
+
+    # Find threshold (10% of peak)and indices
+    threshold = 0.1 * peak_MLR
+    before_peak = df.loc[:peak_idx]
+    idx1 = before_peak[before_peak['dm/dt'] >= threshold].index[0]
+    after_peak = df.loc[peak_idx:]
+    idx2 = after_peak[after_peak['dm/dt'] <= threshold].index[0]
+
+    # Extract data for integration
+    T1 = df.loc[idx1, 'Temperature (K)']
+    T2 = df.loc[idx2, 'Temperature (K)']
+    HF1 = df.loc[idx1, 'Heat Flow Rate (W/g)']
+    HF2 = df.loc[idx2, 'Heat Flow Rate (W/g)']
+
+    # Subset data between the two indices
+    df_subset = df.loc[idx1:idx2].copy()
+
+    # Create linear baseline
+    df_subset['baseline'] = np.interp(
+        df_subset['Temperature (K)'],
+        [T1, T2],
+        [HF1, HF2]
+    )
+
+    # Subtract baseline from heat flow rate
+    df_subset['HF_corrected'] = df_subset['Heat Flow Rate (W/g)'] - df_subset['baseline']
+
+    # Integrate corrected heat flow rate with respect to time
+    value = np.trapezoid(df_subset['HF_corrected'], df_subset['Time (s)'])/(df['Normalized mass'][idx1]- df['Normalized mass'][idx2])
+    return {'T start': T1, 'T end': T2, 'heat of reaction': value}
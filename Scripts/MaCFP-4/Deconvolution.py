@@ -0,0 +1,343 @@
+# peak deconvolution of the TGA mass loss rate into pseudo-components (hemicellulose, cellulose, lignin)
+#
+#   python Deconvolution.py                                      all TGA sets
+#   python Deconvolution.py --series Wood_*_N2 --shape bi-gaussian -o dtg.csv
+#   python Deconvolution.py --components hemicellulose,cellulose --workers 8
+#
+# The MLR over temperature of every replicate and every averaged curve (average_tga_series)
+# is fitted by a sum of asymmetric peaks (least squares, with the residual and the Jacobian
+# of all peaks computed at once). The sets of one institute and atmosphere form a chain
+# over the heating rates, fitted in one worker of a process pool: the fit of an averaged
+# curve starts from the fit of the previous heating rate (peaks moved with the maximum of
+# the curve), the fits of the replicates start from the fit of their average. The parent
+# reads the curves of every set once (ensemble) into shared memory (SharedArrays.py), the
+# workers fit from read-only views of the buffers.
+#
+# The peak temperature and width of each component stay near their initial values (relative
+# to the maximum of the fitted curve, TP_SHIFT and WIDTH_FACTOR).
+#
+# Per component: peak temperature, width (FWHM) and mass (area over the temperature range of
+# the fit divided by the heating rate, fraction of the initial mass), with the standard
+# deviation from the covariance of the fit; summary() adds the standard deviation over the
+# replicates. Fits whose components together lose more mass than the curve (MASS_TOLERANCE)
+# are not valid: they are reported without standard deviations, not used as initial values
+# and not part of the scatter of the replicates.
+from __future__ import annotations
+
+import argparse
+import fnmatch
+import re
+
+from functools import reduce
+
+from Lazy import lazy_import
+from Utils import parse_name, series_paths, label_def, render_table
+from SharedArrays import SharedEnsembles, map_shared
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+SHAPES = ("fraser-suzuki", "bi-gaussian")
+
+# pseudo-components of wood: peak temperature relative to the maximum of the curve (K),
+# width (FWHM, K) and height relative to the maximum
+MATERIAL = "Wood"
+COMPONENTS = {
+    'hemicellulose': (-45, 50, 0.35),
+    'cellulose': (0, 30, 1.0),
+    'lignin': (0, 200, 0.1),
+}
+
+# temperature range of the fit (K) and parameter bounds: height, peak temperature, width, asymmetry
+T_RANGE = (400, 900)
+BOUNDS = {
+    "fraser-suzuki": ((0, T_RANGE[0], 2, -1.5), (float('inf'), T_RANGE[1], 600, 1.5)),
+    "bi-gaussian": ((0, T_RANGE[0], 1, 1), (float('inf'), T_RANGE[1], 300, 300)),
+}
+# peak temperature within +-TP_SHIFT (K) of its initial value, widths within a factor WIDTH_FACTOR
+TP_SHIFT = 60
+WIDTH_FACTOR = 2
+WIDTHS = {"fraser-suzuki": [2], "bi-gaussian": [2, 3]}   # width parameters of the shapes
+# relative excess of the summed component mass over the mass loss of the curve of a valid fit
+MASS_TOLERANCE = 0.05
+# grid of the mass integral
+T_GRID_POINTS = 1001
+LN2 = 0.6931471805599453
+
+COLUMNS = ['set', 'replicate', 'Duck', 'atmosphere', 'heating rate', 'component',
+           'T peak', 'std T peak', 'FWHM', 'std FWHM', 'mass', 'std mass', 'rms', 'valid']
+
+
+def fraser_suzuki(T, p):
+    """
+    Fraser-Suzuki peaks h exp(-ln2 / a^2 ln(1 + 2a (T - Tp) / w)^2) of the parameters
+    p (peak x [h, Tp, w, a]) at T: values (peak x point) and derivatives (peak x parameter x point)
+    """
+    h, Tp, w, a = (p[:, i, None] for i in range(4))
+    a = np.where(np.abs(a) < 1e-6, np.copysign(1e-6, a), a)
+    d = T[None, :] - Tp
+    u = 1 + 2 * a * d / w
+    inside = u > 0
+    u = np.where(inside, u, 1.0)
+    L = np.log(u)
+    e = np.where(inside, np.exp(-LN2 * L**2 / a**2), 0.0)
+    f = h * e
+    g = 4 * LN2 * L / (a * w * u)
+    jac = np.stack([e, f * g, f * g * d / w, f * LN2 * (2 * L**2 / a**3 - 4 * L * d / (a**2 * w * u))], axis=1)
+    return f, jac
+
+
+def bi_gaussian(T, p):
+    """
+    Gaussian peaks of different widths below and above the peak temperature, parameters
+    p (peak x [h, Tp, s_low, s_high]): values (peak x point) and derivatives (peak x parameter x point)
+    """
+    h, Tp, s_low, s_high = (p[:, i, None] for i in range(4))
+    d = T[None, :] - Tp
+    low = d < 0
+    s = np.where(low, s_low, s_high)
+    e = np.exp(-d**2 / (2 * s**2))
+    f = h * e
+    jac = np.stack([e, f * d / s**2, np.where(low, f * d**2 / s**3, 0.0), np.where(low, 0.0, f * d**2 / s**3)], axis=1)
+    return f, jac
+
+
+PEAKS = {"fraser-suzuki": fraser_suzuki, "bi-gaussian": bi_gaussian}
+
+
+def initial(T, y, components:dict, shape:str):
+    """Parameters (peak x 4) of the pseudo-components relative to the maximum of y(T)"""
+    i = np.argmax(y)
+    p = []
+    for offset, width, height in components.values():
+        if shape == "fraser-suzuki":
+            p.append((height * y[i], T[i] + offset, width, -0.2))
+        else:
+            p.append((height * y[i], T[i] + offset, width / 2.3548, width / 2.3548))
+    return np.array(p, dtype=np.float64)
+
+
+def limits(T, y, components:dict, shape:str):
+    """
+    Lower and upper bounds (peak x 4 each) of the parameters for y(T): peak temperature
+    and widths around their initial values (see initial), within BOUNDS
+    """
+    nominal = initial(T, y, components, shape)
+    lo, hi = (np.tile(b, (len(nominal), 1)).astype(np.float64) for b in BOUNDS[shape])
+    lo[:, 1] = np.maximum(lo[:, 1], nominal[:, 1] - TP_SHIFT)
+    hi[:, 1] = np.minimum(hi[:, 1], nominal[:, 1] + TP_SHIFT)
+    widths = WIDTHS[shape]
+    lo[:, widths] = np.maximum(lo[:, widths], nominal[:, widths] / WIDTH_FACTOR)
+    hi[:, widths] = np.minimum(hi[:, widths], nominal[:, widths] * WIDTH_FACTOR)
+    return lo, np.maximum(hi, lo + 1e-6)
+
+
+def fit(T, y, guess, shape:str, bounds=None):
+    """
+    Least squares fit of a sum of peaks to y(T), within `bounds` (lower and upper,
+    peak x 4 each; BOUNDS of the shape if None).
+
+    Returns
+    -------
+    numpy.ndarray
+        Parameters (peak x 4)
+    numpy.ndarray
+        Covariance of the parameters (4 peaks x 4 peaks), s^2 (J^T J)^-1, NaN for the
+        parameters at a bound (no meaningful uncertainty)
+    float
+        Root mean square of the residual
+    """
+    from scipy.optimize import least_squares
+    peaks, n = PEAKS[shape], len(guess)
+    scale = np.max(np.abs(y))
+    if bounds is None:
+        lo, hi = (np.tile(b, n).astype(np.float64) for b in BOUNDS[shape])
+    else:
+        lo, hi = (np.ravel(b / np.array([scale, 1, 1, 1])) for b in bounds)
+    x0 = np.clip((np.asarray(guess, dtype=np.float64) / [scale, 1, 1, 1]).ravel(), lo + 1e-9, hi - 1e-9)
+
+    def residual(x):
+        return peaks(T, x.reshape(n, 4))[0].sum(axis=0) - y / scale
+
+    def jacobian(x):
+        return peaks(T, x.reshape(n, 4))[1].reshape(4 * n, len(T)).T
+
+    result = least_squares(residual, x0, jac=jacobian, bounds=(lo, hi), x_scale='jac')
+    p = result.x.reshape(n, 4) * [scale, 1, 1, 1]
+    units = np.tile([scale, 1, 1, 1], n)
+    s2 = 2 * result.cost / max(len(T) - 4 * n, 1)
+    cov = s2 * np.linalg.pinv(result.jac.T @ result.jac) * np.outer(units, units)
+    at_bound = result.active_mask != 0
+    cov[at_bound, :] = cov[:, at_bound] = np.nan
+    return p, cov, np.sqrt(2 * result.cost / len(T)) * scale
+
+
+def _derived(p, shape:str, heating_rate:float):
+    """Peak temperature, FWHM and mass (over T_RANGE) of each peak (peak x 3)"""
+    h, Tp, w, a = p.T
+    if shape == "fraser-suzuki":
+        a = np.where(np.abs(a) < 1e-6, 1e-6, a)
+        fwhm = w * np.sinh(a) / a
+    else:
+        fwhm = np.sqrt(2 * LN2) * (w + a)
+    T = np.linspace(*T_RANGE, T_GRID_POINTS)
+    area = np.trapezoid(PEAKS[shape](T, p)[0], T, axis=1)
+    return np.stack([Tp, fwhm, area / heating_rate], axis=1)
+
+
+def components(p, cov, shape:str, heating_rate:float):
+    """Peak temperature, FWHM, mass (peak x 3) and their standard deviations (delta method)"""
+    values = _derived(p, shape, heating_rate)
+    step = 1e-6 * np.maximum(np.abs(p), 1e-12)
+    grad = np.empty(p.shape + (3,))   # peak x parameter x value, central differences
+    for j in range(4):
+        dp = np.zeros_like(p)
+        dp[:, j] = step[:, j]
+        grad[:, j] = (_derived(p + dp, shape, heating_rate) - _derived(p - dp, shape, heating_rate)) / (2 * step[:, j, None])
+    blocks = np.stack([cov[4 * k:4 * k + 4, 4 * k:4 * k + 4] for k in range(len(p))])
+    var = np.einsum('kiv,kij,kjv->kv', grad, blocks, grad)
+    return values, np.sqrt(np.maximum(var, 0))
+
+
+def _curve(frame, column:str):
+    T, _ = frame.column('Temperature (K)')
+    y, ok = frame.column(column)
+    ok = ok & (T >= T_RANGE[0]) & (T <= T_RANGE[1])
+    return T[ok], y[ok]
+
+
+def heating_rate(series:str):
+    """Nominal heating rate (K/s) of a set from its name, None for isothermal sets"""
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)K", parse_name(series)['heating_rate'])
+    return float(match.group(1)) / 60 if match else None
+
+
+def chains(sets):
+    """
+    Sets of one institute, material, device and atmosphere, by ascending heating rate
+    (no isothermal sets, no sets of other materials than that of the pseudo-components)
+    """
+    groups = {}
+    for series in sets:
+        if heating_rate(series) is not None and parse_name(series)['material'] == MATERIAL:
+            groups.setdefault(series.rsplit('_', 1)[0], []).append(series)
+    return [sorted(g, key=heating_rate) for _, g in sorted(groups.items())]
+
+
+def valid(T, y, p, shape:str):
+    """True if the peaks p together lose no more mass than y(T) (within MASS_TOLERANCE)"""
+    loss = np.trapezoid(y, T)
+    return bool(_derived(p, shape, 1.0)[:, 2].sum() <= loss * (1 + MASS_TOLERANCE))
+
+
+def _rows(series:str, replicate, p, cov, rms, ok:bool, names, shape:str):
+    meta = parse_name(series)
+    values, std = components(p, cov, shape, heating_rate(series))
+    if not ok:
+        std = np.full_like(std, np.nan)
+    return [{'set': series, 'replicate': replicate, 'Duck': label_def(meta['institute'])[0],
+             'atmosphere': meta['atmosphere'], 'heating rate': meta['heating_rate'], 'component': name,
+             'T peak': v[0], 'std T peak': s[0], 'FWHM': v[1], 'std FWHM': s[1], 'mass': v[2], 'std mass': s[2],
+             'rms': rms, 'valid': ok} for name, v, s in zip(names, values, std)]
+
+
+def ensemble(series:str, data=None):
+    """
+    MLR over temperature of the averaged curve ('average') and of every replicate (file name)
+    of a set on one temperature grid, NaN where a curve has no value
+    """
+    from TGA_functions import TGA_Data, average_tga_series, tga_replicate
+    data = set(TGA_Data) if data is None else data
+    avg = average_tga_series(series)
+    curves = {'average': (avg['Temperature (K)'], avg['MLR (1/s)'])}
+    for path in sorted(q for q in series_paths(series) if q in data):
+        df = tga_replicate(path)
+        curves[path.stem] = (df['Temperature (K)'], df['dm/dt'])
+    T = reduce(np.union1d, [np.asarray(t, dtype=np.float64) for t, _ in curves.values()])
+    values = np.full((len(T), len(curves) + 1), np.nan)
+    values[:, 0] = T
+    for j, (t, y) in enumerate(curves.values(), 1):
+        values[np.searchsorted(T, np.asarray(t, dtype=np.float64)), j] = y
+    return pd.DataFrame(values, columns=['Temperature (K)', *curves])
+
+
+def fit_chain(frames:dict, components:dict=COMPONENTS, shape:str="fraser-suzuki"):
+    """
+    Fits of the averaged curve and the replicates of each set of a chain (list of row dicts),
+    frames: set name -> ensemble (SharedFrame) by ascending heating rate
+    """
+    rows, previous = [], None
+    for series, frame in frames.items():
+        T, y = _curve(frame, 'average')
+        if len(T) <= 4 * len(components):
+            continue
+        if previous is None:
+            guess = initial(T, y, components, shape)
+        else:
+            # peaks of the previous heating rate, moved with the maximum of the curve
+            p, T_max, y_max = previous
+            guess = p + [[0, T[np.argmax(y)] - T_max, 0, 0]]
+            guess[:, 0] *= y.max() / y_max
+        p, cov, rms = fit(T, y, guess, shape, limits(T, y, components, shape))
+        ok = valid(T, y, p, shape)
+        rows += _rows(series, 'average', p, cov, rms, ok, list(components), shape)
+        previous = (p, T[np.argmax(y)], y.max()) if ok else None
+        for name in frame.columns[2:]:
+            T_r, y_r = _curve(frame, name)
+            if len(T_r) > 4 * len(components):
+                start = p if ok else initial(T_r, y_r, components, shape)
+                p_r, cov_r, rms_r = fit(T_r, y_r, start, shape, limits(T_r, y_r, components, shape))
+                rows += _rows(series, parse_name(name)['replicate'], p_r, cov_r, rms_r, valid(T_r, y_r, p_r, shape),
+                              list(components), shape)
+    return rows
+
+
+def deconvolve(sets, components:dict=COMPONENTS, shape:str="fraser-suzuki", workers:int=4):
+    """Fits of every set (chains of heating rates in a process pool), one row per fit and component"""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown peak shape {shape}, use {SHAPES}")
+    from TGA_functions import TGA_Data
+    data = set(TGA_Data)
+    groups = chains(sets)
+    with SharedEnsembles() as shared:
+        for series in (s for chain in groups for s in chain):
+            shared.publish(series, ensemble(series, data))
+        results = map_shared(fit_chain, shared, groups, components, shape, workers=workers)
+    return pd.DataFrame([row for rows in results for row in rows], columns=COLUMNS)
+
+
+def summary(table:pd.DataFrame):
+    """Fits of the averaged curves with the number and standard deviation of the valid replicate fits"""
+    average = table[table['replicate'] == 'average']
+    replicates = table[(table['replicate'] != 'average') & table['valid']].groupby(['set', 'component'], sort=False)
+    scatter = replicates[['T peak', 'FWHM', 'mass']].std().add_prefix('std replicates ')
+    scatter.insert(0, 'replicates', replicates.size())
+    return average.drop(columns=['replicate', 'rms']).merge(scatter.reset_index(), on=['set', 'component'], how='left')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Peak deconvolution of the TGA mass loss rate into pseudo-components")
+    parser.add_argument("--series", default="*", help="sets (glob pattern of the set names), e.g. Wood_*_N2")
+    parser.add_argument("--shape", default="fraser-suzuki", choices=SHAPES)
+    parser.add_argument("--components", default=','.join(COMPONENTS), help=f"comma separated, of {list(COMPONENTS)}")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--format", default="console", choices=["console", "csv", "latex"])
+    parser.add_argument("-o", "--output", help="CSV file of all fits (averages and replicates)")
+    args = parser.parse_args()
+
+    names = [c.strip() for c in args.components.split(',') if c.strip()]
+    unknown = [c for c in names if c not in COMPONENTS]
+    if unknown:
+        parser.error(f"unknown component(s) {unknown}, use {list(COMPONENTS)}")
+
+    from TGA_functions import TGA_Data
+    from Utils import get_series_names
+    sets = [s for s in get_series_names(TGA_Data)
+            if fnmatch.fnmatch(s, args.series) or fnmatch.fnmatch(s, f"*{args.series}*")]
+    if not sets:
+        parser.error(f"no TGA sets match {args.series}")
+    table = deconvolve(sets, {c: COMPONENTS[c] for c in names}, args.shape, args.workers)
+    print(render_table(summary(table), args.format))
+    if args.output:
+        table.to_csv(args.output, index=False)
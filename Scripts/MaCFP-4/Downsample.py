@@ -0,0 +1,118 @@
+# visual downsampling of dense raw data overlays (reduce to what the axes can show in pixels)
+import numpy as np
+import matplotlib
+
+
+def pixel_width(ax):
+    """Width of the axes in pixels of the saved figure (savefig.dpi)"""
+    fig = ax.figure
+    dpi = matplotlib.rcParams['savefig.dpi']
+    dpi = fig.dpi if dpi == 'figure' else dpi
+    return max(int(ax.get_position().width * fig.get_size_inches()[0] * dpi), 1)
+
+
+def _finite(x, y):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    keep = np.isfinite(x) & np.isfinite(y)
+    return x[keep], y[keep]
+
+
+def lttb(x, y, n_out:int):
+    """
+    Largest-triangle-three-buckets: n_out points of (x, y) that keep the visual shape
+    of the line (first and last point are always kept).
+    """
+    x, y = _finite(x, y)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (the last point for the last bucket)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return x[idx], y[idx]
+
+
+def minmax(x, y, n_buckets:int, xlim=None):
+    """
+    Minimum and maximum of y in each of n_buckets columns of equal width over xlim
+    (default the range of x), e.g. the pixel columns of the axes; ordered by x
+    """
+    x, y = _finite(x, y)
+    if len(x) == 0:
+        return x, y
+    lo, hi = xlim if xlim is not None else (x.min(), x.max())
+    if hi > lo:
+        bucket = np.clip(np.floor((x - lo) / (hi - lo) * n_buckets), 0, n_buckets - 1).astype(np.int64)
+    else:
+        bucket = np.zeros(len(x), dtype=np.int64)
+    order = np.lexsort((y, bucket))
+    first = np.r_[0, np.flatnonzero(np.diff(bucket[order])) + 1]
+    last = np.r_[first[1:] - 1, len(x) - 1]
+    idx = np.unique(np.r_[order[first], order[last]])
+    idx = idx[np.argsort(x[idx], kind='stable')]
+    return x[idx], y[idx]
+
+
+def overlay(ax, x, y, *args, method:str='minmax', rasterized:bool=True, **kwargs):
+    """
+    ax.plot for one dense raw series: the series is reduced to the pixel width of the
+    axes (min-max per pixel column for point clouds, 'lttb' for lines) before
+    plotting, and rasterized in vector output. Raw points of many replicates on one
+    axes are pooled with Overlay instead.
+    """
+    width = pixel_width(ax)
+    if method == 'lttb':
+        xd, yd = lttb(x, y, 2 * width)
+    elif method == 'minmax':
+        xd, yd = minmax(x, y, width)
+    else:
+        raise ValueError(f"Unknown downsampling method {method}")
+    return ax.plot(xd, yd, *args, rasterized=rasterized, **kwargs)
+
+
+class Overlay:
+    """
+    Raw points of many replicates on one axes, pooled by style and reduced to the
+    minimum and maximum of each pixel column of the axes (over the x range of all
+    points) before plotting: one rasterized artist per style, so the cost depends
+    on the pixel width and not on the number of replicates or samples.
+
+        raw = Overlay()
+        for path in paths:
+            raw.add(df['Temperature (K)'], df['dm/dt'], '.', color=color[hr], markersize=0.01)
+        raw.draw(ax)
+    """
+
+    def __init__(self):
+        self._groups = {}
+
+    def add(self, x, y, *args, **style):
+        """Add the points of a replicate; the plot arguments and keywords are the group"""
+        key = (args, tuple(sorted(style.items())))
+        self._groups.setdefault(key, []).append(_finite(x, y))
+        return self
+
+    def draw(self, ax, rasterized:bool=True):
+        """Plot every group on `ax`, returns the artists"""
+        parts = [xy for group in self._groups.values() for xy in group if len(xy[0])]
+        if not parts:
+            return []
+        xlim = (min(x.min() for x, _ in parts), max(x.max() for x, _ in parts))
+        width = pixel_width(ax)
+        artists = []
+        for (args, style), group in self._groups.items():
+            x = np.concatenate([x for x, _ in group])
+            y = np.concatenate([y for _, y in group])
+            xd, yd = minmax(x, y, width, xlim)
+            artists += ax.plot(xd, yd, *args, rasterized=rasterized, **dict(style))
+        return artists
@@ -0,0 +1,232 @@
+# figure output of the analysis scripts: command line options and a background writer
+# (matplotlib and PIL are imported on first use, script_options answers --help without them)
+import argparse
+import atexit
+import hashlib
+import io
+import json
+import os
+import threading
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from Lazy import lazy_import
+from Instrument import stage
+
+np = lazy_import("numpy")
+
+
+FORMATS = ('png', 'pdf', 'svg', 'jpg', 'eps')
+
+
+def script_options(description:str):
+    """Command line options shared by the analysis scripts"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--format', default='png',
+                        help="figure formats, comma separated (e.g. png,pdf)")
+    parser.add_argument('--writers', type=int, default=4, help="figure writer threads")
+    parser.add_argument('--max-pending', type=int, default=16,
+                        help="figures waiting to be written before the analysis blocks")
+    parser.add_argument('--force', action='store_true',
+                        help="write all figures, also those unchanged since the last run")
+    args = parser.parse_args()
+    args.formats = [f.strip().lower() for f in args.format.split(',') if f.strip()]
+    unknown = [f for f in args.formats if f not in FORMATS]
+    if unknown:
+        parser.error(f"unknown format(s) {unknown}, use {FORMATS}")
+    return args
+
+
+# artist properties that determine the rendered figure (the getters that exist are used)
+HASHED_PROPERTIES = [
+    'get_xydata', 'get_paths', 'get_offsets', 'get_sizes', 'get_text', 'get_position',
+    'get_color', 'get_facecolor', 'get_edgecolor', 'get_linestyle', 'get_linewidth',
+    'get_marker', 'get_markersize', 'get_markerfacecolor', 'get_drawstyle', 'get_alpha',
+    'get_zorder', 'get_visible', 'get_label', 'get_fontsize', 'get_fontweight',
+    'get_rotation', 'get_horizontalalignment', 'get_verticalalignment', 'get_xlim',
+    'get_ylim', 'get_xscale', 'get_yscale', 'get_width', 'get_height', 'get_xy',
+    'get_hatch', 'get_array', 'get_clim', 'get_rasterized',
+]
+
+
+def _feed(h, value):
+    if isinstance(value, np.ndarray):
+        h.update(str((value.dtype, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif hasattr(value, 'vertices'):  # Path
+        _feed(h, np.asarray(value.vertices))
+        _feed(h, value.codes)
+    elif isinstance(value, (list, tuple)):
+        h.update(b'[')
+        for v in value:
+            _feed(h, v)
+        h.update(b']')
+    elif value is None or isinstance(value, (str, int, float, bool, np.generic)):
+        h.update(repr(value).encode())
+    else:
+        # other objects (bboxes, masked arrays) by their numeric content
+        _feed(h, np.asarray(getattr(value, 'bounds', value), dtype=object).astype(str))
+
+
+def figure_hash(fig, *extra):
+    """
+    Hash of everything that determines the output of a figure: the data and style of
+    all artists, the figure size, all rcParams (set_plot_style) and the matplotlib version.
+    """
+    import matplotlib
+    h = hashlib.sha1()
+    _feed(h, [matplotlib.__version__, repr(sorted(matplotlib.rcParams.items())), list(extra)])
+    _feed(h, [tuple(fig.get_size_inches()), fig.dpi, fig.get_facecolor()])
+    for artist in fig.findobj(include_self=False):
+        h.update(type(artist).__name__.encode())
+        for name in HASHED_PROPERTIES:
+            getter = getattr(artist, name, None)
+            if getter is not None:
+                try:
+                    _feed(h, getter())
+                except (TypeError, ValueError, AttributeError):
+                    pass
+    return h.hexdigest()
+
+
+class FigureWriter:
+    """
+    Writes figures in a pool of threads, in every requested format.
+
+    The figure is rendered on the calling thread (matplotlib is not thread safe)
+    and closed right away; PNG compression and the file output run in the
+    writer threads. At most `max_pending` figures wait for a writer, further
+    calls to save() block until one is done (backpressure). Writes to the same
+    path run in the order of the save() calls (the last one wins).
+
+    With a `manifest` file, figures whose content hash (see figure_hash) is the
+    same as in the last run and whose files exist are neither rendered nor
+    written again, unless `force`. A figure enters the manifest once its files
+    are written.
+    """
+
+    def __init__(self, formats=('png',), workers:int=4, max_pending:int=16, manifest:Path=None, force:bool=False):
+        self.formats = list(formats)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='figure-writer')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self._last = {}    # last write job of every path
+        self.manifest = Path(manifest) if manifest is not None else None
+        self.force = force
+        self._previous = {}   # manifest of the last run
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+        if self.manifest is not None and self.manifest.exists():
+            self._previous = json.loads(self.manifest.read_text())
+            self._entries = dict(self._previous)
+        atexit.register(self.close)
+
+    def _key(self, path:Path):
+        try:
+            return path.resolve().relative_to(self.manifest.parent.resolve()).as_posix()
+        except ValueError:
+            return str(path.resolve())
+
+    def save(self, fig, path, close:bool=True):
+        """
+        Write `fig` to `path` in all formats (the suffix of `path` is replaced by
+        each format) and close it (keep it open with close=False, e.g. for zoom variants).
+        """
+        import matplotlib
+        import matplotlib.pyplot as plt
+        path = Path(path)
+        if path.suffix.lstrip('.').lower() in FORMATS:
+            path = path.with_suffix('')
+        dpi = matplotlib.rcParams['savefig.dpi']
+        dpi = fig.dpi if dpi == 'figure' else dpi
+
+        entry = None
+        if self.manifest is not None:
+            with stage('hash', path.name):
+                digest = figure_hash(fig, self.formats, dpi)
+            key = self._key(path)
+            targets = [path.with_name(f'{path.name}.{fmt}') for fmt in self.formats]
+            if not self.force and self._previous.get(key) == digest and all(t.exists() for t in targets):
+                self.skipped += 1
+                if close:
+                    plt.close(fig)
+                return
+            entry = (key, digest)
+            with self._lock:
+                # the files change now, the entry is back once they are written
+                self._entries.pop(key, None)
+
+        jobs = []
+        with stage('render', path.name):
+            for fmt in self.formats:
+                if fmt == 'png':
+                    # raw RGBA here, PNG encoding in the writer thread
+                    buf = io.BytesIO()
+                    fig.savefig(buf, format='rgba', dpi=dpi)
+                    width, height = (int(v) for v in fig.get_size_inches() * dpi)
+                    if len(buf.getvalue()) == 4 * width * height:
+                        jobs.append((fmt, ('rgba', buf.getvalue(), (width, height), dpi)))
+                    else:
+                        buf = io.BytesIO()
+                        fig.savefig(buf, format=fmt, dpi=dpi)
+                        jobs.append((fmt, ('bytes', buf.getvalue())))
+                else:
+                    buf = io.BytesIO()
+                    fig.savefig(buf, format=fmt, dpi=dpi)
+                    jobs.append((fmt, ('bytes', buf.getvalue())))
+        if close:
+            plt.close(fig)
+
+        self._slots.acquire()
+        future = self._pool.submit(self._write, path, jobs, self._last.get(path), entry)
+        self._last[path] = future
+        self._futures.append(future)
+        self._futures = [f for f in self._futures if not f.done() or f.exception()]
+        self._last = {p: f for p, f in self._last.items() if not f.done()}
+
+    def _write(self, path, jobs, previous=None, entry=None):
+        import matplotlib
+        from PIL import Image, PngImagePlugin
+        try:
+            if previous is not None:
+                # an earlier figure of the same path (submitted before, so already running or done)
+                wait([previous])
+            for fmt, job in jobs:
+                target = path.with_name(f'{path.name}.{fmt}')
+                with stage('write', target.name):
+                    if job[0] == 'rgba':
+                        _, data, size, dpi = job
+                        info = PngImagePlugin.PngInfo()
+                        info.add_text('Software', f'Matplotlib version{matplotlib.__version__}, https://matplotlib.org/')
+                        Image.frombuffer('RGBA', size, data, 'raw', 'RGBA', 0, 1).save(
+                            target, format='png', dpi=(dpi, dpi), pnginfo=info)
+                    else:
+                        target.write_bytes(job[1])
+            if entry is not None:
+                with self._lock:
+                    self._entries[entry[0]] = entry[1]
+        finally:
+            self._slots.release()
+
+    def flush(self):
+        """Wait until all figures are written, raise the first error of a writer"""
+        futures, self._futures = self._futures, []
+        for f in futures:
+            f.result()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            # the figures written so far are kept in the manifest, also if a write failed
+            self._pool.shutdown(wait=True)
+            if self.manifest is not None:
+                if self.skipped:
+                    print(f"{self.skipped} unchanged figures not written again (--force to write all)")
+                    self.skipped = 0
+                tmp = self.manifest.with_suffix('.tmp')
+                with self._lock:
+                    tmp.write_text(json.dumps(self._entries, indent=1, sort_keys=True))
+                os.replace(tmp, self.manifest)
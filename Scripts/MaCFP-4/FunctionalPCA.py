@@ -0,0 +1,270 @@
+# functional PCA of the resampled curves: a low-rank basis per device and condition family
+#
+#   python FunctionalPCA.py fit                              fit all families, write the bases
+#   python FunctionalPCA.py fit --kinds TGA --variance 0.9999 --rank 30
+#   python FunctionalPCA.py summary                          rank, explained variance, errors, size
+#   python FunctionalPCA.py components "TGA Wood_N2" --by heating_rate
+#   python FunctionalPCA.py outliers "TGA Wood_N2" --alpha 0.01
+#   python FunctionalPCA.py clusters "Cone Wood_hor" -k 3
+#
+# Every replicate is resampled like Similarity.py embed, but on the grid of the averaged
+# curves (GRID_STEP, 1 s for the cone). The curves of a family (device, material and gas,
+# or orientation) are stacked into one (curve x point) array, each quantity scaled by its
+# standard deviation over the family, and the mean curve removed. A randomized SVD
+# (Gaussian range finder with power iterations, Halko et al. 2011) gives the leading
+# right singular vectors; the basis keeps the fewest that explain `variance` of the sum
+# of squares (at most `rank`). A curve is then its scores (coefficients) on the basis,
+# with the largest reconstruction error of each quantity in its own units. Analytics use
+# the scores only: the distance of two scaled curves differs from the distance of their
+# scores by at most the norms of their residuals, so after the fit the curves are not
+# needed in memory (a family of N curves of P points takes N x rank + (rank + 2) x P values
+# instead of N x P).
+from __future__ import annotations
+
+import argparse
+import importlib
+import os
+
+from pathlib import Path
+
+from Lazy import lazy_import
+from Similarity import KINDS, _grid, _relative, embed
+from Utils import GRID_STEP, SCRIPT_DIR, label_def, parse_name, render_table
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+BASIS_FILE = SCRIPT_DIR / "functional_basis.npz"
+
+STEPS = {"TGA": GRID_STEP, "MCC": GRID_STEP, "DSC": GRID_STEP, "Cone": 1}
+RANK = 20
+VARIANCE = 0.999
+OVERSAMPLE = 10
+POWER_ITERATIONS = 2
+SEED = 0
+ALPHA = 0.01
+
+
+def family(path:Path):
+    """Condition family of a file: material and gas (N2, O2) or orientation"""
+    meta = parse_name(path)
+    return f"{meta['material']}_{(meta['atmosphere'] or '').split('-')[0] or meta['orientation']}"
+
+
+def randomized_svd(a, rank:int, oversample:int=OVERSAMPLE, iterations:int=POWER_ITERATIONS, seed:int=SEED):
+    """Leading `rank` singular values and right singular vectors (rank x columns) of `a`"""
+    rng = np.random.default_rng(seed)
+    k = min(rank + oversample, *a.shape)
+    q, _ = np.linalg.qr(a @ rng.standard_normal((a.shape[1], k)))
+    for _ in range(iterations):   # re-orthonormalized power iterations
+        q, _ = np.linalg.qr(a.T @ q)
+        q, _ = np.linalg.qr(a @ q)
+    _, s, vt = np.linalg.svd(q.T @ a, full_matrices=False)
+    return s[:rank], vt[:rank]
+
+
+class FunctionalBasis:
+    """
+    Low-rank basis of the curves of one family and the scores of its curves.
+
+    Parameters
+    ----------
+    name : str
+        '<kind> <family>', e.g. 'TGA Wood_N2'
+    arrays : dict
+        grid, paths, mean, scale (per point), basis (rank x point), singular values,
+        scores (curve x rank), errors (curve x quantity, largest absolute reconstruction
+        error), residuals (curve, squared norm of the scaled residual)
+    """
+
+    FIELDS = ("grid", "paths", "mean", "scale", "basis", "singular values", "scores", "errors", "residuals")
+
+    def __init__(self, name:str, arrays:dict):
+        self.name = name
+        self.kind = name.split(' ')[0]
+        for field in self.FIELDS:
+            setattr(self, field.replace(' ', '_'), arrays[field])
+
+    @classmethod
+    def fit(cls, name:str, paths, curves, rank:int=RANK, variance:float=VARIANCE, seed:int=SEED):
+        """Basis of the (curve x point) array of the family `name`"""
+        kind = name.split(' ')[0]
+        curves = np.asarray(curves, dtype=np.float64)
+        quantities, points = len(KINDS[kind][5]), curves.shape[1] // len(KINDS[kind][5])
+        blocks = curves.reshape(len(curves), quantities, points)
+        scale = np.array([np.std(blocks[:, i]) for i in range(quantities)])
+        scale = np.repeat(np.where(scale > 0, scale, 1.0), points)
+        mean = curves.mean(axis=0)
+        centered = (curves - mean) / scale
+        total = np.einsum('ij,ij->', centered, centered)
+        s, vt = randomized_svd(centered, max(1, min(rank, len(curves) - 1)), seed=seed)
+        captured = np.cumsum(s**2) / total if total > 0 else np.ones(len(s))
+        r = min(int(np.searchsorted(captured, variance)) + 1, len(s))
+        model = cls(name, {"grid": _grid(kind, STEPS[kind]), "paths": np.array(paths, dtype=str), "mean": mean,
+                           "scale": scale, "basis": vt[:r], "singular values": s[:r],
+                           "scores": centered @ vt[:r].T, "errors": None, "residuals": None})
+        model.errors, model.residuals = model._errors(curves, model.scores)
+        return model
+
+    def reconstruct(self, scores):
+        """Curves (rows) of the scores"""
+        return self.mean + (np.atleast_2d(scores) @ self.basis) * self.scale
+
+    def project(self, curves):
+        """Scores, largest absolute errors per quantity and squared scaled residuals of new curves"""
+        curves = np.atleast_2d(np.asarray(curves, dtype=np.float64))
+        scores = ((curves - self.mean) / self.scale) @ self.basis.T
+        return (scores, *self._errors(curves, scores))
+
+    def _errors(self, curves, scores):
+        difference = curves - self.reconstruct(scores)
+        quantities = len(KINDS[self.kind][5])
+        errors = np.abs(difference).reshape(len(curves), quantities, -1).max(axis=2)
+        residuals = np.einsum('ij,ij->i', difference / self.scale, difference / self.scale)
+        return errors, residuals
+
+    def to_arrays(self):
+        return {f"{self.name} {field}": getattr(self, field.replace(' ', '_')) for field in self.FIELDS}
+
+    @property
+    def rank(self):
+        return len(self.singular_values)
+
+    def labels(self, by:str="institute"):
+        """Group of every curve: a parse_name field of its file, 'institute' as lab code"""
+        meta = [parse_name(p) for p in self.paths]
+        if by == "institute":
+            return [label_def(m['institute'])[0] for m in meta]
+        return [m[by] or '' for m in meta]
+
+    def summary(self):
+        total = np.einsum('ij,ij->', self.scores, self.scores) + self.residuals.sum()
+        curves, points = len(self.paths), len(self.mean)
+        row = {'family': self.name, 'curves': curves, 'points': points, 'rank': self.rank,
+               'explained': (self.singular_values**2).sum() / total if total > 0 else 1.0}
+        for (column, _), error in zip(KINDS[self.kind][5], self.errors.T):
+            row[f'max error {column}'] = error.max()
+        row['compression'] = curves * points / (curves * self.rank + (self.rank + 2) * points)
+        return row
+
+    def components(self, by:str="institute"):
+        """
+        Sum of squares of every component and of the residual, split into the part
+        between the groups (`by`) and within them, as shares of the total
+        """
+        groups = pd.Series(self.labels(by))
+        n = groups.value_counts().reindex(groups.unique()).to_numpy(dtype=np.float64)
+        group_means = pd.DataFrame(self.scores).groupby(groups.to_numpy(), sort=False).mean().to_numpy()
+        scores_ss = (self.scores**2).sum(axis=0)
+        between = (n[:, None] * group_means**2).sum(axis=0)
+        total = scores_ss.sum() + self.residuals.sum()
+        rows = [{'component': j + 1, 'explained': ss / total, 'cumulative': 0.0, f'between {by}': b / total,
+                 f'within {by}': (ss - b) / total} for j, (ss, b) in enumerate(zip(scores_ss, between))]
+        for row, c in zip(rows, np.cumsum(scores_ss) / total):
+            row['cumulative'] = c
+        rows.append({'component': 'residual', 'explained': self.residuals.sum() / total, 'cumulative': 1.0,
+                     f'between {by}': np.nan, f'within {by}': np.nan})
+        return pd.DataFrame(rows)
+
+    def outliers(self, alpha:float=ALPHA):
+        """
+        Hotelling T^2 of the scores and squared residual Q of every curve with their
+        1 - alpha limits (F distribution; Box's scaled chi^2 approximation for Q)
+        """
+        from scipy import stats
+        n, r = len(self.scores), self.rank
+        variances = self.singular_values**2 / max(n - 1, 1)
+        t2 = (self.scores**2 / np.where(variances > 0, variances, np.inf)).sum(axis=1)
+        t2_limit = r * (n - 1) / (n - r) * stats.f.ppf(1 - alpha, r, n - r) if n > r else np.nan
+        m, v = self.residuals.mean(), self.residuals.var()
+        q_limit = v / (2 * m) * stats.chi2.ppf(1 - alpha, 2 * m**2 / v) if v > 0 else np.nan
+        table = pd.DataFrame({'experiment': [Path(p).stem for p in self.paths], 'T2': t2, 'T2 limit': t2_limit,
+                              'Q': self.residuals, 'Q limit': q_limit})
+        table['flag'] = np.where(t2 > t2_limit, 'T2', '')
+        table['flag'] = table['flag'].where(~(self.residuals > q_limit), (table['flag'] + ' Q').str.strip())
+        return table.sort_values('T2', ascending=False)
+
+    def clusters(self, k:int, seed:int=SEED):
+        """k-means clusters of the scores (distances of the scaled curves within the basis)"""
+        from scipy.cluster.vq import kmeans2
+        _, label = kmeans2(self.scores, min(k, len(self.scores)), minit='++', seed=seed)
+        by = 'flux' if self.kind == 'Cone' else 'heating_rate'
+        return pd.DataFrame({'experiment': [Path(p).stem for p in self.paths], 'cluster': label,
+                             'institute': self.labels(), by.replace('_', ' '): self.labels(by)}
+                            ).sort_values(['cluster', 'experiment'])
+
+
+def fit(kinds=KINDS, rank:int=RANK, variance:float=VARIANCE, seed:int=SEED):
+    """FunctionalBasis of every family of the kinds (curves with a missing quantity are left out)"""
+    models = {}
+    for kind in kinds:
+        module_name, data, *_ = KINDS[kind]
+        families = {}
+        for path in sorted(getattr(importlib.import_module(module_name), data)):
+            families.setdefault(f"{kind} {family(path)}", []).append(path)
+        for name, paths in families.items():
+            curves = [embed(kind, p, STEPS[kind]) for p in paths]
+            ok = [not np.isnan(c).any() for c in curves]
+            paths = [_relative(p) for p, o in zip(paths, ok) if o]
+            if len(paths) > 1:
+                models[name] = FunctionalBasis.fit(name, paths, [c for c, o in zip(curves, ok) if o],
+                                                   rank, variance, seed)
+    return models
+
+
+def save(models:dict, basis_file:Path=BASIS_FILE):
+    arrays = {"names": np.array(list(models), dtype=str)}
+    for model in models.values():
+        arrays.update(model.to_arrays())
+    tmp = basis_file.with_name(f"{basis_file.stem}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, basis_file)
+
+
+def load(basis_file:Path=BASIS_FILE):
+    with np.load(basis_file, allow_pickle=False) as data:
+        return {name: FunctionalBasis(name, {field: data[f"{name} {field}"] for field in FunctionalBasis.FIELDS})
+                for name in data["names"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Functional PCA of the resampled curves per device and family")
+    parser.add_argument("--basis", default=str(BASIS_FILE), help="file of the bases")
+    parser.add_argument("--format", default="console", choices=["console", "csv", "latex"])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_fit = sub.add_parser("fit", help="fit the bases of all families")
+    p_fit.add_argument("--kinds", nargs="+", choices=list(KINDS), default=list(KINDS))
+    p_fit.add_argument("--rank", type=int, default=RANK, help=f"largest basis (default {RANK})")
+    p_fit.add_argument("--variance", type=float, default=VARIANCE, help=f"explained share (default {VARIANCE})")
+    p_fit.add_argument("--seed", type=int, default=SEED)
+    sub.add_parser("summary", help="rank, explained variance, errors and compression of every family")
+    p_components = sub.add_parser("components", help="variance of the components between and within groups")
+    p_components.add_argument("family")
+    p_components.add_argument("--by", default="institute", choices=["institute", "heating_rate", "flux", "atmosphere"])
+    p_outliers = sub.add_parser("outliers", help="Hotelling T2 and residual Q of every curve")
+    p_outliers.add_argument("family")
+    p_outliers.add_argument("--alpha", type=float, default=ALPHA)
+    p_clusters = sub.add_parser("clusters", help="k-means clusters of the scores")
+    p_clusters.add_argument("family")
+    p_clusters.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "fit":
+        models = fit(args.kinds, args.rank, args.variance, args.seed)
+        save(models, Path(args.basis))
+    else:
+        models = load(Path(args.basis))
+    if args.command in ("fit", "summary"):
+        print(render_table(pd.DataFrame([m.summary() for m in models.values()]), args.format))
+    else:
+        if args.family not in models:
+            parser.error(f"unknown family {args.family}, use {list(models)}")
+        model = models[args.family]
+        if args.command == "components":
+            print(render_table(model.components(args.by), args.format))
+        elif args.command == "outliers":
+            print(render_table(model.outliers(args.alpha), args.format))
+        else:
+            print(render_table(model.clusters(args.k), args.format))
@@ -0,0 +1,223 @@
+# optional instrumentation of the analysis: wall time, call counts and peak memory per stage
+#
+#   MACFP_PROFILE=1 python TGA_analysis.py        wall time, calls and peak RSS
+#   MACFP_PROFILE=memory python TGA_analysis.py   + tracemalloc peak per stage (slower)
+#   python Instrument.py run_report_TGA_analysis.json   summary of a report
+#
+# The report is written at exit to MACFP_PROFILE_REPORT (default run_report_<script>.json
+# in the working directory). Without MACFP_PROFILE all hooks return the function,
+# iterable or a shared empty context unchanged, so they cost nothing.
+# peak_MiB is the tracemalloc peak within a stage in memory mode (main thread only),
+# otherwise the peak RSS of the process at the end of the stage (peak working set on
+# Windows, with psutil).
+import argparse
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+MODE = os.environ.get("MACFP_PROFILE", "").strip().lower()
+ENABLED = MODE not in ("", "0", "false", "off")
+MEMORY = MODE in ("memory", "mem", "tracemalloc")
+
+_NULL = nullcontext()
+_stages = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "peak_MiB": 0.0})
+_items = defaultdict(lambda: defaultdict(lambda: {"calls": 0, "seconds": 0.0, "peak_MiB": 0.0}))
+_peaks = []   # tracemalloc peak of the open stages (innermost last)
+_started = (time.perf_counter(), datetime.now(timezone.utc))
+
+
+def _max_rss():
+    try:
+        import resource
+    except ImportError:
+        # Windows: peak working set with psutil, else the traced peak (0 without tracemalloc)
+        try:
+            import psutil
+        except ImportError:
+            return tracemalloc.get_traced_memory()[1] / 2**20
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 2**20
+    # ru_maxrss is in KiB on Linux, in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024
+
+
+def _enter_peak():
+    peak = tracemalloc.get_traced_memory()[1]
+    if _peaks:
+        _peaks[-1] = max(_peaks[-1], peak)
+    tracemalloc.reset_peak()
+    _peaks.append(0)
+
+
+def _exit_peak():
+    peak = max(_peaks.pop(), tracemalloc.get_traced_memory()[1])
+    if _peaks:
+        _peaks[-1] = max(_peaks[-1], peak)
+    tracemalloc.reset_peak()
+    return peak / 2**20
+
+
+def _record(name, item, seconds, peak):
+    for entry in (_stages[name], _items[name][item]) if item is not None else (_stages[name],):
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["peak_MiB"] = max(entry["peak_MiB"], peak)
+
+
+@contextmanager
+def _stage(name, item):
+    # the peak stack is only kept for the main thread (the readers also run in thread pools)
+    traced = MEMORY and threading.current_thread() is threading.main_thread()
+    if traced:
+        _enter_peak()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        _record(name, item, seconds, _exit_peak() if traced else _max_rss())
+
+
+def stage(name:str, item=None):
+    """Context manager that times a stage, optionally per item (file, series, figure)"""
+    if not ENABLED:
+        return _NULL
+    return _stage(name, None if item is None else str(item))
+
+
+def _default_item(args):
+    # first positional argument if it names a file or series
+    if args and isinstance(args[0], Path):
+        return args[0].name
+    if args and isinstance(args[0], str):
+        return args[0]
+    return None
+
+
+def timed(name=None):
+    """
+    Decorator that times every call of a function as stage `name` (the function name
+    by default). A file path or series name as first argument is recorded per item.
+    """
+    def decorate(func):
+        if not ENABLED:
+            return func
+        stage_name = name if isinstance(name, str) else func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _stage(stage_name, _default_item(args)):
+                return func(*args, **kwargs)
+        return wrapper
+
+    # also usable as @timed without arguments
+    return decorate(name) if callable(name) else decorate
+
+
+def loop(name:str, iterable):
+    """Iterate over `iterable` and time the loop body of every element as an item of stage `name`"""
+    if not ENABLED:
+        return iterable
+    return _loop(name, iterable)
+
+
+def _loop(name, iterable):
+    for element in iterable:
+        with _stage(name, str(element)):
+            yield element
+
+
+def instrument_figures():
+    """Time every Figure.savefig (and thus plt.savefig) as stage 'savefig', per file name"""
+    if not ENABLED:
+        return
+    from matplotlib.figure import Figure
+    if getattr(Figure.savefig, "_instrumented", False):
+        return
+    savefig = Figure.savefig
+
+    @functools.wraps(savefig)
+    def wrapper(self, fname, *args, **kwargs):
+        item = Path(fname).name if isinstance(fname, (str, Path)) else None
+        with _stage("savefig", item):
+            return savefig(self, fname, *args, **kwargs)
+    wrapper._instrumented = True
+    Figure.savefig = wrapper
+
+
+def report():
+    """Current measurements as a dict (see write_report)"""
+    t0, started = _started
+    return {
+        "script": Path(sys.argv[0]).name if sys.argv and sys.argv[0] else "",
+        "argv": sys.argv[1:],
+        "started": started.isoformat(timespec="seconds"),
+        "mode": "memory" if MEMORY else "time",
+        "wall_seconds": time.perf_counter() - t0,
+        "peak_rss_MiB": _max_rss(),
+        "peak_traced_MiB": tracemalloc.get_traced_memory()[1] / 2**20 if MEMORY else None,
+        "stages": dict(_stages),
+        "items": {name: dict(items) for name, items in _items.items()},
+    }
+
+
+def write_report(path=None):
+    """Write the run report as JSON, to MACFP_PROFILE_REPORT or run_report_<script>.json"""
+    data = report()
+    if path is None:
+        path = os.environ.get("MACFP_PROFILE_REPORT") or f"run_report_{Path(data['script']).stem or 'python'}.json"
+    with open(path, "w") as fh:
+        json.dump(data, fh, indent=1)
+    return path
+
+
+def summary(data:dict, n:int=10):
+    """Text summary of a run report: stage totals and the slowest series and figures"""
+    lines = [f"{data['script']}: {data['wall_seconds']:.1f} s, peak RSS {data['peak_rss_MiB']:.0f} MiB", ""]
+    lines.append(f"{'stage':40s} {'calls':>7s} {'seconds':>9s} {'peak MiB':>9s}")
+    for name, s in sorted(data["stages"].items(), key=lambda kv: -kv[1]["seconds"]):
+        lines.append(f"{name:40s} {s['calls']:7d} {s['seconds']:9.2f} {s['peak_MiB']:9.1f}")
+
+    def slowest(title, names):
+        rows = [(item, s) for name in names for item, s in data["items"].get(name, {}).items()]
+        rows.sort(key=lambda r: -r[1]["seconds"])
+        if rows:
+            lines.extend(["", f"slowest {title}"])
+            lines.extend(f"  {item:60s} {s['seconds']:9.2f} s" for item, s in rows[:n])
+
+    slowest("series", [name for name in data["items"] if name.startswith("average_") or name.endswith("metrics")])
+    slowest("files", ["read_series", "stream_resample"])
+    slowest("figures", ["render", "write"])
+    return "\n".join(lines)
+
+
+if ENABLED and __name__ != "__main__":
+    if MEMORY:
+        tracemalloc.start()
+
+    @atexit.register
+    def _write_at_exit():
+        path = write_report()
+        print(f"run report written to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summary of a run report")
+    parser.add_argument("report", help="JSON run report")
+    parser.add_argument("-n", type=int, default=10, help="number of slowest entries")
+    args = parser.parse_args()
+
+    with open(args.report) as fh:
+        print(summary(json.load(fh), args.n))
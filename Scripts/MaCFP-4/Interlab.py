@@ -0,0 +1,275 @@
+# inter-laboratory statistics (ISO 5725-2): repeatability, between-laboratory and reproducibility
+#
+#   python Interlab.py TGA Wood_*_N2_10K                Mandel flags per laboratory of the curves
+#   python Interlab.py TGA Wood_*_N2_10K -o n2_10k.csv  s_r, s_L, s_R, h and k per grid point
+#   python Interlab.py TGA --scalars                    metrics of all conditions (sets of Metrics.py)
+#
+# The replicates of a condition are added to the running statistics (Streaming.py)
+# of their laboratory, so count, mean and M2 are (laboratory x grid point) arrays and
+# the one-way ANOVA of every grid point takes a few array operations. Scalar metrics
+# use the mean, standard deviation and number of replicates of each set.
+#
+# Mandel's h (laboratory means) and k (laboratory standard deviations) are compared
+# with their critical values at 5 % (straggler) and 1 % (outlier).
+from __future__ import annotations
+
+import argparse
+import importlib
+
+from Lazy import lazy_import
+from Utils import parse_name, series_paths, label_def, render_table
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+LEVELS = {'straggler': 0.05, 'outlier': 0.01}
+
+# per device: functions module, data list, grid column and step, quantities (name: column)
+CURVES = {
+    "TGA": ("TGA_functions", "TGA_Data", "Temperature (K)", 0.5,
+            {'Normalized mass': 'Normalized mass', 'MLR (1/s)': 'dm/dt'}),
+    "MCC": ("MCC_functions", "MCC_Data", "Temperature (K)", 0.5,
+            {'HRR (W/g)': 'HRR (W/g)', 'Int HRR': 'Int HRR'}),
+    "DSC": ("DSC_functions", "DSC_Data", "Temperature (K)", 0.5,
+            {'Heat Flow Rate (W/g)': 'Heat Flow Rate (W/g)', 'Int Heat Flow (J/g)': 'Int Heat Flow (J/g)'}),
+    "Cone": ("Cone_functions", "Cone_Data", "Time (s)", 1,
+             {'HRR (kW/m2)': 'HRR (kW/m2)'}),
+}
+
+
+def anova(n, mean, m2):
+    """
+    One-way random effects ANOVA of ISO 5725-2 with the laboratories along the
+    first axis, vectorized over the other axes (grid points, metrics).
+
+    Parameters
+    ----------
+    n, mean, m2 : array_like
+        Number of replicates, mean and sum of squared deviations of each
+        laboratory (n = 0 where a laboratory has no data)
+
+    Returns
+    -------
+    dict
+        'labs', 'mean' (of all replicates), 's_r' (repeatability), 's_L'
+        (between laboratories), 's_R' (reproducibility) and Mandel's 'h' and 'k'
+        (laboratory x ...); NaN where undefined (e.g. no laboratory with repeats)
+    """
+    n = np.asarray(n, dtype=np.float64)
+    has, repeats = n > 0, n > 1
+    mean = np.where(has, mean, 0.0)
+    m2 = np.where(repeats, m2, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        labs = has.sum(axis=0)
+        total = n.sum(axis=0)
+        grand = (n * mean).sum(axis=0) / total
+        s_r2 = m2.sum(axis=0) / (n - 1).clip(min=0).sum(axis=0)
+        s_d2 = (n * (mean - grand)**2).sum(axis=0) / (labs - 1)
+        n_bar = (total - (n**2).sum(axis=0) / total) / (labs - 1)
+        s_L2 = np.maximum((s_d2 - s_r2) / n_bar, 0.0)
+
+        # Mandel: laboratory means against the mean and spread of all laboratory means ...
+        lab_mean = mean.sum(axis=0) / labs
+        spread = np.sqrt(np.where(has, (mean - lab_mean)**2, 0.0).sum(axis=0) / (labs - 1))
+        h = np.where(has, (mean - lab_mean) / spread, np.nan)
+        # ... and laboratory variances against their mean
+        s2 = np.where(repeats, m2 / (n - 1), np.nan)
+        k = np.sqrt(s2 / (np.where(repeats, s2, 0.0).sum(axis=0) / repeats.sum(axis=0)))
+    return {'labs': labs, 'mean': grand, 's_r': np.sqrt(s_r2), 's_L': np.sqrt(s_L2),
+            's_R': np.sqrt(s_r2 + s_L2), 'h': h, 'k': k}
+
+
+def mandel_critical(labs, n, alpha:float):
+    """Critical values of Mandel's h and k for `labs` laboratories with `n` replicates each"""
+    from scipy import stats
+    labs, n = np.asarray(labs, dtype=np.float64), np.asarray(n, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = stats.t.ppf(1 - alpha / 2, labs - 2)
+        h = (labs - 1) * t / np.sqrt(labs * (labs - 2 + t**2))
+        F = stats.f.ppf(1 - alpha, n - 1, (labs - 1) * (n - 1))
+        k = np.sqrt(labs / (1 + (labs - 1) / F))
+    return h, k
+
+
+def flags(result:dict, n):
+    """
+    'outlier', 'straggler' or '' for every value of Mandel's h and k of an anova()
+    result (none with fewer than three laboratories)
+    """
+    flag = np.full(np.shape(result['h']), '', dtype=object)
+    for level, alpha in sorted(LEVELS.items(), key=lambda item: -item[1]):
+        h_crit, k_crit = mandel_critical(result['labs'], n, alpha)
+        with np.errstate(invalid='ignore'):
+            exceeds = (np.abs(result['h']) > h_crit) | (result['k'] > k_crit)
+        flag[exceeds & (result['labs'] >= 3)] = level
+    return flag
+
+
+def _typical_replicates(n):
+    # replicates per laboratory for the critical value of k (laboratories with repeats)
+    n = np.asarray(n, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.round(np.where(n > 1, n, 0).sum(axis=0) / (n > 1).sum(axis=0))
+
+
+def _module(device:str):
+    return importlib.import_module(CURVES[device][0])
+
+
+def replicate(device:str, path):
+    """Derived series of a replicate file on the grid of the averaged curves of `device`"""
+    module = _module(device)
+    if device == "TGA":
+        return module.tga_replicate(path)
+    if device == "MCC":
+        return module.mcc_replicate(path)
+    if device == "DSC":
+        return module.dsc_replicate(path)
+    # resampled like average_cone_series
+    return module.stream_resample(path, "Time (s)", 1, module.Cone_columns)
+
+
+def lab_statistics(device:str, series:str):
+    """GridStatistics of the replicates of `series` (glob pattern) of every laboratory, by code"""
+    from Streaming import GridStatistics
+    module_name, data, key, step, quantities = CURVES[device]
+    data = set(getattr(_module(device), data))
+    paths = sorted(p for p in series_paths(series, partial=True) if p in data and "TEMPLATE" not in str(p))
+    if len(paths) == 0:
+        raise Exception((f"No files found for series {series}", "red"))
+    labs = {}
+    for path in paths:
+        lab = label_def(parse_name(path)['institute'])[0]
+        df = replicate(device, path)
+        stats = labs.setdefault(lab, GridStatistics(key, step))
+        stats.add(df[key], {name: df[column] for name, column in quantities.items()})
+    return labs
+
+
+def _stack(labs:dict, name:str):
+    """Grid and (laboratory x grid point) count, mean and M2 of `name`, on the union of the grids"""
+    parts = [s for s in labs.values() if s.start is not None]
+    lo = min(s.start for s in parts)
+    hi = max(s.start + len(s.present) - 1 for s in parts)
+    present = np.zeros(hi - lo + 1, dtype=bool)
+    n, mean, m2 = (np.zeros((len(labs), hi - lo + 1)) for _ in range(3))
+    for i, s in enumerate(labs.values()):
+        if s.start is None or name not in s.count:
+            continue
+        cols = slice(s.start - lo, s.start - lo + len(s.present))
+        present[cols] |= s.present
+        n[i, cols], mean[i, cols], m2[i, cols] = s.count[name], s.mean[name], s.m2[name]
+    grid = (np.flatnonzero(present) + lo) * parts[0].step
+    return grid, n[:, present], mean[:, present], m2[:, present]
+
+
+def interlab_curves(labs:dict, name:str):
+    """
+    Interlaboratory statistics of quantity `name` at every grid point.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Grid column, 'labs', 'mean', 's_r', 's_L', 's_R', and 'h <lab>', 'k <lab>'
+        of every laboratory
+    pandas.DataFrame
+        Per laboratory the grid points with data and the share of them flagged as
+        straggler or outlier
+    """
+    key = next(iter(labs.values())).key
+    grid, n, mean, m2 = _stack(labs, name)
+    result = anova(n, mean, m2)
+    table = pd.DataFrame({key: grid, **{c: result[c] for c in ('labs', 'mean', 's_r', 's_L', 's_R')}})
+    table = table.assign(**{f'h {lab}': result['h'][i] for i, lab in enumerate(labs)},
+                         **{f'k {lab}': result['k'][i] for i, lab in enumerate(labs)})
+    flag = flags(result, _typical_replicates(n))
+    points = (n > 0).sum(axis=1)
+    summary = pd.DataFrame({
+        'points': points,
+        **{level: np.where(points > 0, (flag == level).sum(axis=1) / np.maximum(points, 1), np.nan)
+           for level in LEVELS},
+    }, index=pd.Index(list(labs), name='lab'))
+    return table, summary
+
+
+def interlab_scalars(sets:pd.DataFrame, names):
+    """
+    Interlaboratory statistics of scalar metrics from the mean, std and replicates
+    of each set (as Metrics.set_table); sets of one laboratory, material and condition are pooled.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Per material, condition and metric: 'labs', 'mean', 's_r', 's_L', 's_R'
+    pandas.DataFrame
+        Per material, condition, metric and laboratory: 'n', 'mean', 'h', 'k', 'flag'
+    """
+    names = list(names)
+    rows, lab_rows = [], []
+    materials = sets['set'].map(lambda s: parse_name(s)['material'])
+    for (material, condition), group in sets.groupby([materials, sets['conditions']], sort=False):
+        labs = list(dict.fromkeys(group['Duck']))
+        n = np.zeros((len(labs), len(names)))
+        mean, m2 = np.zeros_like(n), np.zeros_like(n)
+        for i, lab in enumerate(labs):
+            for _, s in group[group['Duck'] == lab].iterrows():
+                values = s[names].to_numpy(dtype=np.float64)
+                std = np.nan_to_num(s[[f'std {c}' for c in names]].to_numpy(dtype=np.float64))
+                n_s = np.where(np.isnan(values), 0, s['replicates'])
+                m2_s = std**2 * np.maximum(n_s - 1, 0)
+                # pooled with the earlier sets of the laboratory (Chan et al.)
+                total = n[i] + n_s
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    delta = np.nan_to_num(values) - mean[i]
+                    w = np.where(total > 0, n_s / np.maximum(total, 1), 0.0)
+                mean[i] += delta * w
+                m2[i] += m2_s + delta**2 * n[i] * w
+                n[i] = total
+        result = anova(n, mean, m2)
+        flag = flags(result, _typical_replicates(n))
+        for j, metric in enumerate(names):
+            rows.append({'material': material, 'conditions': condition, 'metric': metric,
+                         **{c: result[c][j] for c in ('labs', 'mean', 's_r', 's_L', 's_R')}})
+            for i, lab in enumerate(labs):
+                if n[i, j] > 0:
+                    lab_rows.append({'material': material, 'conditions': condition, 'metric': metric,
+                                     'lab': lab, 'n': int(n[i, j]),
+                                     'mean': mean[i, j], 'h': result['h'][i, j], 'k': result['k'][i, j],
+                                     'flag': flag[i, j]})
+    return (pd.DataFrame(rows, columns=['material', 'conditions', 'metric', 'labs', 'mean', 's_r', 's_L', 's_R']),
+            pd.DataFrame(lab_rows, columns=['material', 'conditions', 'metric', 'lab', 'n', 'mean', 'h', 'k', 'flag']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inter-laboratory statistics (ISO 5725-2) with Mandel's h and k")
+    parser.add_argument("device", choices=list(CURVES))
+    parser.add_argument("series", nargs="?", help="series of the curves (glob pattern), e.g. Wood_*_N2_10K")
+    parser.add_argument("--quantity", help="quantity of the curves (default: the first of the device)")
+    parser.add_argument("--scalars", action="store_true", help="metrics of all conditions instead of curves")
+    parser.add_argument("--format", default="console", choices=["console", "csv", "latex"])
+    parser.add_argument("-o", "--output", help="file of the table per grid point (curves) or per laboratory (scalars)")
+    args = parser.parse_args()
+
+    if args.scalars:
+        from Metrics import SET_METRICS, set_table
+        if args.device not in SET_METRICS:
+            parser.error(f"no scalar metrics of {args.device}, use {list(SET_METRICS)}")
+        table, labs = interlab_scalars(set_table(args.device), SET_METRICS[args.device][-1])
+        print(render_table(table, args.format))
+        flagged = labs[labs['flag'] != '']
+        print(render_table(flagged, args.format) if len(flagged) else "no laboratory flagged")
+        if args.output:
+            labs.to_csv(args.output, index=False)
+    else:
+        if args.series is None:
+            parser.error("series is required without --scalars")
+        quantities = CURVES[args.device][4]
+        quantity = args.quantity or next(iter(quantities))
+        if quantity not in quantities:
+            parser.error(f"unknown quantity {quantity}, use {list(quantities)}")
+        table, summary = interlab_curves(lab_statistics(args.device, args.series), quantity)
+        print(render_table(summary, args.format))
+        print(render_table(table[['labs', 's_r', 's_L', 's_R']].median().to_frame('median over the grid'), args.format))
+        if args.output:
+            table.to_csv(args.output, index=False)
@@ -0,0 +1,28 @@
+# modules that are only loaded on first use (fast start of the command line tools)
+#
+#   pd = lazy_import("pandas")      # no cost here, pandas is loaded at the first pd.<name>
+import importlib
+import sys
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that imports it at the first attribute access.
+
+    The import goes through the regular import system (thread safe, shared with
+    `import name` elsewhere); afterwards the attributes of the module are copied
+    here, so later accesses cost the same as on the module itself.
+    """
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name:str):
+    """Module `name`, imported at the first attribute access instead of now (or at once if already loaded)"""
+    if name in sys.modules:
+        return sys.modules[name]
+    return _LazyModule(name)
@@ -1,16 +1,24 @@
+#define whether to save files in pdf or png (--format png,pdf writes both)
+# the options are parsed before the imports below, --help does not wait for them
+from Figures import script_options
+args = script_options('MCC analysis')
+ex = args.formats[0]
+
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import re
 
-from Utils import device_data, get_series_names, make_institution_table, \
-                  device_subset, label_def, interpolation
-from Utils import SCRIPT_DIR, PROJECT_ROOT, DATA_DIR, FIGURES_DIR
-
+from Utils import get_series_names, make_institution_table, \
+                  device_subset, label_def, replicate_statistics
+from Utils import SCRIPT_DIR, PROJECT_ROOT, FIGURES_DIR, parse_name, series_paths
+from Screening import quality_report
+from MCC_functions import MCC_Data, mcc_replicate, average_MCC_series, mcc_metrics
+from Instrument import loop, instrument_figures
+from Figures import FigureWriter
+from Downsample import Overlay
 
-#define whether to save files in pdf or png
-ex = 'png' #options 'pdf' or 'png
 
 #when pushed to main repo replace
 '../../../matl-db-organizing-committee/' #with
@@ -18,6 +26,8 @@ ex = 'png' #options 'pdf' or 'png
 
 # check all subdirectories to save plots exist. 
 base_dir = Path('../../../matl-db-organizing-committee/SCRIPT_FIGURES')
+writer = FigureWriter(args.formats, args.writers, args.max_pending,
+                      manifest=base_dir / 'MCC' / 'figure_manifest.json', force=args.force)
 Individual_dir = base_dir / 'MCC' / 'Individual'
 Average_dir = base_dir / 'MCC' / 'Average'
 Individual_dir.mkdir(parents=True, exist_ok=True)
@@ -29,8 +39,8 @@ Average_dir.mkdir(parents=True, exist_ok=True)
 # ------------------------------------
 #This section is used to determine what MCC data is available. 
 
-# All MCC Data
-MCC_Data = device_data(DATA_DIR, 'MCC')
+# Data quality report (exclusions for the pooled averages)
+Quality = quality_report(MCC_Data)
 # All unique sets (name without repetition number)
 MCC_sets = get_series_names(MCC_Data)
 # All unique conditions over all institutes
@@ -66,84 +76,7 @@ def set_plot_style():
     })
 
 set_plot_style()
-
-
-
-# ------------------------------------
-#region functions
-# ------------------------------------
-def calculate_int_HRR(df:pd.DataFrame):
-    df = interpolation(df)
-    total_hrr = np.zeros(len(df))
-    for i in range(1, len(df)):
-        total_hrr[i] = total_hrr[i-1] + 0.5 * (df['HRR (W/g)'].iloc[i-1] + df['HRR (W/g)'].iloc[i]) * (df['Time (s)'].iloc[i] - df['Time (s)'].iloc[i-1])
-    df['Int HRR'] = total_hrr
-    return df
-
-
-def average_MCC_series(series_name: str, exclude=None, temp_filter=None):
-    paths = list(DATA_DIR.glob(f"*/*{series_name}_[rR]*.csv"))
-    paths = [p for p in paths if "TEMPLATE" not in str(p)]
-    paths = [p for p in paths if p in MCC_Data]
-
-    # Apply exclusions
-    if exclude is not None:
-        if not isinstance(exclude, list):
-            exclude = [exclude]  # Convert single string to list
-        
-        for excl in exclude:
-            paths = [p for p in paths if excl not in str(p)]
-
-    Dataframes = []
-    if len(paths) == 0:
-        raise Exception((f"No files found for series {series_name}", "red"))
-
-    # Read data
-    for i, path in enumerate(paths):
-        df = pd.read_csv(path)
-
-        # Apply temperature filter for specific institutes
-        if temp_filter is not None:
-            for institute, min_temp in temp_filter.items():
-                if institute in str(path):
-                    df_raw = df_raw[df_raw['Temperature (K)'] > min_temp].reset_index(drop=True)
-
-
-        df = calculate_int_HRR(df)
-        df['dTdt'] = 60*np.gradient(df['Temperature (K)'], df['Time (s)'])
-        Dataframes.append(df)
-    
-    merged_df = Dataframes[0]
-    for df in Dataframes[1:]:
-        merged_df = pd.merge(
-            merged_df,
-            df,
-            on="Temperature (K)",
-            how="outer",
-            suffixes=("", f" {int(len(merged_df.columns)/2+0.5)}"),
-        )
-    merged_df.rename(columns={"HRR (W/g)": "HRR (W/g) 1"}, inplace=True)
-    merged_df.rename(columns={"Time (s)": "Time (s) 1"}, inplace=True)
-
-    #average
-    time_cols = merged_df.filter(regex=r'^Time \(s\)').columns
-    hrr_cols = merged_df.filter(regex=r'^HRR \(W/g\)').columns
-    dTdt_cols = merged_df.filter(regex=r'^dTdt').columns
-    intHRR_cols = merged_df.filter(regex=r'^Int HRR').columns
-
-    df_average = pd.DataFrame({
-        'Temperature (K)': merged_df['Temperature (K)'],
-        'HRR (W/g)': merged_df[hrr_cols].mean(axis=1),
-        'HRR_std': merged_df[hrr_cols].std(axis=1, skipna=True, ddof=0),
-        'dTdt (K/min)': merged_df[dTdt_cols].mean(axis=1),
-        'dTdt_std': merged_df[dTdt_cols].std(axis=1, skipna=True, ddof=0),
-        'int HRR': merged_df[intHRR_cols].mean(axis=1),
-        'int HRR_std': merged_df[intHRR_cols].std(axis=1, skipna=True, ddof=0),
-    }).dropna(subset=['HRR (W/g)'], how='all')
-
-    return df_average
-
-
+instrument_figures()
 
 
 
@@ -162,7 +95,7 @@ for HR in unique_HR:
         ax.set_title('dT/dt in MCC tests at {} K/min'.format(HR[:-1]))
         fig.tight_layout()
         ax.legend()
-    plt.savefig(str(base_dir) + '/MCC/dTdt_MCC_{}min.{}'.format(HR.split('_')[-1],ex))
+    writer.save(plt.gcf(), str(base_dir) + '/MCC/dTdt_MCC_{}min.{}'.format(HR,ex))
     plt.close(fig)
 
 
@@ -178,10 +111,8 @@ for series in unique_conditions_material:
     material, dev, atm, hr,  = parts[:4]
     MCC_subset_paths = [p for p in MCC_Data if f"{material}_" in p.name and f"_{atm}_{hr}_" in p.name]
     for path in MCC_subset_paths:
-        df_raw = pd.read_csv(path)
-        df_interp = interpolation(df_raw)
-        df = calculate_int_HRR(df_interp)
-        label, color = label_def(path.stem.split('_')[0])
+        df = mcc_replicate(path)
+        label, color = label_def(parse_name(path)['institute'])
         ax1.plot(df['Temperature (K)'], df['HRR (W/g)'], label = label, color=color)
         ax2.plot(df['Temperature (K)'], df['Int HRR'], label = label, color=color)
 
@@ -203,8 +134,8 @@ for series in unique_conditions_material:
     by_label2 = dict(zip(labels2, handles2))
     ax2.legend(by_label2.values(), by_label2.keys())
 
-    fig1.savefig(str(base_dir) + '/MCC/MCC_{}_{}_{}_HRR.{}'.format(material,atm,hr,ex))
-    fig2.savefig(str(base_dir) + '/MCC/MCC_{}_{}_{}_int_HRR.{}'.format(material, atm,hr,ex))
+    writer.save(fig1, str(base_dir) + '/MCC/MCC_{}_{}_{}_HRR.{}'.format(material,atm,hr,ex))
+    writer.save(fig2, str(base_dir) + '/MCC/MCC_{}_{}_{}_int_HRR.{}'.format(material, atm,hr,ex))
     plt.close(fig1)
     plt.close(fig2)
 
@@ -275,7 +206,7 @@ Average_values = pd.DataFrame({
     "FGC":np.nan,
     "std FGC":np.nan,
 })
-for idx,set in enumerate(MCC_sets):
+for idx,set in enumerate(loop('MCC set metrics', MCC_sets)):
     fig, ax_HRR = plt.subplots(figsize=(6, 4))
     ax_intHRR = ax_HRR.twinx()
     df_average = average_MCC_series(set)
@@ -303,57 +234,20 @@ for idx,set in enumerate(MCC_sets):
 
 
     #plot individual
-    paths_MCC_set = list(DATA_DIR.glob(f"*/{set}_[rR]*.csv"))
-    peak_HRR_list = []
-    T_peak_list = []
-    T_onset_list = []
-    T_onset10_list = []
-    FGC_list = []
-    HR_total_list = []
-    HR_capacity_list = []
-    T_0 = 298
+    paths_MCC_set = series_paths(set)
+    metrics = []
+    raw_HRR, raw_intHRR = Overlay(), Overlay()
 
     for path in paths_MCC_set:
-        df_raw = pd.read_csv(path)
-        df = calculate_int_HRR(df_raw)
-        peak_HRR = df["HRR (W/g)"].max()
-        peak_index = df["HRR (W/g)"].idxmax()
-        T_peak = df["Temperature (K)"].iloc[peak_index]
-        HR_total = df['Int HRR'].iloc[-1]
-        onset_index = df[df['Int HRR'] >= 0.05 * HR_total].index[0]
-        T_onset = df["Temperature (K)"].iloc[onset_index]
-        onset_index10 = df[df['Int HRR'] >= 0.10 * HR_total].index[0]
-        T_onset10 = df["Temperature (K)"].iloc[onset_index10]
-        endset_index = df[df['Int HRR'] >= 0.95 * HR_total].index[0]
-        T_endset = df["Temperature (K)"].iloc[endset_index]
-        HR_Capacity = peak_HRR / np.average(np.gradient(df['Temperature (K)'], df['Time (s)']))
-        FGC_v = (HR_total * (T_endset - T_0)) / ((T_endset - T_onset) * (T_onset - T_0))
-        
+        df = mcc_replicate(path)
+        metrics.append(mcc_metrics(df))
 
-        peak_HRR_list.append(peak_HRR)
-        T_peak_list.append(T_peak)
-        T_onset_list.append(T_onset)
-        T_onset10_list.append(T_onset10)
-        FGC_list.append(FGC_v)
-        HR_total_list.append(HR_total)
-        HR_capacity_list.append(HR_Capacity)
-
-        ax_HRR.plot(df['Temperature (K)'], df['HRR (W/g)'], '.',color ='black',markersize=0.00000000000002)
-        ax_intHRR.plot(df['Temperature (K)'], df['Int HRR'],'.',color='black', markersize=0.5)
-    Average_values.at[idx, 'peak HRR'] = np.mean(peak_HRR_list)
-    Average_values.at[idx, 'std peak HRR'] = np.std(peak_HRR_list, ddof=1)
-    Average_values.at[idx, 'T peak'] = np.mean(T_peak_list)
-    Average_values.at[idx, 'std T peak'] = np.std(T_peak_list, ddof=1)
-    Average_values.at[idx, 'T onset'] = np.mean(T_onset_list)
-    Average_values.at[idx, 'std T onset'] = np.std(T_onset_list, ddof=1)
-    Average_values.at[idx, 'T onset10'] = np.mean(T_onset10_list)
-    Average_values.at[idx, 'std T onset10'] = np.std(T_onset10_list, ddof=1)
-    Average_values.at[idx, 'HR_total'] = np.mean(HR_total_list)
-    Average_values.at[idx, 'std HR_total'] = np.std(HR_total_list, ddof=1)
-    Average_values.at[idx, 'HR_capacity'] = np.mean(HR_capacity_list)
-    Average_values.at[idx, 'std HR_capacity'] = np.std(HR_capacity_list, ddof=1)
-    Average_values.at[idx, 'FGC'] = np.mean(FGC_list)
-    Average_values.at[idx, 'std FGC'] = np.std(FGC_list, ddof=1)
+        raw_HRR.add(df['Temperature (K)'], df['HRR (W/g)'], '.',color ='black',markersize=0.00000000000002)
+        raw_intHRR.add(df['Temperature (K)'], df['Int HRR'],'.',color='black', markersize=0.5)
+    raw_HRR.draw(ax_HRR)
+    raw_intHRR.draw(ax_intHRR)
+    for key, value in replicate_statistics(metrics).items():
+        Average_values.at[idx, key] = value
 
     # Set lower limits of both y-axes to 0
     ax_HRR.set_ylim(bottom=0)
@@ -371,7 +265,7 @@ for idx,set in enumerate(MCC_sets):
     fig.legend()
 
     fig.tight_layout()
-    plt.savefig(str(base_dir) + f'/MCC/Average/{set}.{ex}')
+    writer.save(plt.gcf(), str(base_dir) + f'/MCC/Average/{set}.{ex}')
     plt.close(fig)
 Average_values.drop('set',axis=1)
 print(Average_values)
@@ -431,8 +325,8 @@ def plot_hrr_and_onset_vs_peak_temp(df):
         fig1.tight_layout()
         fig2.tight_layout()
         
-        fig1.savefig(str(base_dir) + f'/MCC/Tpeak_Average_{condition}_HRR.{ex}')
-        fig2.savefig(str(base_dir) + f'/MCC/Tonset_Average_{condition}_HRR.{ex}')
+        writer.save(fig1, str(base_dir) + f'/MCC/Tpeak_Average_{condition}_HRR.{ex}')
+        writer.save(fig2, str(base_dir) + f'/MCC/Tonset_Average_{condition}_HRR.{ex}')
         
         plt.close(fig1)
         plt.close(fig2)
@@ -447,17 +341,18 @@ plot_hrr_and_onset_vs_peak_temp(Average_values)
 color = {'30K':'blue','45K':'black','60K':'red'}
 fig1, ax1 = plt.subplots(figsize=(6, 4))
 fig2, ax2 = plt.subplots(figsize=(6, 4))
+# raw points of all replicates of all heating rates, one artist per heating rate
+raw1, raw2 = Overlay(), Overlay()
 for series in ['Wood_MCC_N2_30K','Wood_MCC_N2_45K','Wood_MCC_N2_60K']:
     parts = series.split('_')
     atm, hr  = parts[2:]
     for subset in [item for item in MCC_sets if series in item]:
-        paths = list(DATA_DIR.glob(f"*/{subset}_[rR]*.csv"))
+        paths = series_paths(subset)
         for i, path in enumerate(paths):
-            df = pd.read_csv(path)
-            df = calculate_int_HRR(df)
-            ax1.plot(df['Temperature (K)'], df['HRR (W/g)'], '.', color = color[hr], alpha=0.1, markersize = 0.01, zorder=4)
-            ax2.plot(df['Temperature (K)'], df['Int HRR'], '.', color = color[hr], alpha=0.1, markersize = 0.01, zorder=4)
-    df_average = average_MCC_series(series, ['TUBS_Wood_MCC_N2_30K','FZJ_Wood_MCC_N2_60K_R8'])
+            df = mcc_replicate(path)
+            raw1.add(df['Temperature (K)'], df['HRR (W/g)'], '.', color = color[hr], alpha=0.1, markersize = 0.01, zorder=4)
+            raw2.add(df['Temperature (K)'], df['Int HRR'], '.', color = color[hr], alpha=0.1, markersize = 0.01, zorder=4)
+    df_average = average_MCC_series(series, quality=Quality)
     ax1.plot(df_average['Temperature (K)'], df_average['HRR (W/g)'], label = hr+'/min', color = color[hr], zorder = 3)
     ax1.fill_between(df_average['Temperature (K)'], 
                     df_average['HRR (W/g)']-2*df_average['HRR_std'],
@@ -468,6 +363,8 @@ for series in ['Wood_MCC_N2_30K','Wood_MCC_N2_45K','Wood_MCC_N2_60K']:
                     df_average['int HRR']-2*df_average['int HRR_std'],
                     df_average['int HRR']+2*df_average['int HRR_std'],
                     color=color[hr], alpha = 0.4, zorder=2)
+raw1.draw(ax1)
+raw2.draw(ax2)
 
 ax1.set_ylim(bottom=0)
 ax1.set_xlim(350,1000)
@@ -483,8 +380,8 @@ ax2.set_ylabel('Integral HRR [J/g]')
 fig2.tight_layout()
 ax2.legend()
 
-fig1.savefig(str(base_dir) + '/MCC/MCC_Average_N2_HRR.{}'.format(ex))
-fig2.savefig(str(base_dir) + '/MCC/MCC_Average_N2_intHRR.{}'.format(ex))
+writer.save(fig1, str(base_dir) + '/MCC/MCC_Average_N2_HRR.{}'.format(ex))
+writer.save(fig2, str(base_dir) + '/MCC/MCC_Average_N2_intHRR.{}'.format(ex))
 plt.close(fig1)
 plt.close(fig2)
 
@@ -565,12 +462,11 @@ for o2_label, o2_code in oxygen_levels.items():
     
     # Plot individual experiments
     for subset in o2_series:
-        paths = list(DATA_DIR.glob(f"*/{subset}_[rR]*.csv"))
+        paths = series_paths(subset)
         Duck, _ = label_def(subset.split('_')[0])
         
         for i, path in enumerate(paths):
-            df = pd.read_csv(path)
-            df = calculate_int_HRR(df)
+            df = mcc_replicate(path)
             
             # Create label only for first repetition to avoid duplicate legend entries
             if i == 0:
@@ -608,7 +504,9 @@ ax2.legend(by_label2.values(), by_label2.keys())
 fig2.tight_layout()
 
 # Save figures
-fig1.savefig(str(base_dir) + '/MCC/MCC_Wood_O2_levels_HRR.{}'.format(ex))
-fig2.savefig(str(base_dir) + '/MCC/MCC_Wood_O2_levels_intHRR.{}'.format(ex))
+writer.save(fig1, str(base_dir) + '/MCC/MCC_Wood_O2_levels_HRR.{}'.format(ex))
+writer.save(fig2, str(base_dir) + '/MCC/MCC_Wood_O2_levels_intHRR.{}'.format(ex))
 plt.close(fig1)
 plt.close(fig2)
+
+writer.close()
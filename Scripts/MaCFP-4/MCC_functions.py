@@ -0,0 +1,124 @@
+# MCC analysis functions (used by MCC_analysis.py)
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from Instrument import timed
+from Utils import DATA_DIR, GRID_STEP, device_data, interpolation, series_paths
+from Readers import read_series
+from Screening import quality_filter, cut_temperature
+from Cache import derived
+from Streaming import GridStatistics, CAPACITY
+
+
+# Columns used in the MCC analysis
+MCC_columns = ['Time (s)', 'Temperature (K)', 'HRR (W/g)']
+
+# All MCC Data
+MCC_Data = device_data(DATA_DIR, 'MCC')
+
+
+@timed
+def calculate_int_HRR(df:pd.DataFrame):
+    df = interpolation(df)
+    total_hrr = np.zeros(len(df))
+    for i in range(1, len(df)):
+        total_hrr[i] = total_hrr[i-1] + 0.5 * (df['HRR (W/g)'].iloc[i-1] + df['HRR (W/g)'].iloc[i]) * (df['Time (s)'].iloc[i] - df['Time (s)'].iloc[i-1])
+    df['Int HRR'] = total_hrr
+    return df
+
+
+def mcc_replicate(path:Path, min_temperature:float=None):
+    """calculate_int_HRR of a replicate file (above min_temperature if given), from the cache if unchanged"""
+    recipe = {'function': 'MCC calculate_int_HRR', 'columns': MCC_columns, 'grid_step': GRID_STEP,
+              'min_temperature': min_temperature}
+
+    def compute():
+        df = read_series(path, MCC_columns)
+        if min_temperature is not None:
+            df = df[df['Temperature (K)'] > min_temperature].reset_index(drop=True)
+        return calculate_int_HRR(df)
+
+    return derived(path, recipe, compute)
+
+
+def mcc_paths(series_name: str, exclude=None, quality=None):
+    """Replicate files of a series (glob pattern), without exclusions"""
+    paths = series_paths(series_name, partial=True)
+    paths = [p for p in paths if "TEMPLATE" not in str(p)]
+    paths = [p for p in paths if p in MCC_Data]
+
+    # Apply exclusions
+    if exclude is not None:
+        if not isinstance(exclude, list):
+            exclude = [exclude]  # Convert single string to list
+        
+        for excl in exclude:
+            paths = [p for p in paths if excl not in str(p)]
+
+    # Apply exclusions of the quality report
+    if quality is not None:
+        paths = quality_filter(paths, quality)
+
+    if len(paths) == 0:
+        raise Exception((f"No files found for series {series_name}", "red"))
+    return paths
+
+
+def _mcc_heating_rate(df:pd.DataFrame):
+    df['dTdt'] = 60*np.gradient(df['Temperature (K)'], df['Time (s)'])
+    return df
+
+
+@timed
+def mcc_statistics(paths, temp_filter=None, quality=None, capacity:int=None):
+    """Running statistics of HRR, heating rate and integral HRR of replicate files on the temperature grid"""
+    stats = GridStatistics('Temperature (K)', GRID_STEP, capacity)
+    for path in paths:
+        df = _mcc_heating_rate(mcc_replicate(path, cut_temperature(path, temp_filter, quality)))
+        stats.add(df['Temperature (K)'], {'HRR (W/g)': df['HRR (W/g)'], 'dTdt': df['dTdt'], 'Int HRR': df['Int HRR']})
+    return stats
+
+
+@timed
+def average_MCC_series(series_name: str, exclude=None, temp_filter=None, quality=None, bands=False):
+    # the replicates are added to the statistics one at a time
+    # bands: also the median, interquartile and 5-95 % range of the replicates
+    capacity = CAPACITY if bands else None
+    stats = mcc_statistics(mcc_paths(series_name, exclude, quality), temp_filter, quality, capacity)
+
+    #average
+    hrr, hrr_std = stats.pointwise('HRR (W/g)')
+    dTdt, dTdt_std = stats.pointwise('dTdt')
+    int_hrr, int_hrr_std = stats.pointwise('Int HRR')
+    df_average = pd.DataFrame({
+        'Temperature (K)': stats.grid(),
+        'HRR (W/g)': hrr,
+        'HRR_std': hrr_std,
+        'dTdt (K/min)': dTdt,
+        'dTdt_std': dTdt_std,
+        'int HRR': int_hrr,
+        'int HRR_std': int_hrr_std,
+        **(stats.band_columns('HRR (W/g)', 'HRR (W/g)') if bands else {}),
+    }).dropna(subset=['HRR (W/g)'], how='all')
+
+    return df_average
+
+
+def mcc_metrics(df:pd.DataFrame, T_0:float=298):
+    """Values of interest of one replicate (output of calculate_int_HRR)"""
+    peak_HRR = df["HRR (W/g)"].max()
+    peak_index = df["HRR (W/g)"].idxmax()
+    T_peak = df["Temperature (K)"].iloc[peak_index]
+    HR_total = df['Int HRR'].iloc[-1]
+    onset_index = df[df['Int HRR'] >= 0.05 * HR_total].index[0]
+    T_onset = df["Temperature (K)"].iloc[onset_index]
+    onset_index10 = df[df['Int HRR'] >= 0.10 * HR_total].index[0]
+    T_onset10 = df["Temperature (K)"].iloc[onset_index10]
+    endset_index = df[df['Int HRR'] >= 0.95 * HR_total].index[0]
+    T_endset = df["Temperature (K)"].iloc[endset_index]
+    HR_Capacity = peak_HRR / np.average(np.gradient(df['Temperature (K)'], df['Time (s)']))
+    FGC_v = (HR_total * (T_endset - T_0)) / ((T_endset - T_onset) * (T_onset - T_0))
+    return {'peak HRR': peak_HRR, 'T peak': T_peak, 'T onset': T_onset, 'T onset10': T_onset10,
+            'HR_total': HR_total, 'HR_capacity': HR_Capacity, 'FGC': FGC_v}
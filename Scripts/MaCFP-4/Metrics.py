@@ -0,0 +1,251 @@
+# numeric results of the analysis scripts without figures (matplotlib is never imported)
+#
+#   python Metrics.py                                  tables of the analysis scripts as CSV in ./metrics
+#   python Metrics.py --devices TGA,MCC --format parquet --output /tmp/drop_2
+#   python Metrics.py --curves --bootstrap --interlab --deconvolution     (or --all)
+#
+# Tables (one file each, the column names do not change between runs)
+#   availability_<DEV>_<n>   counts of make_institution_table, as printed by the analysis scripts
+#   <dev>_sets               mean and std over the replicates of each set (Average_values)
+#   cone_sets                ignition time and heat of combustion
+#   sta_heat_of_reaction     heat of reaction of every STA experiment
+# and on request
+#   <dev>_sets_ci            percentile bootstrap confidence interval (95 %) of the mean
+#                            of each value of each set (Bootstrap.py, --bootstrap)
+#   <dev>_interlab           repeatability, between-laboratory and reproducibility std of
+#                            every value and condition (ISO 5725-2, Interlab.py, --interlab)
+#   <dev>_interlab_labs      Mandel's h and k of every laboratory, value and condition
+#   tga_deconvolution        peak temperature, width and mass of the pseudo-components of the
+#                            averaged MLR of every set, with the scatter of the replicates
+#                            (Deconvolution.py, --deconvolution)
+#   curves/<DEV>/<set>       averaged curves of every set with median, interquartile and
+#                            5-95 % bands of the replicates (--curves), with bootstrap
+#                            confidence intervals of the averaged columns (and --bootstrap)
+from __future__ import annotations
+
+import argparse
+import importlib
+import importlib.util
+import re
+
+from pathlib import Path
+
+from Lazy import lazy_import
+from Utils import SCRIPT_DIR, get_series_names, make_institution_table, label_def, replicate_statistics
+from Utils import catalog, name_conditions, parse_name, series_paths, _natural
+from Interlab import interlab_scalars
+from Deconvolution import deconvolve, summary as deconvolution_summary
+from Bootstrap import CURVES as BOOTSTRAP_CURVES, set_curve_ci, values_ci
+
+pd = lazy_import("pandas")
+
+
+OUTPUT_DIR = SCRIPT_DIR / "metrics"
+DEVICES = ("TGA", "MCC", "DSC", "Cone")
+
+# make_institution_table arguments of the analysis scripts (materials, atmospheres/fluxes, heating rates/orientations)
+AVAILABILITY = {
+    "TGA": [
+        ("TGA_Data", ['Wood'], ['N2'], ['2K','3K','5K','10K','20K','30K','40K','50K','60K']),
+        ("TGA_Data", ['Wood'], ['O2-20','O2-21'], ['2K','5K','10K','20K','30K']),
+    ],
+    "MCC": [
+        ("MCC_Data", ['Wood'], ['N2'], ['30K','45K','60K']),
+        ("MCC_Data", ['Wood'], ['O2-2', 'O2-5', 'O2-10' , 'O2-20', 'O2-21'], ['60K']),
+        ("MCC_Data", ['Wood-char'], ['O2-20', 'O2-21'], ['60K']),
+    ],
+    "DSC": [
+        ("DSC_Data", ['Wood'], ['N2'], ['3K','5K','10K','20K','30K','40K','50K','60K']),
+        ("DSC_Data", ['Wood'], ['O2-21'], ['3K','5K','10K','20K','30K','40K','50K','60K']),
+    ],
+    "Cone": [
+        ("Cone_Data", ['Wood'], ['25kW','30kW','50kW','60kW','75kW'], ['hor']),
+        ("Gasification_Data", ['Wood'], ['30kW','40kW','60kW'], ['hor']),
+    ],
+}
+
+# per set (names in the {device}_functions module): data list, derived series of one
+# replicate file, its values, averaged curve; and the names of the values
+SET_METRICS = {
+    "TGA": ("TGA_Data", "tga_replicate", "tga_metrics", "average_tga_series",
+            ['peak MLR', 'T peak', 'T onset', 'm 700', 'm 950']),
+    "MCC": ("MCC_Data", "mcc_replicate", "mcc_metrics", "average_MCC_series",
+            ['peak HRR', 'T peak', 'T onset', 'T onset10', 'HR_total', 'HR_capacity', 'FGC']),
+    "Cone": ("Cone_Data", "cone_replicate", "cone_metrics", "average_cone_series",
+             ['ignition time', 'HOC']),
+}
+
+
+def _module(device:str):
+    # the functions modules list their data files on import, only load the requested ones
+    return importlib.import_module(f"{device}_functions")
+
+
+def _other_materials(device:str):
+    """make_institution_table arguments of all conditions of the materials not in AVAILABILITY (MACFP_MATERIALS)"""
+    module = _module(device)
+    known = {m for _, materials, _, _ in AVAILABILITY[device] for m in materials}
+    arguments = []
+    for data in dict.fromkeys(data for data, *_ in AVAILABILITY[device]):
+        cat = name_conditions(catalog(getattr(module, data)))
+        # one table per material and kind of name fields (gasification and CAPA apart)
+        for _, sub in cat[~cat["material"].isin(known)].groupby(["material", "fields"]):
+            arguments.append((data, [sub["material"].iloc[0]], sorted(sub["condition1"].unique(), key=_natural),
+                              sorted(sub["condition2"].unique(), key=_natural)))
+    return arguments
+
+
+def availability_tables(device:str):
+    """
+    make_institution_table of the analysis script of `device` (and of all conditions
+    of the other materials), with flat column names
+    """
+    module = _module(device)
+    tables = []
+    for data, materials, atmospheres, rates in AVAILABILITY[device] + _other_materials(device):
+        df = make_institution_table(getattr(module, data), materials, atmospheres, rates)
+        if isinstance(df.columns, pd.MultiIndex):
+            df.columns = ['_'.join(c) for c in df.columns]
+        tables.append(df.reset_index())
+    return tables
+
+
+def set_records(device:str):
+    """Values of every replicate of every set of `device` (list of dicts), by set name"""
+    data, replicate, metrics, _, _ = SET_METRICS[device]
+    module = _module(device)
+    replicate, metrics = getattr(module, replicate), getattr(module, metrics)
+    sets = {}
+    for series in get_series_names(getattr(module, data)):
+        records = sets[series] = []
+        for path in series_paths(series):
+            df = replicate(path)
+            records.append(metrics(df, parse_name(path)['institute']) if device == "Cone" else metrics(df))
+    return sets
+
+
+def _set_columns(series:str, records):
+    return {'set': series, 'Duck': label_def(series.split('_')[0])[0],
+            'conditions': '_'.join(series.split('_')[3:]), 'replicates': len(records)}
+
+
+def set_table(device:str, sets:dict=None):
+    """Average_values of the analysis script of `device` (mean and std of the replicates of each set)"""
+    names = SET_METRICS[device][-1]
+    rows = [dict(_set_columns(series, records), **replicate_statistics(records))
+            for series, records in (sets or set_records(device)).items()]
+    value_columns = [c for name in names for c in (name, f'std {name}')]
+    return pd.DataFrame(rows, columns=['set', 'Duck', 'conditions', 'replicates'] + value_columns)
+
+
+def set_ci_table(device:str, sets:dict=None, **bootstrap):
+    """Percentile bootstrap confidence interval of the mean of each value of each set (Bootstrap.py)"""
+    names = SET_METRICS[device][-1]
+    rows = [dict(_set_columns(series, records), **values_ci(records, **bootstrap))
+            for series, records in (sets or set_records(device)).items()]
+    value_columns = [c for name in names for c in (f'ci low {name}', f'ci high {name}')]
+    return pd.DataFrame(rows, columns=['set', 'Duck', 'conditions', 'replicates'] + value_columns)
+
+
+def heat_of_reaction_table():
+    """Heat of reaction of every STA experiment (as printed by DSC_analysis.py)"""
+    module = _module("DSC")
+    rows = []
+    for path in sorted(p for p in module.DSC_Data if 'STA' in p.name.upper()):
+        df = module.dsc_replicate(path, columns=None)
+        rows.append(dict({'experiment': path.stem}, **module.heat_of_reaction(df)))
+    return pd.DataFrame(rows, columns=['experiment', 'T start', 'T end', 'heat of reaction'])
+
+
+def average_curves(device:str, bootstrap:bool=True):
+    """
+    Averaged curve of every set of `device` with quantile bands and (with `bootstrap`)
+    bootstrap confidence intervals of the averaged columns, by set name
+    """
+    module = _module(device)
+    if device == "DSC":
+        curves = {s: module.average_dsc_series(s, bands=True) for s in get_series_names(module.DSC_Data)}
+    else:
+        data, *_, average, _ = SET_METRICS[device]
+        curves = {s: getattr(module, average)(s, bands=True) for s in get_series_names(getattr(module, data))}
+    if not bootstrap:
+        return curves
+    key = BOOTSTRAP_CURVES[device][0]
+    for series, df in curves.items():
+        ci = set_curve_ci(device, series).filter(regex=r' ci (low|high)$|^' + re.escape(key) + '$')
+        curves[series] = df.merge(ci, on=key, how='left')
+    return curves
+
+
+def write_table(df:pd.DataFrame, path:Path, fmt:str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fmt == "parquet":
+        df.to_parquet(path.with_suffix(".parquet"), index=False)
+    else:
+        df.to_csv(path.with_suffix(".csv"), index=False)
+
+
+def run(output:Path=OUTPUT_DIR, devices=DEVICES, fmt:str="csv", curves:bool=False,
+        bootstrap:bool=False, interlab:bool=False, deconvolution:bool=False):
+    """
+    Write the tables of `devices` to `output` (the averaged curves, bootstrap intervals,
+    inter-laboratory statistics and TGA deconvolution on request), returns the number
+    of files written
+    """
+    n = 0
+    for device in devices:
+        for i, df in enumerate(availability_tables(device), start=1):
+            write_table(df, output / f"availability_{device}_{i}", fmt)
+            n += 1
+        if device in SET_METRICS:
+            records = set_records(device)
+            sets = set_table(device, records)
+            # column names of the Average_values of the analysis script
+            columns = getattr(_module(device), "AVERAGE_COLUMNS", {})
+            write_table(sets.rename(columns=columns), output / f"{device.lower()}_sets", fmt)
+            n += 1
+            if bootstrap:
+                write_table(set_ci_table(device, records), output / f"{device.lower()}_sets_ci", fmt)
+                n += 1
+            if interlab:
+                table, labs = interlab_scalars(sets, SET_METRICS[device][-1])
+                write_table(table, output / f"{device.lower()}_interlab", fmt)
+                write_table(labs, output / f"{device.lower()}_interlab_labs", fmt)
+                n += 2
+        if device == "DSC":
+            write_table(heat_of_reaction_table(), output / "sta_heat_of_reaction", fmt)
+            n += 1
+        if device == "TGA" and deconvolution:
+            sets = get_series_names(_module(device).TGA_Data)
+            write_table(deconvolution_summary(deconvolve(sets)), output / "tga_deconvolution", fmt)
+            n += 1
+        if curves:
+            for series, df in average_curves(device, bootstrap).items():
+                write_table(df, output / "curves" / device / re.sub(r'[^\w.-]', '_', series), fmt)
+                n += 1
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Metrics of the analysis scripts as tables, without figures")
+    parser.add_argument("--output", default=str(OUTPUT_DIR), help="directory of the tables")
+    parser.add_argument("--devices", default=','.join(DEVICES), help=f"comma separated, of {DEVICES}")
+    parser.add_argument("--format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--curves", action="store_true", help="averaged curves of every set with quantile bands")
+    parser.add_argument("--bootstrap", action="store_true", help="bootstrap confidence intervals of the sets (and curves)")
+    parser.add_argument("--interlab", action="store_true", help="inter-laboratory statistics (ISO 5725-2)")
+    parser.add_argument("--deconvolution", action="store_true", help="pseudo-components of the TGA mass loss rates")
+    parser.add_argument("--all", action="store_true", help="all of the above")
+    args = parser.parse_args()
+
+    devices = [d.strip() for d in args.devices.split(',') if d.strip()]
+    unknown = [d for d in devices if d not in DEVICES]
+    if unknown:
+        parser.error(f"unknown device(s) {unknown}, use {DEVICES}")
+    if args.format == "parquet" and not any(importlib.util.find_spec(m) for m in ("pyarrow", "fastparquet")):
+        parser.error("parquet output needs pyarrow or fastparquet")
+
+    n = run(Path(args.output), devices, args.format, curves=args.curves or args.all,
+            bootstrap=args.bootstrap or args.all, interlab=args.interlab or args.all,
+            deconvolution=args.deconvolution or args.all)
+    print(f"{n} tables written to {args.output}")
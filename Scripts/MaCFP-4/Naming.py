@@ -0,0 +1,152 @@
+# naming conventions of the calibration data trees (one adapter per tree)
+#
+#   Wood   {institute}_{material}_{device}_{conditions}[_{extra}]_R{n}.csv
+#          header 'Time (s),Temperature (K),Mass (mg)'
+#   PMMA   {institute}_{device}_{conditions}[_{extra}][_{n}].csv     (UMD_TGA_N2_10K.csv, NIST_Cone_25kW_1.csv)
+#          header 'Time,Temperature,Mass' and a units row '[s],[K],[mg]'
+#
+# The analysis works on canonical metadata and set names, those of the Wood convention:
+# DBI_Lund/DBI_Lund_TGA_N2_20K_2.csv is replicate 2 of the set DBI-Lund_PMMA_TGA_N2_20K.
+# The institute is the directory of the file ('_' replaced by '-', so it stays one field
+# of the name; HKPoly for the HKPolyU_ files), files without a number are replicate 1
+# and the g-scale tests of the PMMA tree are horizontal ('hor'). The columns of a PMMA
+# file are mapped to the schema names of Readers.SCHEMAS by name and unit; files of
+# other devices (FPA, the derived CAPA data) or without the columns of their schema are
+# not part of the analysis. Other trees (e.g. MACFP_DATA_DIR) use the Wood convention.
+from __future__ import annotations
+
+import re
+
+from pathlib import Path
+
+
+# data trees of the materials (relative to the project root)
+TREES = {
+    "Wood": Path("Wood") / "Calibration_Data",
+    "PMMA": Path("PMMA") / "Calibration_Data",
+}
+
+
+class WoodNaming:
+    """File names with the material and an R before the replicate number, units in the column names"""
+
+    units_row = False
+
+    def institute(self, directory:str):
+        """Institute of the files of an institute directory"""
+        return directory
+
+    def parse(self, path:Path):
+        """
+        Split a file name into its metadata fields.
+
+        mg-scale:  {institute}_{material}_{device}_{atmosphere}_{heating rate}[_{extra}]_R{n}
+        g-scale:   {institute}_{material}_{device}_{flux}_{orientation}[_{extra}]_R{n}
+        CAPA:      {institute}_{material}_CAPA_{atmosphere}_{flux}_R{n}
+        """
+        stem = Path(path).stem
+        match = re.match(r"^(.*)_[Rr](\d+)$", stem)
+        series, replicate = (match.group(1), int(match.group(2))) if match else (stem, float('nan'))
+        parts = series.split("_")
+        parts += [""] * (5 - len(parts))
+        inst, mat, dev = parts[:3]
+        meta = {
+            "institute": inst, "material": mat, "device": dev,
+            "atmosphere": "", "heating_rate": "", "flux": "", "orientation": "",
+            "extra": "_".join(parts[5:]), "series": series, "replicate": replicate,
+        }
+        if dev in ("Cone", "Gasification", "FPA"):
+            meta["flux"], meta["orientation"] = parts[3:5]
+        elif dev == "CAPA":
+            meta["atmosphere"], meta["flux"] = parts[3:5]
+        else:
+            meta["atmosphere"], meta["heating_rate"] = parts[3:5]
+        return meta
+
+    def accepts(self, path:Path):
+        """True if the file is part of the analysis"""
+        return True
+
+
+class PMMANaming(WoodNaming):
+    """File names without the material, optional replicate number; names and units in two header rows"""
+
+    material = "PMMA"
+    units_row = True
+    DEVICES = ("TGA", "DSC", "MCC", "Cone", "Gasification")
+    G_SCALE = ("Cone", "Gasification", "FPA", "CAPA")
+    ORIENTATION = "hor"
+
+    # schema column of a column name (lower case), per scale where they differ
+    COLUMNS = {
+        "time": "Time (s)",
+        "temperature": "Temperature (K)", "temp": "Temperature (K)",
+        "mass": ("Mass (mg)", "Mass (g)"), "sample mass": ("Mass (mg)", "Mass (g)"), "tga": ("Mass (mg)", "Mass (g)"),
+        "mass fraction": ("Mass (mg)", None),   # TGA mass is normalized by its initial value
+        "heat flow": "Heat Flow Rate (W/g)", "heat flow rate": "Heat Flow Rate (W/g)", "heat flux": "Heat Flow Rate (W/g)",
+        "hrr": ("HRR (W/g)", "HRR (kW/m2)"),
+    }
+    # units of the units row (lower case, without brackets) that are the unit of a schema column
+    UNITS = {
+        "Time (s)": {"s"},
+        "Temperature (K)": {"k"},
+        "Mass (mg)": {"mg", "g/g"},
+        "Mass (g)": {"g"},
+        "Heat Flow Rate (W/g)": {"w/g", "mw/mg", "w g-1"},
+        "HRR (W/g)": {"w/g"},
+        "HRR (kW/m2)": {"kw/m2", "kw m-2"},
+    }
+
+    def institute(self, directory:str):
+        return directory.replace("_", "-")
+
+    def parse(self, path:Path):
+        path = Path(path)
+        tokens = path.stem.split("_")
+        index = next((i for i, t in enumerate(tokens) if t in self.G_SCALE or t in ("TGA", "DSC", "MCC", "STA")), None)
+        if index is None:
+            return super().parse(path)
+        device, rest = tokens[index], tokens[index + 1:]
+        replicate = int(rest.pop()) if rest and rest[-1].isdigit() else 1
+        if device == "CAPA":   # no atmosphere in the name
+            conditions = [""] + rest
+        elif device in self.G_SCALE:
+            conditions = rest[:1] + [self.ORIENTATION] + rest[1:]
+        else:
+            conditions = rest
+        stem = "_".join([self.institute(path.parent.name), self.material, device] + conditions)
+        return super().parse(f"{stem}_R{replicate}")
+
+    def header(self, path:Path, device:str=None):
+        """Schema name of every column of the file (None where the name or unit is not known)"""
+        with open(path, "r", encoding="utf-8-sig") as fh:
+            names = fh.readline().rstrip("\r\n").split(",")
+            units = fh.readline().rstrip("\r\n").split(",")
+        g_scale = (device or self.parse(path)["device"]) in self.G_SCALE
+        header = []
+        for i, name in enumerate(names):
+            column = self.COLUMNS.get(name.strip().lower())
+            if isinstance(column, tuple):
+                column = column[g_scale]
+            unit = units[i].strip().strip("[]").lower() if i < len(units) else ""
+            header.append(column if column is not None and unit in self.UNITS[column] else None)
+        return header
+
+    def accepts(self, path:Path):
+        from Readers import SCHEMAS
+        device = self.parse(path)["device"]
+        return device in self.DEVICES and set(SCHEMAS[device]["required"]) <= set(self.header(path, device))
+
+
+WOOD = WoodNaming()
+NAMINGS = {TREES["Wood"].parts: WOOD, TREES["PMMA"].parts: PMMANaming()}
+
+
+def tree_naming(data_dir:Path):
+    """Naming convention of a data tree"""
+    return NAMINGS.get(Path(data_dir).parts[-2:], WOOD)
+
+
+def naming(path:Path):
+    """Naming convention of a data file, by the tree it is in ({tree}/{institute}/{file})"""
+    return tree_naming(Path(path).parent.parent)
@@ -0,0 +1,75 @@
+# multi-series plotting: one artist per institute and style instead of one per replicate
+import numpy as np
+
+from matplotlib.collections import LineCollection
+
+
+def _segments(x, y):
+    """(x, y) split at NaN into continuous segments of shape (n, 2)"""
+    xy = np.column_stack([np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)])
+    finite = np.isfinite(xy).all(axis=1)
+    breaks = np.flatnonzero(np.diff(finite.astype(int))) + 1
+    return [s[np.isfinite(s).all(axis=1)] for s in np.split(xy, breaks) if np.isfinite(s).any()]
+
+
+class Ensemble:
+    """
+    Curves of many replicates, grouped by label and style and drawn as a single
+    artist per group: a LineCollection for lines, one Line2D without line for
+    markers. The legend gets one entry per label.
+
+        ens = Ensemble()
+        for path in paths:
+            ens.add(df['Temperature (K)'], df['Normalized mass'], label, color)
+        ens.draw(ax)
+    """
+
+    def __init__(self):
+        self._groups = {}
+
+    def add(self, x, y, label:str, color, linestyle='-', marker=None, **style):
+        """Add a curve; style keywords (linewidth, zorder, alpha, markersize) are part of the group"""
+        key = (label, color, linestyle, marker, tuple(sorted(style.items())))
+        self._groups.setdefault(key, []).extend(_segments(x, y))
+
+    def draw(self, ax, legend:bool=True, **legend_kwargs):
+        """Draw all groups on `ax`, autoscale it and add the legend"""
+        for (label, color, linestyle, marker, style), segments in self._groups.items():
+            style = dict(style)
+            if not segments:
+                continue
+            if marker is None:
+                lc = LineCollection(
+                    segments, colors=color, linestyles=linestyle, label=label,
+                    linewidths=style.pop('linewidth', None), **style,
+                )
+                ax.add_collection(lc, autolim=True)
+            else:
+                points = np.concatenate(segments)
+                ax.plot(points[:, 0], points[:, 1], marker, linestyle='none', color=color, label=label, **style)
+        ax.autoscale_view()
+        if legend:
+            # one entry per label (groups of the same institute with another style share it)
+            handles, labels = ax.get_legend_handles_labels()
+            by_label = dict(zip(labels, handles))
+            ax.legend(by_label.values(), by_label.keys(), **legend_kwargs)
+
+
+def quantile_bands(ax, x, df, column:str, color, label:str=None, zorder:int=2):
+    """
+    Median of `column` with the interquartile (dark) and 5-95 % range (light) of
+    the replicates, from the band columns of an average (bands=True)
+    """
+    ax.fill_between(x, df[f'{column} q05'], df[f'{column} q95'], color=color, alpha=0.15, linewidth=0, zorder=zorder)
+    ax.fill_between(x, df[f'{column} q25'], df[f'{column} q75'], color=color, alpha=0.35, linewidth=0, zorder=zorder)
+    ax.plot(x, df[f'{column} median'], color=color, label=label, zorder=zorder + 1)
+
+
+def zoom_limits(ax, xlim=(None, None), ylim=(None, None), base=None):
+    """
+    Set the limits of a zoom variant; None keeps the autoscaled limit of `base`
+    ((xlim, ylim) of the complete figure, taken before the first zoom).
+    """
+    base_x, base_y = base if base is not None else (ax.get_xlim(), ax.get_ylim())
+    ax.set_xlim(*(b if v is None else v for v, b in zip(xlim, base_x)))
+    ax.set_ylim(*(b if v is None else v for v, b in zip(ylim, base_y)))
@@ -0,0 +1,226 @@
+# readers for the calibration data files
+
+from pathlib import Path
+
+from Lazy import lazy_import
+from Instrument import timed
+from Naming import naming
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+#region schemas
+# column conventions of the institute READMEs per device type
+# (data files of one device may only use columns from 'required' + 'optional')
+SCHEMAS = {
+    'TGA': {
+        'required': ['Time (s)', 'Temperature (K)', 'Mass (mg)'],
+        'optional': [],
+    },
+    'STA': {
+        'required': ['Time (s)', 'Temperature (K)', 'Mass (mg)', 'Heat Flow Rate (W/g)'],
+        'optional': [],
+    },
+    'DSC': {
+        'required': ['Time (s)', 'Temperature (K)', 'Heat Flow Rate (W/g)'],
+        'optional': [],
+    },
+    'MCC': {
+        'required': ['Time (s)', 'Temperature (K)', 'HRR (W/g)'],
+        'optional': [],
+    },
+    'Cone': {
+        'required': ['Time (s)', 'Mass (g)', 'HRR (kW/m2)'],
+        'optional': ['TC back 1 (K)', 'TC back 2 (K)', 'TC back 3 (K)', 'TC Top (K)'],
+    },
+    'CAPA': {
+        'required': ['Time (s)', 'Mass (g)'],
+        'optional': ['TC Back (K)', 'TC Top (K)'],
+    },
+    'Gasification': {
+        'required': ['Time (s)', 'Mass (g)'],
+        'optional': ['MLR (g/s)', 'TC back 1 (K)', 'TC back 2 (K)', 'TC back 3 (K)'],
+    },
+}
+
+
+def file_device(path:Path):
+    """Device type from a file name like FSRI_Wood_STA_N2_10K_R1.csv (naming convention of its tree)"""
+    device = naming(path).parse(path)['device']
+    if device not in SCHEMAS:
+        raise ValueError(f"Unknown device type in file name {Path(path).name}")
+    return device
+
+
+def read_header(path:Path):
+    """
+    Column names from the first line of a CSV file (BOM and trailing empty columns removed),
+    for trees with a units row the schema names (None for columns without one, Naming.py)
+    """
+    if naming(path).units_row:
+        return naming(path).header(path)
+    with open(path, 'r', encoding='utf-8-sig') as fh:
+        header = fh.readline().rstrip('\r\n').split(',')
+    while header and header[-1].strip() == '':
+        header.pop()
+    return [c.strip() for c in header]
+
+
+def check_header(path:Path, device:str=None):
+    """
+    Validate the header of a data file against the schema of its device type.
+
+    Raises a ValueError for missing required columns, unknown columns or
+    duplicated columns and returns the header otherwise.
+    """
+    device = device or file_device(path)
+    schema = SCHEMAS[device]
+    header = read_header(path)
+    named = [c for c in header if c is not None]
+
+    missing = [c for c in schema['required'] if c not in named]
+    unknown = [c for c in named if c not in schema['required'] + schema['optional']]
+    duplicated = sorted({c for c in named if named.count(c) > 1})
+    if missing or unknown or duplicated:
+        raise ValueError(
+            f"Malformed header in {Path(path).name} ({device}): "
+            f"missing {missing}, unknown {unknown}, duplicated {duplicated}"
+        )
+    return header
+
+
+def _layout(path:Path, header):
+    """read_csv arguments for the header of a file (names and units rows of Naming.py trees)"""
+    if not naming(path).units_row:
+        return {}
+    names = [c if c is not None else f"unnamed {i}" for i, c in enumerate(header)]
+    return {'header': None, 'skiprows': 2, 'names': names, 'index_col': False}
+
+
+@timed
+def read_series(path:Path, columns=None, device:str=None):
+    """
+    Read a data file with the schema of its device type.
+
+    Only `columns` are parsed (all columns of the file if None), all of them
+    as float64 with the C parser, in the order they are requested.
+
+    Parameters
+    ----------
+    path : Path
+        CSV file to read
+    columns : list[str], optional
+        Columns to read, e.g. ['Time (s)', 'Temperature (K)']
+    device : str, optional
+        Device type, taken from the file name if None
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    header = check_header(path, device)
+    if columns is None:
+        columns = [c for c in header if c is not None]
+    absent = [c for c in columns if c not in header]
+    if absent:
+        raise ValueError(f"Columns {absent} not in {Path(path).name}")
+
+    df = pd.read_csv(
+        path,
+        usecols=columns,
+        dtype={c: np.float64 for c in columns},
+        engine='c',
+        encoding='utf-8-sig',
+        **_layout(path, header),
+    )
+    return df[list(columns)]
+
+
+#region streaming
+@timed
+def stream_resample(path:Path, x_col:str, step:float, columns=None, chunksize:int=20000, progress=None):
+    """
+    Read a CSV file in chunks and resample it onto a regular grid of `x_col` while reading.
+
+    The grid starts at ceil(x_first) and ends at floor(x_last), like
+    `Utils.interpolation`, so the result is the same as reading the whole file
+    and interpolating it afterwards (for monotonic `x_col`). Only the current chunk and the resampled
+    output are held in memory, so peak memory depends on the output grid and not
+    on the size (or sample rate) of the raw file.
+
+    Parameters
+    ----------
+    path : Path
+        CSV file to read
+    x_col : str
+        Column that defines the grid, e.g. 'Temperature (K)' or 'Time (s)'
+    step : float
+        Grid spacing in units of `x_col` (0.5 K for mg-scale, 1 s for cone data)
+    columns : list[str], optional
+        Columns to read (checked against the schema), all columns if None
+    chunksize : int
+        Number of raw rows parsed per chunk
+    progress : callable, optional
+        Called as progress(bytes_read, bytes_total) after every chunk
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    path = Path(path)
+    total = path.stat().st_size
+    header = check_header(path)
+    if columns is None:
+        columns = [c for c in header if c is not None]
+    absent = [c for c in list(columns) + [x_col] if c not in header]
+    if absent:
+        raise ValueError(f"Columns {absent} not in {path.name}")
+    columns = list(columns) if x_col in columns else [x_col] + list(columns)
+    ix = columns.index(x_col)
+
+    with open(path, 'rb') as fh:
+        reader = pd.read_csv(
+            fh,
+            usecols=columns,
+            dtype={c: np.float64 for c in columns},
+            chunksize=chunksize,
+            encoding='utf-8-sig',
+            **_layout(path, header),
+        )
+        grid_start = None
+        k_next = 0
+        prev = None
+        out = []
+        for chunk in reader:
+            values = chunk[columns].to_numpy()
+            if len(values) == 0:
+                continue
+
+            # keep the last row of the previous chunk to interpolate across the chunk border
+            if prev is not None:
+                values = np.vstack([prev, values])
+            prev = values[-1:]
+
+            x = values[:, ix]
+            if grid_start is None:
+                grid_start = np.ceil(x[0])
+            k_end = int(np.floor((x[-1] - grid_start) / step))
+            if k_end >= k_next:
+                grid = grid_start + np.arange(k_next, k_end + 1) * step
+                block = np.empty((len(grid), len(columns)))
+                for j in range(len(columns)):
+                    block[:, j] = grid if j == ix else np.interp(grid, x, values[:, j])
+                out.append(block)
+                k_next = k_end + 1
+
+            if progress is not None:
+                progress(min(fh.tell(), total), total)
+
+    if len(out) == 0:
+        return pd.DataFrame(columns=columns, dtype=np.float64)
+
+    data = np.concatenate(out)
+    # same upper end as Utils.interpolation: floor of the last value
+    data = data[data[:, ix] <= np.floor(prev[0, ix])]
+    return pd.DataFrame(data, columns=columns)
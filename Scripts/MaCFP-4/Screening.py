@@ -0,0 +1,205 @@
+# data quality screening of the calibration data, run before the analysis
+from __future__ import annotations
+
+import argparse
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from Lazy import lazy_import
+from Utils import DATA_DIR, SCRIPT_DIR, device_data, catalog
+from Readers import read_series
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+# manual decisions (exclusions, temperature cuts, plot order) that are not found by the checks
+OVERRIDES_FILE = SCRIPT_DIR / "quality_overrides.csv"
+
+# plausible range of a statistic of each column, values outside point to wrong units
+UNIT_RANGES = {
+    'Time (s)': ('max', 60, 1e5),
+    'Temperature (K)': ('min', 250, 1000),
+    'Mass (mg)': ('max', 0.1, 100),
+    'Mass (g)': ('max', 0.5, 2000),
+    'HRR (W/g)': ('max', 1, 1500),
+    'HRR (kW/m2)': ('max', 10, 3000),
+    'Heat Flow Rate (W/g)': ('median', -50, 50),
+}
+
+# thresholds for the flags
+LIMITS = {
+    'max_nan_run': 10,               # consecutive rows with NaN
+    'heating_rate_deviation': 0.1,   # relative deviation of the ramp from the nominal heating rate
+    'mass_gain': 0.02,               # m/m0 - 1 above the initial mass
+    'mass_loss_400K': 0.03,          # mass lost below 400 K (moisture)
+}
+
+
+def load_device(cat:pd.DataFrame, workers:int=8):
+    """Read all files of one device type in parallel into one long frame with a 'file' column"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        frames = list(pool.map(read_series, cat['path']))
+    df = pd.concat(frames, keys=cat.index, names=['file', 'row']).reset_index(level='row', drop=True)
+    return df.reset_index()
+
+
+def check_device(df:pd.DataFrame, cat:pd.DataFrame):
+    """
+    Run all checks for the files of one device type at once (grouped by file).
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Long frame of all files (see load_device)
+    cat : pandas.DataFrame
+        Catalog rows of the same files
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    file = df['file']
+    g = df.groupby('file', sort=False)
+    res = pd.DataFrame(index=cat.index)
+    res['n_points'] = g.size()
+
+    # time axis
+    dt = g['Time (s)'].diff()
+    res['time_reversals'] = (dt < 0).groupby(file).sum()
+    res['duplicated_times'] = (dt == 0).groupby(file).sum()
+
+    # longest run of rows with a NaN in any column of the file
+    # (columns of other files of the same device are NaN and ignored)
+    values = df.drop(columns='file')
+    present = values.notna().groupby(file).any().reindex(file).to_numpy()
+    isna = pd.Series((values.isna().to_numpy() & present).any(axis=1), index=df.index)
+    run_id = (~isna).groupby(file).cumsum()
+    res['max_nan_run'] = isna.groupby([file, run_id]).sum().groupby(level=0).max()
+
+    # temperature program: median dT/dt on the ramp vs. nominal heating rate
+    if 'Temperature (K)' in df:
+        nominal = pd.to_numeric(cat['heating_rate'].str.extract(r'^(\d+\.?\d*)K$')[0], errors='coerce')
+        dT = g['Temperature (K)'].diff()
+        rate = 60 * dT / dt.where(dt > 0)
+        on_ramp = rate > 0.5 * file.map(nominal)
+        res['temperature_reversals'] = (dT < 0).groupby(file).sum()
+        res['heating_rate'] = rate.where(on_ramp).groupby(file).median()
+        res['heating_rate_deviation'] = res['heating_rate'] / nominal - 1
+
+    # mass drift and moisture loss, relative to the initial mass as used in the analysis
+    if 'Mass (mg)' in df:
+        m0 = g['Mass (mg)'].transform(lambda m: m.iloc[0:5].mean())
+        m = df['Mass (mg)'] / m0
+        res['mass_gain'] = m.groupby(file).max() - 1
+        below_400 = df['Temperature (K)'] <= 400
+        res['mass_loss_400K'] = 1 - m.where(below_400).groupby(file).min()
+
+    # unit scale: statistic of every column within its plausible range
+    anomalies = pd.Series('', index=res.index)
+    for col, (stat, low, high) in UNIT_RANGES.items():
+        if col in df:
+            value = g[col].agg(stat)
+            bad = (value < low) | (value > high)
+            anomalies[bad.index[bad]] += col + ';'
+    res['unit_anomaly'] = anomalies.str.rstrip(';')
+    return res
+
+
+def screen(paths, workers:int=8):
+    """
+    Check all data files and return one row per file with the check results and flags.
+
+    Files are read in parallel, the checks are vectorized over all files of a device type.
+    """
+    cat = catalog(paths)
+    results = [
+        check_device(load_device(cat_dev, workers), cat_dev)
+        for _, cat_dev in cat.groupby('device', sort=False)
+    ]
+    report = pd.concat(results).reindex(index=cat.index, columns=[
+        'n_points', 'time_reversals', 'duplicated_times', 'max_nan_run', 'temperature_reversals',
+        'heating_rate', 'heating_rate_deviation', 'mass_gain', 'mass_loss_400K', 'unit_anomaly',
+    ])
+    report.insert(0, 'device', cat['device'])
+    report.insert(0, 'institute', cat['institute'])
+
+    flags = pd.DataFrame({
+        'non-monotonic time': report['time_reversals'] > 0,
+        'duplicated timestamps': report['duplicated_times'] > 0,
+        'NaN run': report['max_nan_run'] > LIMITS['max_nan_run'],
+        'heating rate': report['heating_rate_deviation'].abs() > LIMITS['heating_rate_deviation'],
+        'mass drift': report['mass_gain'] > LIMITS['mass_gain'],
+        'moisture': report['mass_loss_400K'] > LIMITS['mass_loss_400K'],
+        'unit scale': report['unit_anomaly'].fillna('') != '',
+    }, index=report.index)
+    report['issues'] = flags.apply(lambda row: ';'.join(row.index[row.to_numpy(dtype=bool)]), axis=1)
+
+    # severe problems exclude a file; moisture is only flagged, temperature cuts are set in the overrides
+    report['exclude'] = flags['non-monotonic time'] | flags['unit scale'] | flags['heating rate']
+    report['min_temperature'] = np.nan
+    report['background'] = False
+    report['reason'] = ''
+    return report
+
+
+def apply_overrides(report:pd.DataFrame, overrides_file:Path=OVERRIDES_FILE):
+    """Apply the manual decisions of the overrides file (matched on the file name) to the report"""
+    report = report.copy()
+    overrides = pd.read_csv(overrides_file, comment='#', keep_default_na=False)
+    for _, row in overrides.iterrows():
+        hit = report.index.str.contains(row['pattern'], regex=False)
+        if row['exclude'] != '':
+            report.loc[hit, 'exclude'] = row['exclude'] == 'True'
+        if row['min_temperature'] != '':
+            report.loc[hit, 'min_temperature'] = float(row['min_temperature'])
+        if row['background'] != '':
+            report.loc[hit, 'background'] = row['background'] == 'True'
+        report.loc[hit, 'reason'] = row['reason']
+    return report
+
+
+def quality_report(paths, workers:int=8):
+    """Screening results with the manual overrides applied"""
+    return apply_overrides(screen(paths, workers))
+
+
+def quality_filter(paths, quality:pd.DataFrame):
+    """Paths that are not excluded in the quality report"""
+    return [p for p in paths if not quality.loc[Path(p).stem, 'exclude']]
+
+
+def quality_cut(df:pd.DataFrame, path:Path, quality:pd.DataFrame):
+    """Remove the data below the minimum temperature of the quality report"""
+    min_temp = quality.loc[Path(path).stem, 'min_temperature']
+    if np.isnan(min_temp):
+        return df
+    return df[df['Temperature (K)'] > min_temp].reset_index(drop=True)
+
+
+def cut_temperature(path:Path, temp_filter=None, quality:pd.DataFrame=None):
+    """
+    Temperature (K) below which the data of `path` is removed: the highest of the
+    temperature filters of its institute and the minimum temperature of the quality
+    report, None if there is no cut.
+    """
+    bounds = [min_temp for institute, min_temp in (temp_filter or {}).items() if institute in str(path)]
+    if quality is not None:
+        bounds.append(quality.loc[Path(path).stem, 'min_temperature'])
+    bounds = [float(b) for b in bounds if not np.isnan(b)]
+    return max(bounds) if bounds else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Screen all calibration data files")
+    parser.add_argument('--output', '-o', default='quality_report.csv', help="report file (.csv or .json)")
+    parser.add_argument('--workers', '-w', type=int, default=8)
+    args = parser.parse_args()
+
+    report = quality_report(device_data(DATA_DIR, ''), args.workers)
+    if args.output.endswith('.json'):
+        report.to_json(args.output, orient='index', indent=1)
+    else:
+        report.to_csv(args.output)
+    print(report[report['issues'] != ''][['issues', 'exclude', 'min_temperature']])
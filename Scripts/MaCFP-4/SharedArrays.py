@@ -0,0 +1,119 @@
+# shared memory for the resampled replicate arrays (ensembles) used by analysis workers
+#
+# The parent publishes every ensemble once (values and NaN mask as one block of
+# shared memory), workers attach read-only views by name, so the curves of a set are
+# read and resampled once and no DataFrame is pickled to the workers:
+#
+#   with SharedEnsembles() as shared:
+#       for series in sets:
+#           shared.publish(series, ensemble(series))
+#       results = map_shared(fit_chain, shared, chains(sets), workers=4)
+#
+# The blocks are unlinked by the parent when the context is left (or at exit).
+from __future__ import annotations
+
+import atexit
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from Lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+class SharedFrame:
+    """Read-only view of a published ensemble: values, mask (finite values) and column names"""
+
+    def __init__(self, shm, shape, columns):
+        n = shape[0] * shape[1]
+        self.columns = list(columns)
+        self.values = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        self.mask = np.ndarray(shape, dtype=np.bool_, buffer=shm.buf, offset=8 * n)
+        self.values.flags.writeable = False
+        self.mask.flags.writeable = False
+
+    def column(self, name:str):
+        """Values and mask of a column (views, no copy)"""
+        j = self.columns.index(name)
+        return self.values[:, j], self.mask[:, j]
+
+
+class SharedEnsembles:
+    """Owner of the shared memory blocks of the published ensembles (parent process)"""
+
+    def __init__(self):
+        self._blocks = {}
+        self.descriptors = {}
+        self._owner = os.getpid()
+        atexit.register(self.close)
+
+    def publish(self, name:str, df:pd.DataFrame):
+        """Copy an ensemble into shared memory once and return its descriptor"""
+        if name in self.descriptors:
+            return self.descriptors[name]
+        values = df.to_numpy(dtype=np.float64)
+        n = values.size
+        shm = shared_memory.SharedMemory(create=True, size=max(9 * n, 1))
+        np.ndarray(values.shape, dtype=np.float64, buffer=shm.buf)[:] = values
+        np.ndarray(values.shape, dtype=np.bool_, buffer=shm.buf, offset=8 * n)[:] = np.isfinite(values)
+        self._blocks[name] = shm
+        self.descriptors[name] = {"shm": shm.name, "shape": values.shape, "columns": list(df.columns)}
+        _attached[shm.name] = (shm, SharedFrame(shm, values.shape, df.columns))
+        return self.descriptors[name]
+
+    def close(self):
+        """Release and unlink all blocks (only the creating process unlinks)"""
+        if os.getpid() != self._owner:
+            return
+        for shm in self._blocks.values():
+            _attached.pop(shm.name, None)
+            try:
+                shm.close()
+            except BufferError:
+                pass   # views still in use, the mapping goes away with them
+            shm.unlink()
+        self._blocks.clear()
+        self.descriptors.clear()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# views attached in this process, by block name
+_attached = {}
+
+
+def attach(descriptor:dict):
+    """Read-only view of an ensemble from its descriptor (cached per process)"""
+    name = descriptor["shm"]
+    if name not in _attached:
+        # the workers of a pool share the resource tracker of the parent, the block
+        # stays registered once and is unlinked by the parent
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = (shm, SharedFrame(shm, tuple(descriptor["shape"]), descriptor["columns"]))
+    return _attached[name][1]
+
+
+def _call(func, descriptors:dict, args):
+    return func({name: attach(d) for name, d in descriptors.items()}, *args)
+
+
+def map_shared(func, shared:SharedEnsembles, groups, *args, workers:int=4):
+    """
+    Call func(views, *args) for every group of published ensembles in a process pool,
+    views: name -> SharedFrame in the order of the group. Only the descriptors are sent
+    to the workers; with workers <= 1 the groups are processed in this process.
+    """
+    jobs = [{name: shared.descriptors[name] for name in group} for group in groups]
+    if workers <= 1:
+        return [_call(func, descriptors, args) for descriptors in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_call, func, descriptors, args) for descriptors in jobs]
+        return [f.result() for f in futures]
@@ -0,0 +1,245 @@
+# nearest neighbour search over all experiments (outliers, mislabeled atmospheres or heating rates)
+#
+#   python Similarity.py update                              embed new and changed files
+#   python Similarity.py similar ../../Wood/Calibration_Data/FSRI/FSRI_Wood_STA_N2_10K_R1.csv -k 5
+#   python Similarity.py check ../../Wood/Calibration_Data/FSRI/FSRI_Wood_STA_N2_10K_R1.csv
+#   python Similarity.py check --all TGA                      all files far from their condition
+#
+# Every replicate is embedded as a fixed length vector: its derived series (TGA normalized
+# mass and MLR, MCC HRR, DSC heat flow over temperature, cone HRR over time) interpolated
+# onto a fixed grid. Each kind has its own KD-tree over the vectors, each quantity scaled by
+# its standard deviation over all vectors of the kind. The embeddings are kept in an .npz
+# file; an update embeds only files that are new or changed (size and modification time,
+# like Store.py ingest) and drops removed ones. The distance of a file to its declared
+# condition (material, atmosphere and heating rate, or heat flux and orientation) is given
+# relative to the typical distance of the other members of the condition to their mean.
+from __future__ import annotations
+
+import argparse
+import importlib
+import os
+
+from pathlib import Path
+
+from Lazy import lazy_import
+from Utils import SCRIPT_DIR, PROJECT_ROOT, parse_name, render_table
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+INDEX_FILE = SCRIPT_DIR / "similarity_index.npz"
+
+# per kind: functions module, data list, replicate function, grid column, grid (start, stop, step),
+# and the embedded quantities (column, value outside the data: 'edge' or 0)
+KINDS = {
+    "TGA": ("TGA_functions", "TGA_Data", "tga_replicate", "Temperature (K)", (300, 900, 5),
+            [('Normalized mass', 'edge'), ('dm/dt', 0)]),
+    "MCC": ("MCC_functions", "MCC_Data", "mcc_replicate", "Temperature (K)", (300, 900, 5),
+            [('HRR (W/g)', 0)]),
+    "DSC": ("DSC_functions", "DSC_Data", "dsc_replicate", "Temperature (K)", (300, 900, 5),
+            [('Heat Flow Rate (W/g)', 'edge')]),
+    "Cone": ("Cone_functions", "Cone_Data", "cone_replicate", "Time (s)", (0, 1500, 10),
+             [('HRR (kW/m2)', 0)]),
+}
+# kinds of the files of a device
+DEVICE_KINDS = {"TGA": ["TGA"], "STA": ["TGA", "DSC"], "MCC": ["MCC"], "DSC": ["DSC"], "Cone": ["Cone"]}
+
+
+def _grid(kind:str, step:float=None):
+    start, stop, default = KINDS[kind][4]
+    step = step or default
+    return np.arange(start, stop + step / 2, step)
+
+
+def embed(kind:str, path:Path, step:float=None):
+    """
+    Feature vector of a replicate file (quantities of the kind one after another on its
+    grid, or on the same range with spacing `step`)
+    """
+    module_name, _, replicate, key, _, quantities = KINDS[kind]
+    df = getattr(importlib.import_module(module_name), replicate)(Path(path))
+    grid, parts = _grid(kind, step), []
+    for column, outside in quantities:
+        ok = df[column].notna() & df[key].notna()
+        x, y = df[key][ok].to_numpy(dtype=np.float64), df[column][ok].to_numpy(dtype=np.float64)
+        if len(x) == 0:
+            parts.append(np.full(len(grid), np.nan))
+        elif outside == 'edge':
+            parts.append(np.interp(grid, x, y))
+        else:
+            parts.append(np.interp(grid, x, y, left=outside, right=outside))
+    return np.concatenate(parts)
+
+
+def condition(path:Path):
+    """Declared condition of a file: material, atmosphere, heating rate, heat flux and orientation"""
+    meta = parse_name(path)
+    return '_'.join(meta[f] for f in ('material', 'atmosphere', 'heating_rate', 'flux', 'orientation') if meta[f])
+
+
+def _relative(path:Path):
+    path = Path(path).resolve()
+    return path.relative_to(PROJECT_ROOT).as_posix() if path.is_relative_to(PROJECT_ROOT) else str(path)
+
+
+class SimilarityIndex:
+    """
+    Embeddings of the replicate files of every kind with a KD-tree per kind.
+
+    Parameters
+    ----------
+    index_file : Path
+        File of the embeddings (read if it exists)
+    """
+
+    def __init__(self, index_file:Path=INDEX_FILE):
+        self.index_file = Path(index_file)
+        self.entries = {kind: ([], np.empty((0, 2)), np.empty((0, len(_grid(kind)) * len(KINDS[kind][5]))))
+                        for kind in KINDS}   # paths, (size, mtime) and features of each kind
+        self._trees = {}
+        if self.index_file.exists():
+            with np.load(self.index_file, allow_pickle=False) as data:
+                for kind in KINDS:
+                    if f"{kind} paths" in data:
+                        self.entries[kind] = (list(data[f"{kind} paths"]), data[f"{kind} stat"], data[f"{kind} features"])
+
+    def save(self):
+        arrays = {}
+        for kind, (paths, stat, features) in self.entries.items():
+            arrays.update({f"{kind} paths": np.array(paths, dtype=str), f"{kind} stat": stat, f"{kind} features": features})
+        tmp = self.index_file.with_name(f"{self.index_file.stem}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, self.index_file)
+
+    def update(self, kinds=KINDS):
+        """Embed new and changed files of the data lists, drop removed ones; returns (embedded, unchanged)"""
+        embedded = unchanged = 0
+        for kind in kinds:
+            module_name, data, *_ = KINDS[kind]
+            files = sorted(getattr(importlib.import_module(module_name), data))
+            paths, stat, features = self.entries[kind]
+            known = {p: (tuple(s), f) for p, s, f in zip(paths, stat, features)}
+            new_paths, new_stat, new_features = [], [], []
+            for path in files:
+                rel, st = _relative(path), os.stat(path)
+                key = (float(st.st_size), st.st_mtime)
+                if rel in known and known[rel][0] == key:
+                    vector = known[rel][1]
+                    unchanged += 1
+                else:
+                    vector = embed(kind, path)
+                    embedded += 1
+                new_paths.append(rel)
+                new_stat.append(key)
+                new_features.append(vector)
+            self.entries[kind] = (new_paths, np.array(new_stat).reshape(-1, 2),
+                                  np.array(new_features).reshape(len(new_paths), -1))
+            self._trees.pop(kind, None)
+        return embedded, unchanged
+
+    def _scale(self, kind:str):
+        """Standard deviation of each quantity over all vectors, repeated for its grid points"""
+        features = self.entries[kind][2]
+        n = len(_grid(kind))
+        scale = [np.nanstd(features[:, i * n:(i + 1) * n]) for i in range(len(KINDS[kind][5]))]
+        return np.repeat(np.where(np.array(scale) > 0, scale, 1.0), n)
+
+    def _tree(self, kind:str):
+        """KD-tree of the scaled vectors (without incomplete ones), their paths and the scale"""
+        if kind not in self._trees:
+            from scipy.spatial import cKDTree
+            paths, _, features = self.entries[kind]
+            scale = self._scale(kind)
+            ok = ~np.isnan(features).any(axis=1)
+            self._trees[kind] = (cKDTree(features[ok] / scale), [p for p, o in zip(paths, ok) if o], scale)
+        return self._trees[kind]
+
+    def _vector(self, kind:str, path:Path):
+        paths, _, features = self.entries[kind]
+        rel = _relative(path)
+        return features[paths.index(rel)] if rel in paths else embed(kind, path)
+
+    def similar(self, path:Path, k:int=5, kinds=None):
+        """The k most similar experiments of each kind of the file (not the file itself)"""
+        rows = []
+        for kind in kinds or DEVICE_KINDS.get(parse_name(path)['device'], []):
+            tree, paths, scale = self._tree(kind)
+            rel = _relative(path)
+            distance, index = tree.query(self._vector(kind, path) / scale, k=min(k + 1, len(paths)))
+            matches = [(d, paths[i]) for d, i in zip(np.atleast_1d(distance), np.atleast_1d(index)) if paths[i] != rel]
+            rows += [{'kind': kind, 'rank': r, 'experiment': Path(p).stem, 'condition': condition(p), 'distance': d}
+                     for r, (d, p) in enumerate(matches[:k], start=1)]
+        return pd.DataFrame(rows, columns=['kind', 'rank', 'experiment', 'condition', 'distance'])
+
+    def _centroids(self, kind:str, exclude:str=None):
+        """Mean scaled vector and spread (median distance of the members to it) of every condition"""
+        tree, paths, _ = self._tree(kind)
+        vectors = tree.data
+        groups = {}
+        for i, p in enumerate(paths):
+            if p != exclude:
+                groups.setdefault(condition(p), []).append(i)
+        result = {}
+        for name, members in groups.items():
+            centroid = vectors[members].mean(axis=0)
+            spread = np.median(np.linalg.norm(vectors[members] - centroid, axis=1)) if len(members) > 1 else np.nan
+            result[name] = (centroid, spread, len(members))
+        return result
+
+    def check(self, path:Path, kinds=None, nearest:int=3):
+        """
+        Distance of a file to the mean of its declared condition (without the file), relative to
+        the spread of the condition, and the conditions with the nearest means
+        """
+        rows = []
+        for kind in kinds or DEVICE_KINDS.get(parse_name(path)['device'], []):
+            _, _, scale = self._tree(kind)
+            centroids = self._centroids(kind, exclude=_relative(path))
+            vector = self._vector(kind, path) / scale
+            distances = {name: np.linalg.norm(vector - c) for name, (c, _, _) in centroids.items()}
+            declared = condition(path)
+            centroid, spread, members = centroids.get(declared, (None, np.nan, 0))
+            distance = distances.get(declared, np.nan)
+            ranked = sorted(distances, key=distances.get)[:nearest]
+            rows.append({'kind': kind, 'experiment': Path(path).stem, 'condition': declared, 'members': members,
+                         'distance': distance, 'relative': distance / spread if spread > 0 else np.nan,
+                         'nearest conditions': ', '.join(f"{c} ({distances[c]:.1f})" for c in ranked)})
+        return pd.DataFrame(rows, columns=['kind', 'experiment', 'condition', 'members', 'distance', 'relative',
+                                           'nearest conditions'])
+
+    def check_all(self, kind:str):
+        """check() of every file of a kind, most distant first"""
+        paths = self._tree(kind)[1]
+        table = pd.concat([self.check(PROJECT_ROOT / p, [kind]) for p in paths], ignore_index=True)
+        return table.sort_values('relative', ascending=False, na_position='last')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nearest neighbour search over all experiments")
+    parser.add_argument("--index", default=str(INDEX_FILE), help="file of the embeddings")
+    parser.add_argument("--format", default="console", choices=["console", "csv", "latex"])
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("update", help="embed new and changed files")
+    p_similar = sub.add_parser("similar", help="most similar experiments of a file")
+    p_similar.add_argument("path")
+    p_similar.add_argument("-k", type=int, default=5)
+    p_check = sub.add_parser("check", help="distance of a file to its declared condition")
+    p_check.add_argument("path", nargs="?")
+    p_check.add_argument("--all", choices=list(KINDS), help="all files of a kind, most distant first")
+    args = parser.parse_args()
+
+    index = SimilarityIndex(Path(args.index))
+    if args.command == "update":
+        embedded, unchanged = index.update()
+        index.save()
+        print(f"{embedded} files embedded, {unchanged} unchanged")
+    elif args.command == "similar":
+        print(render_table(index.similar(Path(args.path), args.k), args.format))
+    elif args.all:
+        print(render_table(index.check_all(args.all), args.format))
+    elif args.path:
+        print(render_table(index.check(Path(args.path)), args.format))
+    else:
+        parser.error("check needs a path or --all")
@@ -0,0 +1,331 @@
+# embedded SQLite store of all calibration, validation and prediction data files
+#
+#   python Store.py ingest                                   (re-reads only changed files)
+#   python Store.py query device=TGA atmosphere=N2 heating_rate=10K
+#
+# Tables
+#   experiments  one row per file with the metadata parsed from its name
+#   columns      column names and units of every file
+#   samples      values in long format (experiment_id, column, row, value)
+import argparse
+import re
+import sqlite3
+
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from Lazy import lazy_import
+from Naming import TREES
+from Utils import PROJECT_ROOT, SCRIPT_DIR, parse_name
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+DB_FILE = SCRIPT_DIR / "macfp_data.sqlite"
+# stored as user_version of the database, increase when parse_path changes (all files are parsed again)
+NAMING_VERSION = 1
+
+# data collections (relative to the project root) that are ingested
+ROOTS = [
+    "PMMA/Calibration_Data",
+    "PMMA/Validation_Data",
+    "PMMA/Validation_Results",
+    "PMMA/Computational_Results",
+    "Wood/Calibration_Data",
+]
+
+DEVICES = {"TGA", "DSC", "STA", "MCC", "Cone", "Gasification", "FPA", "CAPA"}
+ATMOSPHERES = re.compile(r"^(N2|Ar|Air|O2(-\d+)?)$")
+HEATING_RATE = re.compile(r"^(\d+\.?\d*)K(min)?$")
+FLUX = re.compile(r"^(?:(\d+\.?\d*)kW|q(\d+\.?\d*))$")
+ORIENTATION = {"hor", "vert", "parallel", "perpendicular"}
+REPLICATE = re.compile(r"^[Rr](\d+)$")
+UNIT = re.compile(r"^(.*?)\s*[\(\[]([^\)\]]*)[\)\]]\s*$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    collection TEXT,
+    material TEXT,
+    institute TEXT,
+    device TEXT,
+    atmosphere TEXT,
+    heating_rate TEXT,
+    flux TEXT,
+    orientation TEXT,
+    extra TEXT,
+    series TEXT,
+    replicate INTEGER,
+    n_rows INTEGER,
+    size INTEGER,
+    mtime REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS columns (
+    experiment_id INTEGER NOT NULL REFERENCES experiments(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT,
+    unit TEXT,
+    PRIMARY KEY (experiment_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS samples (
+    experiment_id INTEGER NOT NULL REFERENCES experiments(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    row INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (experiment_id, position, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_experiments_institute ON experiments(institute);
+CREATE INDEX IF NOT EXISTS ix_experiments_material ON experiments(material);
+CREATE INDEX IF NOT EXISTS ix_experiments_condition ON experiments(device, atmosphere, heating_rate);
+CREATE INDEX IF NOT EXISTS ix_experiments_flux ON experiments(device, flux);
+CREATE INDEX IF NOT EXISTS ix_experiments_series ON experiments(series, replicate);
+"""
+
+META_FIELDS = ["collection", "material", "institute", "device", "atmosphere", "heating_rate",
+               "flux", "orientation", "extra", "series", "replicate"]
+
+
+def parse_path(path:Path, root:Path=PROJECT_ROOT):
+    """
+    Metadata of a data file from its location and name, for all naming conventions:
+
+    Wood:        FSRI_Wood_TGA_N2_10K_R1, UMET_Wood_Cone_50kW_hor_R2
+    PMMA:        TIFP_DSC_N2_10K_1, DBI_Lund_Cone_25kW_1, BUW-FZJ_TGA_100Kmin_1
+    validation:  MaCFP-PMMA_Gasification_q50_MLR_R3, UMET_GP_Gasification_25kW_6mm
+
+    Files of the calibration trees are parsed like in the analysis (Utils.parse_name,
+    e.g. institute DBI-Lund and set DBI-Lund_PMMA_TGA_N2_20K), the material and
+    collection are those of the location. Heating rates are normalized to '10K' and
+    heat fluxes to '50kW'.
+    """
+    path = Path(path)
+    rel = path.relative_to(root)
+    material, collection = rel.parts[0], rel.parts[1]
+    if Path(material, collection) in TREES.values():
+        meta = {f: parse_name(path)[f] for f in META_FIELDS if f not in ("collection", "material")}
+        meta.update(collection=collection, material=material)
+        if meta["replicate"] != meta["replicate"]:   # NaN, file without a replicate number
+            meta["replicate"] = None
+        for field, pattern in (("heating_rate", HEATING_RATE), ("flux", FLUX)):
+            m = pattern.match(meta[field])
+            if m:
+                meta[field] = next(g for g in m.groups() if g) + ("K" if field == "heating_rate" else "kW")
+        return meta
+
+    tokens = path.stem.split("_")
+    meta = dict.fromkeys(META_FIELDS, "")
+    meta.update(collection=collection, material=material, replicate=None)
+
+    idx = next((i for i, t in enumerate(tokens) if t in DEVICES), None)
+    if idx is None:
+        meta["institute"] = path.parent.name
+        rest = tokens
+    else:
+        head = tokens[:idx]
+        if head and head[-1] == material:
+            head = head[:-1]
+        meta["institute"] = "_".join(head) or path.parent.name
+        meta["device"] = tokens[idx]
+        rest = tokens[idx + 1:]
+
+    extra = []
+    for i, tok in enumerate(rest):
+        if ATMOSPHERES.match(tok) and not meta["atmosphere"]:
+            meta["atmosphere"] = tok
+        elif HEATING_RATE.match(tok) and not meta["heating_rate"]:
+            meta["heating_rate"] = HEATING_RATE.match(tok).group(1) + "K"
+        elif FLUX.match(tok) and not meta["flux"]:
+            m = FLUX.match(tok)
+            meta["flux"] = (m.group(1) or m.group(2)) + "kW"
+        elif tok in ORIENTATION and not meta["orientation"]:
+            meta["orientation"] = tok
+        elif REPLICATE.match(tok):
+            meta["replicate"] = int(REPLICATE.match(tok).group(1))
+        elif tok.isdigit() and i == len(rest) - 1:
+            meta["replicate"] = int(tok)
+        else:
+            extra.append(tok)
+    meta["extra"] = "_".join(extra)
+
+    stem = path.stem
+    match = re.match(r"^(.*?)_[Rr]?\d+$", stem) if meta["replicate"] is not None else None
+    meta["series"] = match.group(1) if match else stem
+    return meta
+
+
+def read_file(path:Path):
+    """
+    Column names, units and values of a CSV file in any of the header styles:
+    'Time (s)' (unit in the name) or 'Time' followed by a units row '[s]'.
+    """
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as fh:
+        fh.readline()
+        second = fh.readline().rstrip("\r\n").split(",")
+
+    def numeric(s):
+        try:
+            float(s)
+            return True
+        except ValueError:
+            return s.strip() == ""
+    units_row = any(not numeric(s) for s in second)
+
+    df = pd.read_csv(path, encoding="utf-8-sig", skiprows=[1] if units_row else None, encoding_errors="replace")
+    # trailing separators give empty 'Unnamed' columns
+    empty = [c for c in df.columns if str(c).startswith("Unnamed") and df[c].isna().all()]
+    keep = [i for i, c in enumerate(df.columns) if c not in empty]
+    df = df.drop(columns=empty).apply(pd.to_numeric, errors="coerce")
+
+    names, units = [], []
+    for i, name in zip(keep, df.columns):
+        name = str(name).strip()
+        unit = second[i].strip().strip("[]") if units_row and i < len(second) else ""
+        match = UNIT.match(name)
+        if match and not unit:
+            unit = match.group(2)
+        names.append(name)
+        units.append(unit)
+    return names, units, df.to_numpy(dtype=np.float64)
+
+
+def _load(path:Path):
+    try:
+        return read_file(path), None
+    except Exception as err:  # malformed files are recorded with the error, not skipped silently
+        return None, f"{type(err).__name__}: {err}"
+
+
+def connect(db_file:Path=DB_FILE):
+    con = sqlite3.connect(db_file)
+    con.execute("PRAGMA foreign_keys = ON")
+    con.executescript(SCHEMA)
+    return con
+
+
+def data_files(roots=ROOTS, root:Path=PROJECT_ROOT):
+    # the suffix in any case (e.g. .CSV files of the HKPoly cone data)
+    return sorted(
+        p for r in roots for p in (root / r).rglob("*")
+        if p.suffix.lower() == ".csv" and p.is_file()
+        if not any(part.startswith("TEMPLATE") for part in p.parts)
+    )
+
+
+def ingest(db_file:Path=DB_FILE, roots=ROOTS, force:bool=False, workers:int=8):
+    """
+    Load all data files into the store. Files that did not change since the last
+    ingest (same size and modification time) are skipped unless `force`.
+
+    Returns the number of ingested and skipped files.
+    """
+    con = connect(db_file)
+    # metadata of another version of parse_path: all files again
+    force = force or con.execute("PRAGMA user_version").fetchone()[0] != NAMING_VERSION
+    known = {p: (s, m) for p, s, m in con.execute("SELECT path, size, mtime FROM experiments")}
+    files = data_files(roots)
+    todo = []
+    for p in files:
+        rel = p.relative_to(PROJECT_ROOT).as_posix()
+        stat = p.stat()
+        if force or known.get(rel) != (stat.st_size, stat.st_mtime):
+            todo.append((p, rel, stat))
+
+    # files that were removed from the tree
+    removed = set(known) - {p.relative_to(PROJECT_ROOT).as_posix() for p in files}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        loaded = pool.map(_load, [p for p, _, _ in todo])
+        with con:
+            con.executemany("DELETE FROM experiments WHERE path = ?", [(r,) for r in removed])
+            for (p, rel, stat), (data, error) in zip(todo, loaded):
+                con.execute("DELETE FROM experiments WHERE path = ?", (rel,))
+                meta = parse_path(p)
+                n_rows = None if data is None else data[2].shape[0]
+                cur = con.execute(
+                    f"INSERT INTO experiments (path, {', '.join(META_FIELDS)}, n_rows, size, mtime, error) "
+                    f"VALUES ({', '.join('?' * (len(META_FIELDS) + 5))})",
+                    [rel] + [meta[f] for f in META_FIELDS] + [n_rows, stat.st_size, stat.st_mtime, error],
+                )
+                if data is None:
+                    continue
+                exp_id = cur.lastrowid
+                names, units, values = data
+                con.executemany("INSERT INTO columns VALUES (?, ?, ?, ?)",
+                                [(exp_id, j, n, u) for j, (n, u) in enumerate(zip(names, units))])
+                rows, cols = np.indices(values.shape)
+                finite = np.isfinite(values)
+                con.executemany(
+                    "INSERT INTO samples VALUES (?, ?, ?, ?)",
+                    zip([exp_id] * int(finite.sum()), cols[finite].tolist(),
+                        rows[finite].tolist(), values[finite].tolist()),
+                )
+    con.execute(f"PRAGMA user_version = {NAMING_VERSION}")
+    con.execute("ANALYZE")
+    con.close()
+    return len(todo), len(files) - len(todo)
+
+
+def _select(**conditions):
+    where, params = [], []
+    for field, value in conditions.items():
+        if field not in META_FIELDS:
+            raise ValueError(f"Unknown field {field}, use one of {META_FIELDS}")
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        where.append(f"{field} IN ({', '.join('?' * len(values))})")
+        params.extend(values)
+    sql = "SELECT * FROM experiments" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY path"
+    return sql, params
+
+
+def find(con:sqlite3.Connection, **conditions):
+    """
+    Experiments matching all conditions, e.g. find(con, device='TGA', atmosphere='N2', heating_rate='10K').
+    A list as value matches any of its elements.
+    """
+    sql, params = _select(**conditions)
+    df = pd.read_sql_query(sql, con, params=params, index_col="id")
+    return df.astype({"replicate": "Int64", "n_rows": "Int64"})
+
+
+def samples(con:sqlite3.Connection, experiment_id:int):
+    """Values of one experiment as a DataFrame with the original column names"""
+    experiment_id = int(experiment_id)
+    names = [n for n, in con.execute(
+        "SELECT name FROM columns WHERE experiment_id = ? ORDER BY position", (experiment_id,))]
+    data = np.array(con.execute(
+        "SELECT position, row, value FROM samples WHERE experiment_id = ?", (experiment_id,)).fetchall())
+    if len(data) == 0:
+        return pd.DataFrame(columns=names, dtype=np.float64)
+    values = np.full((int(data[:, 1].max()) + 1, len(names)), np.nan)
+    values[data[:, 1].astype(int), data[:, 0].astype(int)] = data[:, 2]
+    return pd.DataFrame(values, columns=names)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embedded store of all data files")
+    parser.add_argument("--db", default=str(DB_FILE), help="database file")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_ingest = sub.add_parser("ingest", help="load new and changed files")
+    p_ingest.add_argument("--force", action="store_true", help="re-read all files")
+    p_query = sub.add_parser("query", help="list experiments, e.g. device=TGA heating_rate=10K")
+    p_query.add_argument("conditions", nargs="*", help="field=value (value1,value2 for any of)")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        n_new, n_skipped = ingest(Path(args.db), force=args.force)
+        print(f"{n_new} files ingested, {n_skipped} unchanged")
+    else:
+        conditions = {k: v.split(",") for k, v in (c.split("=", 1) for c in args.conditions)}
+        # plain sqlite here, a catalog query does not load pandas
+        fields = ["material", "institute", "device", "atmosphere", "heating_rate", "flux", "replicate", "n_rows"]
+        sql, params = _select(**conditions)
+        with connect(Path(args.db)) as con:
+            rows = con.execute(sql.replace("SELECT *", f"SELECT {', '.join(fields)}"), params).fetchall()
+        rows = [fields] + [["" if v is None else str(v) for v in row] for row in rows]
+        widths = [max(len(r[i]) for r in rows) for i in range(len(fields))]
+        for row in rows:
+            print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+        print(f"{len(rows) - 1} experiments")
@@ -0,0 +1,283 @@
+# running ensemble statistics on a regular grid (replicates are added one at a time)
+#
+#   stats = GridStatistics('Temperature (K)', step=0.5)
+#   for path in paths:
+#       df = tga_replicate(path)
+#       stats.add(df['Temperature (K)'], {'mass': df['Normalized mass']})
+#   mean, unc = stats.smoothed('mass', n=2)
+#
+# Per grid point only the count, mean and M2 (sum of squared deviations, Welford)
+# of every quantity are kept, so memory depends on the grid and not on the number
+# of replicates. Statistics of disjoint sets of replicates (e.g. built in worker
+# processes) are combined with merge() / combine().
+#
+# With `capacity`, a quantile sketch per grid point is kept as well (weighted
+# centroids, exact up to `capacity` samples, then compacted like a t-digest):
+#
+#   stats = GridStatistics('Temperature (K)', step=0.5, capacity=100)
+#   ...
+#   bands = stats.bands('mass')      # median, q25/q75, q05/q95 per grid point
+from __future__ import annotations
+
+from functools import reduce
+
+from Lazy import lazy_import
+
+np = lazy_import("numpy")
+
+
+# quantiles of bands(), by column suffix, and the default size of the sketch
+BANDS = {'median': 0.5, 'q25': 0.25, 'q75': 0.75, 'q05': 0.05, 'q95': 0.95}
+CAPACITY = 100
+
+
+class GridStatistics:
+    """
+    Count, mean and M2 per grid point of one or more quantities.
+
+    The rows of the result are the grid points that occur in any replicate (in
+    ascending order), like an outer merge of the replicates on the grid column.
+    Missing values (NaN) are not counted.
+
+    Parameters
+    ----------
+    key : str
+        Name of the grid column, e.g. 'Temperature (K)' or 'Time (s)'
+    step : float
+        Grid spacing, the grid values must be multiples of it
+    capacity : int, optional
+        Centroids per grid point of the quantile sketch (none without)
+    """
+
+    def __init__(self, key:str, step:float, capacity:int=None):
+        self.key = key
+        self.step = step
+        self.capacity = capacity
+        self.start = None      # grid index of the first array element
+        self.present = None    # grid point occurs in a replicate
+        self.count = {}
+        self.mean = {}
+        self.m2 = {}
+        self.sketch = {}       # centroid values and weights (grid point x centroid)
+
+    def _index(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        index = np.rint(x / self.step).astype(np.int64)
+        if not np.array_equal(index * self.step, x):
+            raise ValueError(f"{self.key} values are not on the grid of step {self.step}")
+        return index
+
+    def _extend(self, lo:int, hi:int):
+        """Grow the arrays to cover the grid indices lo..hi"""
+        if self.start is None:
+            self.start, self.present = lo, np.zeros(hi - lo + 1, dtype=bool)
+            return
+        end = self.start + len(self.present) - 1
+        if lo >= self.start and hi <= end:
+            return
+        new_start, new_end = min(lo, self.start), max(hi, end)
+        offset = self.start - new_start
+
+        def grown(a, fill=0):
+            b = np.full((new_end - new_start + 1,) + a.shape[1:], fill, dtype=a.dtype)
+            b[offset:offset + len(a)] = a
+            return b
+
+        self.present = grown(self.present, False)
+        for stats in (self.count, self.mean, self.m2):
+            for name in stats:
+                stats[name] = grown(stats[name])
+        for name, (values, weights) in self.sketch.items():
+            self.sketch[name] = (grown(values, np.nan), grown(weights))
+        self.start = new_start
+
+    def _quantity(self, name:str):
+        if name not in self.count:
+            size = len(self.present)
+            self.count[name] = np.zeros(size, dtype=np.int64)
+            self.mean[name] = np.zeros(size)
+            self.m2[name] = np.zeros(size)
+            if self.capacity:
+                self.sketch[name] = (np.empty((size, 0)), np.empty((size, 0)))
+
+    def _sketch_add(self, name:str, rows, values, weights):
+        """Append centroids (one column per sample of a replicate), compact at twice the capacity"""
+        old_values, old_weights = self.sketch[name]
+        new_values = np.full((len(old_values), values.shape[1]), np.nan)
+        new_weights = np.zeros(new_values.shape)
+        new_values[rows], new_weights[rows] = values, weights
+        values, weights = np.hstack([old_values, new_values]), np.hstack([old_weights, new_weights])
+        if values.shape[1] >= 2 * self.capacity:
+            values, weights = _compact(values, weights, self.capacity)
+        self.sketch[name] = (values, weights)
+
+    def add(self, x, values:dict):
+        """
+        Add one replicate.
+
+        Parameters
+        ----------
+        x : array_like
+            Grid values of the replicate (unique)
+        values : dict
+            Quantity name -> values at `x`; 2-D values (e.g. a DataFrame of
+            several columns) add one sample per column
+        """
+        index = self._index(x)
+        if len(index) == 0:
+            return self
+        self._extend(index.min(), index.max())
+        rows = index - self.start
+        self.present[rows] = True
+        for name, v in values.items():
+            self._quantity(name)
+            v = np.asarray(v, dtype=np.float64)
+            for column in (v.reshape(len(rows), -1).T):
+                ok = ~np.isnan(column)
+                r, c = rows[ok], column[ok]
+                n = self.count[name][r] + 1
+                delta = c - self.mean[name][r]
+                self.mean[name][r] += delta / n
+                self.m2[name][r] += delta * (c - self.mean[name][r])
+                self.count[name][r] = n
+            if self.capacity:
+                columns = v.reshape(len(rows), -1)
+                self._sketch_add(name, rows, columns, (~np.isnan(columns)).astype(np.float64))
+        return self
+
+    def merge(self, other:GridStatistics):
+        """Add the replicates of `other` (same key and step), pairwise update of Chan et al."""
+        if other.start is None:
+            return self
+        if (other.key, other.step) != (self.key, self.step):
+            raise ValueError("statistics of different grids")
+        self._extend(other.start, other.start + len(other.present) - 1)
+        rows = np.arange(len(other.present)) + other.start - self.start
+        self.present[rows] |= other.present
+        for name in other.count:
+            self._quantity(name)
+            n_a, n_b = self.count[name][rows], other.count[name]
+            n = n_a + n_b
+            with np.errstate(invalid='ignore', divide='ignore'):
+                delta = other.mean[name] - self.mean[name][rows]
+                w = np.where(n > 0, n_b / np.maximum(n, 1), 0.0)
+                self.mean[name][rows] += delta * w
+                self.m2[name][rows] += other.m2[name] + delta**2 * n_a * w
+            self.count[name][rows] = n
+            if self.capacity and name in other.sketch:
+                self._sketch_add(name, rows, *other.sketch[name])
+        return self
+
+    def grid(self):
+        """Grid values of the rows"""
+        if self.start is None:
+            return np.empty(0)
+        return (np.flatnonzero(self.present) + self.start) * self.step
+
+    def _rows(self, name:str):
+        if self.start is None:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+        if name not in self.count:
+            size = int(self.present.sum())
+            return np.zeros(size, dtype=np.int64), np.full(size, np.nan), np.zeros(size)
+        p = self.present
+        return self.count[name][p], self.mean[name][p], self.m2[name][p]
+
+    def pointwise(self, name:str):
+        """Mean and standard deviation (ddof=0) of each row, NaN without samples"""
+        n, mean, m2 = self._rows(name)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n > 0, mean, np.nan), np.sqrt(m2 / n)
+
+    def smoothed(self, name:str, n:int=2):
+        """
+        Mean of all samples in the rows i-n..i+n and its uncertainty
+        sqrt(sum((x - mean_j)^2) / (cnt (cnt - 1))) over the same rows, as the
+        rolling window (2n+1, centered) over the merged replicates.
+        """
+        count, mean, m2 = self._rows(name)
+        kernel = np.ones(2 * n + 1)
+        cnt = np.convolve(count, kernel, 'same')
+        with np.errstate(invalid='ignore', divide='ignore'):
+            avg = np.convolve(count * mean, kernel, 'same') / cnt
+            # squared deviations of the samples of row j from the windowed mean of row j
+            dev = np.where(count > 0, m2 + count * (mean - avg)**2, 0.0)
+            unc = np.sqrt(np.convolve(dev, kernel, 'same') / (cnt * (cnt - 1)))
+        return avg, unc
+
+
+    def quantiles(self, name:str, q):
+        """
+        Quantiles `q` (sequence) of each row from the sketch, NaN without samples;
+        up to `capacity` samples they are exact (np.quantile, method='hazen').
+        """
+        if not self.capacity:
+            raise ValueError("quantiles need a sketch (GridStatistics(..., capacity=n))")
+        q = np.asarray(q, dtype=np.float64)
+        if self.start is None:
+            return np.empty((0, len(q)))
+        if name not in self.sketch:
+            return np.full((int(self.present.sum()), len(q)), np.nan)
+        values, weights = _sorted(*(a[self.present] for a in self.sketch[name]))
+        n = (weights > 0).sum(axis=1)
+        last = np.maximum(n - 1, 0)
+        # centroid i stands for the weight around its middle position
+        position = np.where(weights > 0, np.cumsum(weights, axis=1) - weights / 2, np.inf)
+        rows = np.arange(len(values))
+        result = np.full((len(values), len(q)), np.nan)
+        for j, target in enumerate((weights.sum(axis=1)[:, None] * q).T):
+            above = (position < target[:, None]).sum(axis=1)
+            lo, hi = np.clip(above - 1, 0, last), np.clip(above, 0, last)
+            p_lo, p_hi = position[rows, lo], position[rows, hi]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                f = np.where(hi > lo, (target - p_lo) / (p_hi - p_lo), 0.0)
+            v_lo, v_hi = values[rows, lo], values[rows, hi]
+            result[:, j] = np.where(n > 0, v_lo + f * (v_hi - v_lo), np.nan)
+        return result
+
+    def bands(self, name:str):
+        """Median, interquartile and 5-95 % range of each row, by the suffixes of BANDS"""
+        return dict(zip(BANDS, self.quantiles(name, list(BANDS.values())).T))
+
+    def band_columns(self, name:str, column:str):
+        """bands() as columns '<column> median', '<column> q25', ..."""
+        return {f'{column} {suffix}': values for suffix, values in self.bands(name).items()}
+
+
+def _sorted(values, weights):
+    """Centroids of each row in ascending order, empty ones (NaN) last"""
+    order = np.argsort(np.where(weights > 0, values, np.inf), axis=1, kind='stable')
+    return np.take_along_axis(values, order, axis=1), np.take_along_axis(weights, order, axis=1)
+
+
+def _compact(values, weights, capacity:int):
+    """
+    At most `capacity` centroids per row: neighbouring centroids are merged into
+    clusters of equal width in asin(2q - 1), which are small in the tails (scale
+    function k1 of the t-digest). Rows with up to `capacity` samples are kept.
+    """
+    values, weights = _sorted(values, weights)
+    n = (weights > 0).sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        q = (np.cumsum(weights, axis=1) - weights / 2) / weights.sum(axis=1, keepdims=True)
+        k = np.floor(capacity * (np.arcsin(np.clip(2 * q - 1, -1, 1)) / np.pi + 0.5))
+    rank = np.broadcast_to(np.arange(values.shape[1]), values.shape)
+    cluster = np.where(n <= capacity, rank, np.nan_to_num(k))
+    cluster = np.clip(cluster, 0, capacity - 1).astype(np.int64)
+
+    # weighted mean of the centroids of each cluster
+    index = (np.arange(len(values))[:, None] * capacity + cluster).ravel()
+    w = weights.ravel()
+    size = len(values) * capacity
+    new_weights = np.bincount(index, weights=w, minlength=size)
+    weighted = np.bincount(index, weights=np.where(w > 0, w * values.ravel(), 0.0), minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        new_values = np.where(new_weights > 0, weighted / new_weights, np.nan)
+    return new_values.reshape(-1, capacity), new_weights.reshape(-1, capacity)
+
+
+def combine(parts):
+    """One new GridStatistics of all parts (e.g. returned by worker processes), the parts are not changed"""
+    parts = list(parts)
+    first = parts[0]
+    return reduce(GridStatistics.merge, parts, GridStatistics(first.key, first.step, first.capacity))
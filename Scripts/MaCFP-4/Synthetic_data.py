@@ -0,0 +1,114 @@
+# synthetic calibration data in the naming and column conventions of Wood/Calibration_Data
+import argparse
+
+from pathlib import Path
+
+from Lazy import lazy_import
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+
+# heating rates (K/min) and heat fluxes (kW/m2) used for the conditions, in this order
+HEATING_RATES = [10, 5, 20, 2, 30, 3, 40, 50, 60, 45, 15, 25, 35, 55, 65, 70, 75, 80, 90, 100]
+FLUXES = [50, 25, 30, 60, 75, 35, 40, 45, 55, 65, 70, 80, 85, 90, 95, 100, 20, 15, 10, 105]
+
+# wood pseudo-components: (mass fraction, peak temperature at 10 K/min (K), width (K))
+COMPONENTS = [(0.25, 570, 25), (0.45, 630, 18), (0.2, 650, 90)]
+
+
+def tga_curve(beta, rng, T0=300.0, T1=1100.0, dt=3.0):
+    """Time, temperature and mass (mg) of a TGA test at heating rate beta (K/min)"""
+    t = np.arange(0, (T1 - T0) / beta * 60 + dt, dt)
+    T = T0 + beta / 60 * t + rng.normal(0, 0.05, len(t))
+    shift = 25 * np.log(beta / 10) if beta > 0 else 0
+    alpha = np.zeros_like(T)
+    for frac, Tp, width in COMPONENTS:
+        alpha += frac / (1 + np.exp(-(T - Tp - shift) / (width / 4)))
+    alpha += 0.05 / (1 + np.exp(-(T - 370) / 8))   # moisture
+    m0 = rng.uniform(4, 8)
+    mass = m0 * (1 - alpha) + rng.normal(0, 0.002, len(t))
+    return pd.DataFrame({'Time (s)': t, 'Temperature (K)': T, 'Mass (mg)': mass})
+
+
+def mcc_curve(beta, rng, T0=350.0, T1=1000.0, dt=0.5):
+    """Time, temperature and HRR (W/g) of an MCC test at heating rate beta (K/min)"""
+    t = np.arange(0, (T1 - T0) / beta * 60 + dt, dt)
+    T = T0 + beta / 60 * t
+    shift = 25 * np.log(beta / 60)
+    hrr = 160 * np.exp(-0.5 * ((T - 640 - shift) / 22) ** 2) + 40 * np.exp(-0.5 * ((T - 600 - shift) / 20) ** 2)
+    hrr = hrr * beta / 60 + rng.normal(0, 0.5, len(t))
+    return pd.DataFrame({'Time (s)': t, 'Temperature (K)': T, 'HRR (W/g)': hrr})
+
+
+def dsc_curve(beta, rng, T0=300.0, T1=900.0, dt=3.0):
+    """Time, temperature and heat flow rate (W/g) of a DSC test at heating rate beta (K/min)"""
+    t = np.arange(0, (T1 - T0) / beta * 60 + dt, dt)
+    T = T0 + beta / 60 * t
+    hf = 0.002 * (T - T0) * beta / 10 + 0.8 * beta / 10 * np.exp(-0.5 * ((T - 630) / 30) ** 2)
+    hf = hf + rng.normal(0, 0.01, len(t))
+    return pd.DataFrame({'Time (s)': t, 'Temperature (K)': T, 'Heat Flow Rate (W/g)': hf})
+
+
+def cone_curve(flux, rng, duration=2500.0, frequency=1.0):
+    """Time, mass (g), HRR (kW/m2) and back side temperature of a cone test at heat flux (kW/m2)"""
+    t = np.arange(0, duration, 1 / frequency)
+    t_ig = 2000 / flux * rng.uniform(0.8, 1.2)
+    tau = np.clip(t - t_ig, 0, None)
+    hrr = (200 + 2 * flux) * (np.exp(-tau / 60) - np.exp(-tau / 10)) + 120 * np.exp(-0.5 * ((tau - 900 * 50 / (flux + 25)) / 150) ** 2)
+    hrr = np.where(t > t_ig, hrr, 0) + rng.normal(0, 2, len(t))
+    m0 = rng.uniform(90, 110)
+    mass = m0 - np.cumsum(np.clip(hrr, 0, None)) / frequency * 0.00884 / 13.0
+    T_back = 295 + 500 / (1 + np.exp(-(t - t_ig - 600) / 200))
+    return pd.DataFrame({'Time (s)': t, 'Mass (g)': mass, 'HRR (kW/m2)': hrr, 'TC back 1 (K)': T_back})
+
+
+def write_dataset(root:Path, institutes:int=10, conditions:int=4, replicates:int=3,
+                  devices=('TGA', 'MCC', 'DSC', 'Cone'), cone_frequency:float=1.0, seed:int=0):
+    """
+    Write a synthetic data tree {root}/{institute}/{institute}_Wood_{device}_{conditions}_R{n}.csv.
+
+    Returns the list of written files.
+    """
+    root = Path(root)
+    rng = np.random.default_rng(seed)
+    written = []
+    for i in range(institutes):
+        inst = f"INST{i:03d}"
+        inst_dir = root / inst
+        inst_dir.mkdir(parents=True, exist_ok=True)
+        for c in range(conditions):
+            atm = 'N2' if c % 4 != 3 else 'O2-21'
+            beta = HEATING_RATES[c % len(HEATING_RATES)]
+            flux = FLUXES[c % len(FLUXES)]
+            for r in range(1, replicates + 1):
+                files = {}
+                if 'TGA' in devices:
+                    files[f"{inst}_Wood_TGA_{atm}_{beta}K_R{r}"] = tga_curve(beta, rng)
+                if 'MCC' in devices:
+                    files[f"{inst}_Wood_MCC_{atm}_{beta}K_R{r}"] = mcc_curve(beta, rng)
+                if 'DSC' in devices:
+                    files[f"{inst}_Wood_DSC_{atm}_{beta}K_R{r}"] = dsc_curve(beta, rng)
+                if 'Cone' in devices:
+                    files[f"{inst}_Wood_Cone_{flux}kW_hor_R{r}"] = cone_curve(flux, rng, frequency=cone_frequency)
+                for name, df in files.items():
+                    path = inst_dir / f"{name}.csv"
+                    df.to_csv(path, index=False, float_format='%.6g')
+                    written.append(path)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic MaCFP-4 data tree")
+    parser.add_argument('root', help="output directory (use as MACFP_DATA_DIR)")
+    parser.add_argument('--institutes', '-i', type=int, default=10)
+    parser.add_argument('--conditions', '-c', type=int, default=4)
+    parser.add_argument('--replicates', '-r', type=int, default=3)
+    parser.add_argument('--devices', '-d', default='TGA,MCC,DSC,Cone')
+    parser.add_argument('--cone-frequency', type=float, default=1.0, help="cone sample rate (Hz)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    files = write_dataset(args.root, args.institutes, args.conditions, args.replicates,
+                          args.devices.split(','), args.cone_frequency, args.seed)
+    print(f"{len(files)} files written to {args.root}")
@@ -1,19 +1,27 @@
+#define whether to save files in pdf or png (--format png,pdf writes both)
+# the options are parsed before the imports below, --help does not wait for them
+from Figures import script_options
+args = script_options('TGA analysis')
+ex = args.formats[0]
+
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import re
 from collections import defaultdict
 from pathlib import Path
-from scipy.signal import savgol_filter
 from fnmatch import fnmatch
 
 
-from Utils import device_data, get_series_names, make_institution_table, device_subset, label_def, interpolation
-from Utils import SCRIPT_DIR, PROJECT_ROOT, DATA_DIR, FIGURES_DIR
-
+from Utils import get_series_names, make_institution_table, device_subset, label_def, replicate_statistics
+from Utils import SCRIPT_DIR, PROJECT_ROOT, FIGURES_DIR, parse_name, series_paths
+from Screening import quality_report, cut_temperature
+from TGA_functions import TGA_Data, tga_replicate, average_HR_tga_series, average_tga_series, tga_metrics, AVERAGE_COLUMNS
+from Instrument import loop, instrument_figures
+from Figures import FigureWriter
+from Downsample import Overlay
+from Plotting import Ensemble, zoom_limits, quantile_bands
 
-#define whether to save files in pdf or png
-ex = 'png' #options 'pdf' or 'png
 
 #when pushed to main repo replace
 '../../../matl-db-organizing-committee/' #with
@@ -21,6 +29,8 @@ ex = 'png' #options 'pdf' or 'png
 
 # check all subdirectories to save plots exist. 
 base_dir = Path('../../../matl-db-organizing-committee/SCRIPT_FIGURES')
+writer = FigureWriter(args.formats, args.writers, args.max_pending,
+                      manifest=base_dir / 'TGA' / 'figure_manifest.json', force=args.force)
 Individual_dir = base_dir / 'TGA' / 'Individual'
 Average_dir = base_dir / 'TGA' / 'Average'
 Individual_dir.mkdir(parents=True, exist_ok=True)
@@ -32,8 +42,8 @@ Average_dir.mkdir(parents=True, exist_ok=True)
 # ------------------------------------
 #This section is used to determine what TGA data is available. 
 
-# All TGA data (including STA)
-TGA_Data = device_data(DATA_DIR, 'TGA') + device_data(DATA_DIR, 'STA')
+# Data quality report (exclusions and temperature cuts for the pooled averages)
+Quality = quality_report(TGA_Data)
 # All unique sets (name without repetition number, e.g.TUT_TGA_N2_10K_40Pa )
 TGA_sets = get_series_names(TGA_Data)
 
@@ -69,155 +79,7 @@ def set_plot_style():
     })
 
 set_plot_style()
-
-
-# ------------------------------------
-#region functions
-# ------------------------------------
-
-def Calculate_dm_dt(df:pd.DataFrame):
-    df = interpolation(df)
-
-    # Normalize mass
-    df['Normalized mass'] = df['Mass (mg)'] / np.mean(df['Mass (mg)'].iloc[0:5])
-
-    # Smooth normalized mass
-    df['filtered'] = savgol_filter(df['Normalized mass'], 41, 3)
-
-    # Central difference derivative w.r.t. time (NaN at first/last points)
-    dt = df['Time (s)'].shift(-1) - df['Time (s)'].shift(1)
-    
-    df['dm/dt unfiltered'] = (df['Normalized mass'].shift(1) - df['Normalized mass'].shift(-1)) / dt
-    
-    df['dm/dt'] = savgol_filter(df['dm/dt unfiltered'],41,3)#(df['filtered'].shift(1) - df['filtered'].shift(-1)) / dt
-    
-    return df
-
-
-
-def average_HR_tga_series(series_name: str):
-    
-    paths = list(DATA_DIR.glob(f"*/{series_name}_[rR]*.csv"))
-    paths = [p for p in paths if "TEMPLATE" not in str(p)]
-    paths = [p for p in paths if p in TGA_Data]
-    Dataframes_HR = []
-
-    if len(paths) == 0:
-        raise Exception((f"No files found for series {series_name}", "red"))
-
-    # Read data
-    for i, path in enumerate(paths):
-        df = pd.read_csv(path)
-        df = df.drop(columns=["Mass (mg)"])
-       
-        #interpolation
-        df_interp = interpolation(df)
-
-        #df_interp["dTdt"] = 60 * np.gradient(df_interp["Temperature (K)"], df_interp["Time (s)"])
-        window = 5
-        dt = df_interp['Time (s)'].shift(-5) - df_interp['Time (s)'].shift(5)
-        df_interp['dTdt'] = -60*(df_interp['Temperature (K)'].shift(5) - df_interp['Temperature (K)'].shift(-5)) / dt
-        Dataframes_HR.append(df_interp)
-
-    merged_df = Dataframes_HR[0]
-    for df in Dataframes_HR[1:]:
-        merged_df = pd.merge(
-            merged_df,
-            df,
-            on="Temperature (K)",
-            how="outer",
-            suffixes=("", f" {int(len(merged_df.columns)/2+0.5)}"),
-        )
-    merged_df.rename(columns={"Time (s)": "Time (s) 1"}, inplace=True)
-
-    #average
-    time_cols = merged_df.filter(regex=r'^Time \(s\)').columns
-    dTdt_cols = merged_df.filter(regex=r'^dTdt').columns
-
-    df_average = pd.DataFrame({
-        'Temperature (K)': merged_df['Temperature (K)'],
-        'dTdt (K/min)': merged_df[dTdt_cols].mean(axis=1),
-        'dTdt_std': merged_df[dTdt_cols].std(axis=1, skipna=True, ddof=0),
-    })
-
-    return df_average
-
-
-def average_tga_series(series_name: str, exclude=None, temp_filter=None):
-    
-    paths = list(DATA_DIR.glob(f"*/*{series_name}_[rR]*.csv"))
-    paths = [p for p in paths if "TEMPLATE" not in str(p)]
-    paths = [p for p in paths if p in TGA_Data]
-
-    # Apply exclusions
-    if exclude is not None:
-        if not isinstance(exclude, list):
-            exclude = [exclude]  # Convert single string to list
-        
-        for excl in exclude:
-            paths = [p for p in paths if excl not in str(p)]
-
-    Dataframes = []
-    if len(paths) == 0:
-        raise Exception((f"No files found for series {series_name}", "red"))
-
-    # Read data
-
-    for i, path in enumerate(paths):
-        df_raw = pd.read_csv(path)
-
-        # Apply temperature filter for specific institutes
-        if temp_filter is not None:
-            for institute, min_temp in temp_filter.items():
-                if institute in str(path):
-                    df_raw = df_raw[df_raw['Temperature (K)'] > min_temp].reset_index(drop=True)
-
-        # calculate derivatives
-        df=Calculate_dm_dt(df_raw)
-        df = df.drop(columns=['filtered'])
-        df = df.drop(columns=['Mass (mg)'])
-        Dataframes.append(df)
-
-    merged_df = Dataframes[0]
-    for df in Dataframes[1:]:
-        merged_df = pd.merge(
-            merged_df,
-            df,
-            on="Temperature (K)",
-            how="outer",
-            suffixes=("", f" {int(len(merged_df.columns)/2+0.5)}"),
-        )
-  
-    merged_df.rename(columns={"Time (s)": "Time (s) 1"}, inplace=True)
-    merged_df.rename(columns={'Normalized mass': "Normalized mass 1"}, inplace=True)
-    merged_df.rename(columns={'dm/dt': "dm/dt 1"}, inplace=True)
-
-    #average
-    time_cols = merged_df.filter(regex=r'^Time \(s\)').columns
-    mass_cols = merged_df.filter(regex=r'^Normalized mass').columns
-    dmdt_cols = merged_df.filter(regex=r'^dm/dt').columns
-
-    df_average = pd.DataFrame({'Temperature (K)': merged_df['Temperature (K)']})
-    n=2
-    sum = merged_df[mass_cols].rolling(2*n+1, min_periods=1,center=True).sum().sum(axis=1)
-    cnt = merged_df[mass_cols].rolling(2*n+1, min_periods=1,center=True).count().sum(axis=1)
-    df_average['Normalized Mass'] = sum / cnt  # Series: mean of all non-NaN values in rows i-2..i+2 across all columns
-
-    diff = merged_df[mass_cols].sub(df_average['Normalized Mass'], axis=0)**2
-    sum_diff = diff.rolling(2*n+1, min_periods=1,center=True).sum().sum(axis=1)
-    df_average['unc Normalized Mass'] = np.sqrt(sum_diff/(cnt*(cnt-1)))
-
-    sum = merged_df[dmdt_cols].rolling(2*n+1, min_periods=1,center=True).sum().sum(axis=1)
-    cnt = merged_df[dmdt_cols].rolling(2*n+1, min_periods=1,center=True).count().sum(axis=1)
-    df_average['MLR (1/s)'] = sum / cnt  # Series: mean of all non-NaN values in rows i-2..i+2 across all columns
-
-    diff = merged_df[dmdt_cols].sub(df_average['MLR (1/s)'], axis=0)**2
-    sum_diff = diff.rolling(2*n+1, min_periods=1,center=True).sum().sum(axis=1)
-    df_average['unc MLR (1/s)'] = np.sqrt(sum_diff/(cnt*(cnt-1)))
-    return df_average
-
-
-
+instrument_figures()
 
 
 #--------------------------------------------------------
@@ -241,7 +103,7 @@ for HR in unique_HR:
             fig.tight_layout()
             ax.legend()
             ax.set_xlim(right=1100)
-        plt.savefig(str(base_dir) +'/TGA/dTdt_TGA_{}Kmin.{}'.format(HR[:-1], ex))
+        writer.save(plt.gcf(), str(base_dir) +'/TGA/dTdt_TGA_{}Kmin.{}'.format(HR[:-1], ex))
         plt.close(fig)
 
 
@@ -260,44 +122,36 @@ for series in unique_conditions_material:
     if atm == 'O2-21':
         TGA_subset_paths += [p for p in TGA_Data if f"{material}_" in p.name and f"_O2-20_{hr}_" in p.name]
 
+    # one collection per institute and line style, the zoom variants only change the limits
+    mass, rate = Ensemble(), Ensemble()
+    for path in TGA_subset_paths:
+        df = tga_replicate(path, cut_temperature(path, quality=Quality))
+        label, color = label_def(parse_name(path)['institute'])
+        linestyle = ':' if '40Pa' in path.stem else '-'
+        mass.add(df['Temperature (K)'], df['Normalized mass'], label, color, linestyle)
+        rate.add(df['Temperature (K)'], df['dm/dt'], label, color, linestyle)
+
+    fig1, ax1 = plt.subplots(figsize=(6, 4))
+    fig2, ax2 = plt.subplots(figsize=(6, 4))
+    mass.draw(ax1)
+    rate.draw(ax2)
+    ax1.set_xlabel('Temperature (K)')
+    ax1.set_ylabel('m/m$_0$ [g/g]')
+    ax2.set_xlabel('Temperature (K)')
+    ax2.set_ylabel('d(m/m$_0$)/dt [s$^{-1}$]')
+    base1 = (ax1.get_xlim(), ax1.get_ylim())
+    base2 = (ax2.get_xlim(), ax2.get_ylim())
+
     for config in plot_configs:
-        fig1, ax1 = plt.subplots(figsize=(6, 4))
-        fig2, ax2 = plt.subplots(figsize=(6, 4))
-        for path in TGA_subset_paths:
-            df_raw = pd.read_csv(path)
-            if 'FPL' in path.stem:
-                df_raw = df_raw[df_raw['Temperature (K)'] > 400]
-            df = Calculate_dm_dt(df_raw)
-            label, color = label_def(path.stem.split('_')[0])
-            if '40Pa' in path.stem:
-                ax1.plot(df['Temperature (K)'], df['Normalized mass'], label = label, color=color,linestyle =':')
-                ax2.plot(df['Temperature (K)'], df['dm/dt'], label = label, color=color,linestyle =':')
-            else:
-                ax1.plot(df['Temperature (K)'], df['Normalized mass'], label = label, color=color)
-                ax2.plot(df['Temperature (K)'], df['dm/dt'], label = label, color=color)
-        # Apply configuration
-        ax1.set_ylim(bottom=config['ylim1'][0], top=config['ylim1'][1])
-        ax1.set_xlim(left=config['xlim'][0], right=config['xlim'][1])
-        ax1.set_xlabel('Temperature (K)')
-        ax1.set_ylabel('m/m$_0$ [g/g]')
+        zoom_limits(ax1, config['xlim'], config['ylim1'], base1)
+        zoom_limits(ax2, config['xlim'], config['ylim2'], base2)
+        # layout of the tick labels of this zoom variant
         fig1.tight_layout()
-        handles1, labels1 = ax1.get_legend_handles_labels()
-        by_label1 = dict(zip(labels1, handles1))
-        ax1.legend(by_label1.values(), by_label1.keys())
-
-        ax2.set_ylim(bottom=config['ylim2'][0], top=config['ylim2'][1])
-        ax2.set_xlim(left=config['xlim'][0], right=config['xlim'][1])
-        ax2.set_xlabel('Temperature (K)')
-        ax2.set_ylabel('d(m/m$_0$)/dt [s$^{-1}$]')
         fig2.tight_layout()
-        handles2, labels2 = ax2.get_legend_handles_labels()
-        by_label2 = dict(zip(labels2, handles2))
-        ax2.legend(by_label2.values(), by_label2.keys())
-
-        fig1.savefig(f'{base_dir}/TGA/TGA_{material}_{atm}_{hr}_Mass{config["suffix"]}.{ex}')
-        fig2.savefig(f'{base_dir}/TGA/TGA_{material}_{atm}_{hr}_dmdt{config["suffix"]}.{ex}')
-        plt.close(fig1)
-        plt.close(fig2)
+        writer.save(fig1, f'{base_dir}/TGA/TGA_{material}_{atm}_{hr}_Mass{config["suffix"]}.{ex}', close=False)
+        writer.save(fig2, f'{base_dir}/TGA/TGA_{material}_{atm}_{hr}_dmdt{config["suffix"]}.{ex}', close=False)
+    plt.close(fig1)
+    plt.close(fig2)
 
 
 
@@ -307,8 +161,7 @@ for series in unique_conditions_material:
 for path in TGA_Data:
     fig, ax_mass = plt.subplots(figsize=(6, 4))
     ax_rate = ax_mass.twinx()
-    df_raw = pd.read_csv(path)
-    df = Calculate_dm_dt(df_raw)
+    df = tga_replicate(path)
 
     # Plot mass (left y-axis)
     ax_mass.plot(df['Temperature (K)'], df['Normalized mass'],
@@ -346,7 +199,7 @@ for path in TGA_Data:
     fig.legend(loc = 'upper right', bbox_to_anchor=(0.85, 0.95),frameon=True)
 
     fig.tight_layout()
-    fig.savefig(str(base_dir) + f'/TGA/Individual/{path.stem}.{ex}')
+    writer.save(fig, str(base_dir) + f'/TGA/Individual/{path.stem}.{ex}')
     plt.close(fig)
 
 
@@ -370,7 +223,7 @@ Average_values = pd.DataFrame({
     'T onset': np.nan,
     'std T onset': np.nan
 })
-for idx,set in enumerate(TGA_sets):
+for idx,set in enumerate(loop('TGA set metrics', TGA_sets)):
     fig, ax_mass = plt.subplots(figsize=(6, 4))
     ax_rate = ax_mass.twinx()
     df_average = average_tga_series(set)
@@ -398,52 +251,22 @@ for idx,set in enumerate(TGA_sets):
 
 
     #plot individual
-    paths_TGA_set = list(DATA_DIR.glob(f"*/{set}_[rR]*.csv"))
-    peak_mlr_list = []
-    T_peak_list = []
-    T_onset_list = []
-    m_700_list = []
-    m_950_list = []
+    paths_TGA_set = series_paths(set)
+    metrics = []
+    raw_mass, raw_rate = Overlay(), Overlay()
 
     for path in paths_TGA_set:
         print(path)
-        df_raw = pd.read_csv(path)
-        df = Calculate_dm_dt(df_raw)
-
-        peak_index = df[(df['Temperature (K)'] > 400) & (df["dm/dt"].notna())]["dm/dt"].idxmax()
-        peak_mlr = df.loc[peak_index, "dm/dt"]
-        T_peak = df["Temperature (K)"].iloc[peak_index]
-        onset_index = df[(df['dm/dt'] >= 0.1 * peak_mlr) & (df['Temperature (K)'] > 400)].index[0]
-        T_onset = df["Temperature (K)"].iloc[onset_index]
-        try:
-            T700_index = df[(df['Temperature (K)'] >=700)].index[0]
-            m700 = df["Normalized mass"].iloc[T700_index]
-        except:
-            m700 = np.nan
-        try:
-            T950_index = df[(df['Temperature (K)'] >=950)].index[0]
-            m950 = df["Normalized mass"].iloc[T950_index]
-        except:
-            m950 = np.nan
-
-        peak_mlr_list.append(peak_mlr)
-        T_peak_list.append(T_peak)
-        T_onset_list.append(T_onset)
-        m_700_list.append(m700)
-        m_950_list.append(m950)
-
-        ax_mass.plot(df['Temperature (K)'], df['Normalized mass'], '.',color ='black',markersize=0.00000000000002)
-        ax_rate.plot(df['Temperature (K)'], df['dm/dt'],'.',color='black', markersize=0.5)
-    Average_values.at[idx, 'peak MLR'] = np.mean(peak_mlr_list)
-    Average_values.at[idx, 'std peak MLR'] = np.std(peak_mlr_list, ddof=1)
-    Average_values.at[idx, 'T peak'] = np.mean(T_peak_list)
-    Average_values.at[idx, 'std T peak'] = np.std(T_peak_list, ddof=1)
-    Average_values.at[idx, 'T onset'] = np.mean(T_onset_list)
-    Average_values.at[idx, 'std T onset'] = np.std(T_onset_list, ddof=1)
-    Average_values.at[idx, 'm 700'] = np.mean(m_700_list)
-    Average_values.at[idx, 'std m 700'] = np.std(m_700_list, ddof=1)
-    Average_values.at[idx, 'T m 950'] = np.mean(m_950_list)
-    Average_values.at[idx, 'std m 950'] = np.std(m_950_list, ddof=1)
+        df = tga_replicate(path)
+
+        metrics.append(tga_metrics(df))
+
+        raw_mass.add(df['Temperature (K)'], df['Normalized mass'], '.',color ='black',markersize=0.00000000000002)
+        raw_rate.add(df['Temperature (K)'], df['dm/dt'],'.',color='black', markersize=0.5)
+    raw_mass.draw(ax_mass)
+    raw_rate.draw(ax_rate)
+    for key, value in replicate_statistics(metrics).items():
+        Average_values.at[idx, AVERAGE_COLUMNS.get(key, key)] = value
 
     # Set lower limits of both y-axes to 0
     ax_mass.set_ylim(bottom=0)
@@ -463,7 +286,7 @@ for idx,set in enumerate(TGA_sets):
     fig.legend()
 
     fig.tight_layout()
-    plt.savefig(str(base_dir) + f'/TGA/Average/{set}.{ex}')
+    writer.save(plt.gcf(), str(base_dir) + f'/TGA/Average/{set}.{ex}')
     plt.close(fig)
 Average_values.drop('set',axis=1)
 print(Average_values)
@@ -521,8 +344,8 @@ def plot_average_values(df):
         fig1.tight_layout()
         fig2.tight_layout()
         
-        fig1.savefig(str(base_dir) + f'/TGA/Tpeak_Average_{condition[0]}_{condition[1]}_MLR.{ex}')
-        fig2.savefig(str(base_dir) + f'/TGA/Tonset_Average_{condition[0]}_{condition[1]}.{ex}')
+        writer.save(fig1, str(base_dir) + f'/TGA/Tpeak_Average_{condition[0]}_{condition[1]}_MLR.{ex}')
+        writer.save(fig2, str(base_dir) + f'/TGA/Tonset_Average_{condition[0]}_{condition[1]}.{ex}')
         
         plt.close(fig1)
         plt.close(fig2)
@@ -537,17 +360,23 @@ plot_average_values(Average_values)
 color = {'5K':'blue','10K':'black','20K':'red'}
 fig1, ax1 = plt.subplots(figsize=(6, 4))
 fig2, ax2 = plt.subplots(figsize=(6, 4))
+# same with the median, interquartile and 5-95 % range of all replicates
+fig3, ax3 = plt.subplots(figsize=(6, 4))
+fig4, ax4 = plt.subplots(figsize=(6, 4))
+# raw points of all replicates of all heating rates, one artist per heating rate
+raw1, raw2 = Overlay(), Overlay()
 for series in ['Wood_*_N2_5K','Wood_*_N2_10K','Wood_*_N2_20K']:
     parts = series.split('_')
     atm, hr  = parts[2:]
     for subset in [item for item in TGA_sets if fnmatch(item, f'*{series}')]:
-        paths = list(DATA_DIR.glob(f"*/*{subset}_*[rR]*.csv"))
+        paths = series_paths(subset)
         for i, path in enumerate(paths):
-            df = pd.read_csv(path)
-            df = Calculate_dm_dt(df)
-            ax1.plot(df['Temperature (K)'], df['Normalized mass'], '.', color = color[hr], alpha=0.05, markersize = 0.01, zorder=4)
-            ax2.plot(df['Temperature (K)'], df['dm/dt'], '.', color = color[hr], alpha=0.08, markersize = 0.01, zorder=4)
-    df_average = average_tga_series(series,['UAI','IMT'],temp_filter={'FPL': 400})
+            df = tga_replicate(path)
+            raw1.add(df['Temperature (K)'], df['Normalized mass'], '.', color = color[hr], alpha=0.05, markersize = 0.01, zorder=4)
+            raw2.add(df['Temperature (K)'], df['dm/dt'], '.', color = color[hr], alpha=0.08, markersize = 0.01, zorder=4)
+    df_average = average_tga_series(series, quality=Quality, bands=True)
+    quantile_bands(ax3, df_average['Temperature (K)'], df_average, 'Normalized Mass', color[hr], hr + '/min')
+    quantile_bands(ax4, df_average['Temperature (K)'], df_average, 'MLR (1/s)', color[hr], hr + '/min')
     ax1.plot(df_average['Temperature (K)'], df_average['Normalized Mass'], label = hr + '/min', color = color[hr], zorder = 3)
     ax1.fill_between(df_average['Temperature (K)'], 
                     df_average['Normalized Mass']-2*df_average['unc Normalized Mass'],
@@ -558,23 +387,30 @@ for series in ['Wood_*_N2_5K','Wood_*_N2_10K','Wood_*_N2_20K']:
                     df_average['MLR (1/s)']-2*df_average['unc MLR (1/s)'],
                     df_average['MLR (1/s)']+2*df_average['unc MLR (1/s)'],
                     color=color[hr], alpha = 0.3, zorder=2)
+raw1.draw(ax1)
+raw2.draw(ax2)
+
+for fig, ax in [(fig1, ax1), (fig3, ax3)]:
+    ax.set_ylim(bottom=0)
+    ax.set_xlim(right=1100)
+    ax.set_xlabel('Temperature (K)')
+    ax.set_ylabel('m/m$_0$ [g/g]')
+    fig.tight_layout()
+    ax.legend()
+
+for fig, ax in [(fig2, ax2), (fig4, ax4)]:
+    ax.set_ylim(0,0.0035)
+    ax.set_xlim(right=1100)
+    ax.set_xlabel('Temperature (K)')
+    ax.set_ylabel('d(m/m$_0$)/dt [s$^{-1}$]')
+    fig.tight_layout()
+    ax.legend()
 
-ax1.set_ylim(bottom=0)
-ax1.set_xlim(right=1100)
-ax1.set_xlabel('Temperature (K)')
-ax1.set_ylabel('m/m$_0$ [g/g]')
-fig1.tight_layout()
-ax1.legend()
-
-ax2.set_ylim(0,0.0035)
-ax2.set_xlim(right=1100)
-ax2.set_xlabel('Temperature (K)')
-ax2.set_ylabel('d(m/m$_0$)/dt [s$^{-1}$]')
-fig2.tight_layout()
-ax2.legend()
-
-fig1.savefig(str(base_dir) + '/TGA/TGA_Average_N2_Mass.{}'.format(ex))
-fig2.savefig(str(base_dir) + '/TGA/TGA_Average_N2_dmdt.{}'.format(ex))
+writer.save(fig1, str(base_dir) + '/TGA/TGA_Average_N2_Mass.{}'.format(ex))
+writer.save(fig2, str(base_dir) + '/TGA/TGA_Average_N2_dmdt.{}'.format(ex))
+writer.save(fig3, str(base_dir) + '/TGA/TGA_Average_N2_Mass_bands.{}'.format(ex))
+writer.save(fig4, str(base_dir) + '/TGA/TGA_Average_N2_dmdt_bands.{}'.format(ex))
 plt.close(fig1)
 plt.close(fig2)
 
+writer.close()
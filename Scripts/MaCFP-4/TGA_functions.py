@@ -0,0 +1,173 @@
+# TGA analysis functions (used by TGA_analysis.py)
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from Instrument import timed
+from Utils import DATA_DIR, GRID_STEP, device_data, interpolation, savgol, series_paths
+from Readers import read_series
+from Screening import quality_filter, cut_temperature
+from Cache import derived
+from Streaming import GridStatistics, CAPACITY
+
+
+# Columns used in the TGA analysis (STA heat flow is not read)
+TGA_columns = ['Time (s)', 'Temperature (K)', 'Mass (mg)']
+
+# All TGA data (including STA)
+TGA_Data = device_data(DATA_DIR, 'TGA') + device_data(DATA_DIR, 'STA')
+
+# Savitzky-Golay window and order of mass and MLR, rows of the initial mass
+SAVGOL = (41, 3)
+NORM_ROWS = 5
+
+
+@timed
+def Calculate_dm_dt(df:pd.DataFrame):
+    df = interpolation(df)
+
+    # Normalize mass
+    df['Normalized mass'] = df['Mass (mg)'] / np.mean(df['Mass (mg)'].iloc[0:NORM_ROWS])
+
+    # Smooth normalized mass
+    df['filtered'] = savgol(df['Normalized mass'], *SAVGOL)
+
+    # Central difference derivative w.r.t. time (NaN at first/last points)
+    dt = df['Time (s)'].shift(-1) - df['Time (s)'].shift(1)
+    
+    df['dm/dt unfiltered'] = (df['Normalized mass'].shift(1) - df['Normalized mass'].shift(-1)) / dt
+    
+    df['dm/dt'] = savgol(df['dm/dt unfiltered'], *SAVGOL)#(df['filtered'].shift(1) - df['filtered'].shift(-1)) / dt
+    
+    return df
+
+
+def tga_replicate(path:Path, min_temperature:float=None):
+    """Calculate_dm_dt of a replicate file (above min_temperature if given), from the cache if unchanged"""
+    recipe = {'function': 'TGA Calculate_dm_dt', 'columns': TGA_columns, 'grid_step': GRID_STEP,
+              'savgol': SAVGOL, 'norm_rows': NORM_ROWS, 'min_temperature': min_temperature}
+
+    def compute():
+        df = read_series(path, TGA_columns)
+        if min_temperature is not None:
+            df = df[df['Temperature (K)'] > min_temperature].reset_index(drop=True)
+        return Calculate_dm_dt(df)
+
+    return derived(path, recipe, compute)
+
+
+
+@timed
+def average_HR_tga_series(series_name: str):
+    
+    paths = series_paths(series_name)
+    paths = [p for p in paths if "TEMPLATE" not in str(p)]
+    paths = [p for p in paths if p in TGA_Data]
+    stats = GridStatistics('Temperature (K)', GRID_STEP)
+
+    if len(paths) == 0:
+        raise Exception((f"No files found for series {series_name}", "red"))
+
+    # Read data, one replicate at a time into the running statistics
+    for i, path in enumerate(paths):
+        df = read_series(path, ['Time (s)', 'Temperature (K)'])
+       
+        #interpolation
+        df_interp = interpolation(df)
+
+        #df_interp["dTdt"] = 60 * np.gradient(df_interp["Temperature (K)"], df_interp["Time (s)"])
+        window = 5
+        dt = df_interp['Time (s)'].shift(-5) - df_interp['Time (s)'].shift(5)
+        df_interp['dTdt'] = -60*(df_interp['Temperature (K)'].shift(5) - df_interp['Temperature (K)'].shift(-5)) / dt
+        stats.add(df_interp['Temperature (K)'], {'dTdt': df_interp['dTdt']})
+
+    #average
+    dTdt, dTdt_std = stats.pointwise('dTdt')
+    df_average = pd.DataFrame({
+        'Temperature (K)': stats.grid(),
+        'dTdt (K/min)': dTdt,
+        'dTdt_std': dTdt_std,
+    })
+
+    return df_average
+
+
+def tga_paths(series_name: str, exclude=None, quality=None):
+    """Replicate files of a series (glob pattern), without exclusions"""
+    paths = series_paths(series_name, partial=True)
+    paths = [p for p in paths if "TEMPLATE" not in str(p)]
+    paths = [p for p in paths if p in TGA_Data]
+
+    # Apply exclusions
+    if exclude is not None:
+        if not isinstance(exclude, list):
+            exclude = [exclude]  # Convert single string to list
+        
+        for excl in exclude:
+            paths = [p for p in paths if excl not in str(p)]
+
+    # Apply exclusions of the quality report
+    if quality is not None:
+        paths = quality_filter(paths, quality)
+
+    if len(paths) == 0:
+        raise Exception((f"No files found for series {series_name}", "red"))
+    return paths
+
+
+@timed
+def tga_statistics(paths, temp_filter=None, quality=None, capacity:int=None):
+    """Running statistics of normalized mass and MLR of replicate files on the temperature grid"""
+    stats = GridStatistics('Temperature (K)', GRID_STEP, capacity)
+    for path in paths:
+        df = tga_replicate(path, cut_temperature(path, temp_filter, quality))
+        # the MLR pools the filtered and unfiltered derivative (as the merged replicates of the
+        # original average); its quantile bands (with a sketch) are of the filtered derivative only
+        values = {'Normalized mass': df['Normalized mass'], 'dm/dt': df[['dm/dt', 'dm/dt unfiltered']]}
+        if capacity:
+            values['dm/dt filtered'] = df['dm/dt']
+        stats.add(df['Temperature (K)'], values)
+    return stats
+
+
+@timed
+def average_tga_series(series_name: str, exclude=None, temp_filter=None, quality=None, bands=False):
+    # the replicates are added to the statistics one at a time
+    # bands: also the median, interquartile and 5-95 % range of the replicates
+    capacity = CAPACITY if bands else None
+    stats = tga_statistics(tga_paths(series_name, exclude, quality), temp_filter, quality, capacity)
+
+    #average: mean of all non-NaN values in rows i-2..i+2 of all replicates
+    df_average = pd.DataFrame({'Temperature (K)': stats.grid()})
+    n=2
+    df_average['Normalized Mass'], df_average['unc Normalized Mass'] = stats.smoothed('Normalized mass', n)
+    df_average['MLR (1/s)'], df_average['unc MLR (1/s)'] = stats.smoothed('dm/dt', n)
+    if bands:
+        df_average = df_average.assign(**stats.band_columns('Normalized mass', 'Normalized Mass'),
+                                       **stats.band_columns('dm/dt filtered', 'MLR (1/s)'))
+    return df_average
+
+
+# column of the mean of a value in the Average_values table, where it is not the value name
+AVERAGE_COLUMNS = {'m 950': 'T m 950'}
+
+
+def tga_metrics(df:pd.DataFrame):
+    """Values of interest of one replicate (output of Calculate_dm_dt)"""
+    peak_index = df[(df['Temperature (K)'] > 400) & (df["dm/dt"].notna())]["dm/dt"].idxmax()
+    peak_mlr = df.loc[peak_index, "dm/dt"]
+    T_peak = df["Temperature (K)"].iloc[peak_index]
+    onset_index = df[(df['dm/dt'] >= 0.1 * peak_mlr) & (df['Temperature (K)'] > 400)].index[0]
+    T_onset = df["Temperature (K)"].iloc[onset_index]
+    try:
+        T700_index = df[(df['Temperature (K)'] >=700)].index[0]
+        m700 = df["Normalized mass"].iloc[T700_index]
+    except IndexError:
+        m700 = np.nan
+    try:
+        T950_index = df[(df['Temperature (K)'] >=950)].index[0]
+        m950 = df["Normalized mass"].iloc[T950_index]
+    except IndexError:
+        m950 = np.nan
+    return {'peak MLR': peak_mlr, 'T peak': T_peak, 'T onset': T_onset, 'm 700': m700, 'm 950': m950}
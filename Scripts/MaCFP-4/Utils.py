@@ -1,54 +1,74 @@
 # common functions for the analysis scripts
+from __future__ import annotations
+
+import os
 import re
-import pandas as pd
-import numpy as np
+import zlib
 
+from fnmatch import fnmatchcase
+from functools import lru_cache
 from pathlib import Path
-from collections import defaultdict
-import matplotlib.pyplot as plt
+
+from Lazy import lazy_import
+from Instrument import timed
+from Naming import TREES, naming, tree_naming
+
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
 
 #region paths
 SCRIPT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = SCRIPT_DIR.parent.parent
 
-DATA_DIR = PROJECT_ROOT / "Wood" / "Calibration_Data"
+# MACFP_MATERIALS selects the data trees analyzed together (e.g. Wood,PMMA; see Naming.py),
+# MACFP_DATA_DIR points the analysis to another data tree (e.g. synthetic benchmark data)
+MATERIALS = [m for m in os.environ.get("MACFP_MATERIALS", "Wood").split(",") if m]
+if "MACFP_DATA_DIR" in os.environ:
+    DATA_DIRS = [Path(os.environ["MACFP_DATA_DIR"])]
+else:
+    DATA_DIRS = [PROJECT_ROOT / TREES[m] for m in MATERIALS]
+DATA_DIR = DATA_DIRS[0]
 FIGURES_DIR = PROJECT_ROOT / "Documents" / "SCRIPTS_FIGURES" / "MaCFP-4"
-labs = sorted(d.name for d in DATA_DIR.iterdir() if d.is_dir() and d.name != "TEMPLATE-INSTITUTE-X")
-
-CODES = ["Pekin", "Tufted", "Aylesbury", "Orpington","Rouen", 
-         "Saxony", "Ruddy", "Cayuga","Redhead", "Buff",  
-         "Bali", "Magpie", "Ancona", "Crested", "Call",  
-         "Muscovy", "Pomeranian",  "Shetland", "Alabio", "Mallard", "Hardhead"]
+labs = sorted({tree_naming(data_dir).institute(d.name) for data_dir in DATA_DIRS for d in data_dir.iterdir()
+               if d.is_dir() and d.name != "TEMPLATE-INSTITUTE-X"})
 
-#colors = ["#5B2A6F", "#808080", "#FF4500", "#FFD700", "#008000", 
-#          "#FF1493", "#00FF00", "#00BFFF", "#4B0082", "#000000",
-#          "#03EB9E", "#FF0000", "#A52A2A", "#0000FF", "#000080", 
-#          "#FF00FF", "#F0E68C", "#006400", "#FF8C00", "#008080", "#DAA520"
-#]
-
-colors = ["#1f77b4", "#98df8a", "#17becf", "#ff7f0e", "#aec7e8", 
-          "#ff9896", "#c5b0d5", "#2ca02c",  "#c49c94", "#d62728",
-          "#dbdb8d", "#c7c7c7",  "#ffbb78", "#bcbd22", "#8c564b", 
-          "#f7b6d2","#e377c2", "#9edae5", "#7f7f7f","#9467bd" , "#DAA520"
-]
+# unique identifiers of the institutes (Wood/Calibration_Data/Institution_Key.md)
+CODES = {"Aalto": "Pekin", "CERIB": "Tufted", "CUG": "Aylesbury", "FPL": "Orpington", "FSRI": "Rouen",
+         "FZJ": "Saxony", "HKPoly": "Ruddy", "IMT": "Cayuga", "Lund": "Redhead", "MFSL": "Buff",
+         "NIST": "Bali", "PPrime": "Magpie", "TIFP+UCT": "Ancona", "TUBS": "Crested", "TUT": "Call",
+         "UAI": "Muscovy", "UCantabria": "Pomeranian", "UDRI": "Shetland", "UMD": "Alabio", "UMET": "Mallard",
+         "UQ": "Hardhead"}
 
+colors = {"Aalto": "#1f77b4", "CERIB": "#98df8a", "CUG": "#17becf", "FPL": "#ff7f0e", "FSRI": "#aec7e8",
+          "FZJ": "#ff9896", "HKPoly": "#c5b0d5", "IMT": "#2ca02c", "Lund": "#c49c94", "MFSL": "#d62728",
+          "NIST": "#dbdb8d", "PPrime": "#c7c7c7", "TIFP+UCT": "#ffbb78", "TUBS": "#bcbd22", "TUT": "#8c564b",
+          "UAI": "#f7b6d2", "UCantabria": "#e377c2", "UDRI": "#9edae5", "UMD": "#7f7f7f", "UMET": "#9467bd",
+          "UQ": "#DAA520"}
 
 
 def label_def(lab):
-    IDX = labs.index(lab)
-    label = CODES[IDX]
-    color = colors[IDX]
+    # institutes without a code (synthetic data, other materials): the institute name
+    # and a color of the palette by the position of the institute, or by a hash of its
+    # name if it is not in the data trees (e.g. a basis fitted on other materials)
+    label = CODES.get(lab, lab)
+    palette = list(colors.values())
+    position = labs.index(lab) if lab in labs else zlib.crc32(lab.encode())
+    color = colors.get(lab) or palette[position % len(palette)]
     return label, color
 
 
 #region functions
+@timed
 def device_data(directory:Path, device:str):
+    # all data trees (DATA_DIRS), files the naming convention of their tree accepts
     paths = [
         p
-        for p in DATA_DIR.rglob("*.csv")
+        for data_dir in DATA_DIRS
+        for p in data_dir.rglob("*.csv")
         if p.is_file()
         if device in p.name.upper()
         if not any(parent.name.startswith("TEMPLATE-INSTITUTE-X") for parent in p.parents)
+        if naming(p).accepts(p)
     ]
     return paths
 
@@ -70,17 +90,176 @@ def get_series_names(data_list):
 
     # Find all CSV files recursively
     for csv_file in data_list:
-        stem = csv_file.stem
-        match = re.match(r"^(.*)_[Rr]\d+$", stem)
-        series_name = match.group(1) if match else stem
-        series_set.add(series_name)
+        series_set.add(parse_name(csv_file)["series"])
 
     return sorted(list(series_set))  # Return sorted list for consistent ordering
 
 
 
 
+def parse_name(path:Path):
+    """
+    Split a file name into its metadata fields, with the naming convention of its data
+    tree (Naming.py); the series is the canonical set name.
+
+    mg-scale:  {institute}_{material}_{device}_{atmosphere}_{heating rate}[_{extra}]_R{n}
+    g-scale:   {institute}_{material}_{device}_{flux}_{orientation}[_{extra}]_R{n}
+    CAPA:      {institute}_{material}_CAPA_{atmosphere}_{flux}_R{n}
+    """
+    return naming(path).parse(path)
+
+
+@lru_cache(maxsize=None)
+def _series_index():
+    index = {}
+    for path in device_data(DATA_DIR, ""):
+        index.setdefault(parse_name(path)["series"], []).append(path)
+    return index
+
+
+def series_paths(series:str, partial:bool=False):
+    """
+    Replicate files of the sets matching `series` (glob pattern of set names, e.g.
+    Wood_*_N2_10K) in all data trees; with `partial` also of the sets ending with it
+    (conditions, e.g. Cone_50kW_hor)
+    """
+    pattern = f"*{series}" if partial else series
+    return sorted(p for name, paths in _series_index().items() if fnmatchcase(name, pattern) for p in paths)
+
+
+def catalog(paths):
+    """Table of data files with the metadata parsed from their names, indexed by file name (stem)"""
+    rows = [dict(parse_name(p), path=p) for p in paths]
+    df = pd.DataFrame(rows, columns=[
+        "institute", "material", "device", "atmosphere", "heating_rate", "flux",
+        "orientation", "extra", "series", "replicate", "path",
+    ])
+    df.index = pd.Index([Path(p).stem for p in paths], name="file")
+    return df
+
+
+
+
+# devices with the heat flux and orientation as 4th and 5th field of the name (CAPA: atmosphere and flux)
+G_SCALE = ("Cone", "Gasification", "FPA")
+
+
+def name_conditions(cat:pd.DataFrame):
+    """
+    Catalog with the 4th and 5th field of every file name as 'condition1' and 'condition2'
+    (atmosphere and heating rate, flux and orientation of g-scale data, atmosphere and
+    flux of CAPA) and the names of these fields as 'fields'
+    """
+    g_scale, capa = cat["device"].isin(G_SCALE), cat["device"] == "CAPA"
+    return cat.assign(
+        condition1=cat["atmosphere"].where(~g_scale, cat["flux"]),
+        condition2=cat["heating_rate"].where(~g_scale, cat["orientation"]).where(~capa, cat["flux"]),
+        fields=np.where(g_scale, "flux/orientation", np.where(capa, "atmosphere/flux", "atmosphere/heating_rate")),
+    )
+
+
 #tables
+def _natural(value):
+    # numeric conditions by their value (2K before 10K), then by text
+    match = re.match(r"^\d+(\.\d+)?", str(value))
+    return (float(match.group()) if match else float("inf"), str(value))
+
+
+def availability_table(cat:pd.DataFrame, rows=("institute",), columns=("atmosphere", "heating_rate"),
+                       codes:bool=True, **select):
+    """
+    Number of data files for every combination of `rows` and `columns`, counted with
+    a single groupby over the catalog.
+
+    Parameters
+    ----------
+    cat : pandas.DataFrame
+        Catalog of the data files (see catalog, or Store.find for all collections)
+    rows, columns : sequence of str
+        Fields of the catalog, e.g. rows=('institute',), columns=('device', 'flux')
+    codes : bool
+        Show institutes by their code (label_def) instead of their name
+    select : str or list of str
+        Values a field is restricted to, e.g. material='Wood', atmosphere=['N2', 'O2-21'].
+        The selected values of a column field are all shown (also without data),
+        in the given order; rows without any file are left out.
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    rows, columns = list(rows), list(columns)
+    unknown = [f for f in rows + columns + list(select) if f not in cat.columns]
+    if unknown:
+        raise ValueError(f"Unknown field(s) {unknown}, use {list(cat.columns)}")
+    select = {f: [v] if isinstance(v, str) else list(v) for f, v in select.items()}
+
+    mask = np.ones(len(cat), dtype=bool)
+    for field, values in select.items():
+        mask &= cat[field].isin(values).to_numpy()
+    sub = cat.loc[mask, rows + columns]
+
+    levels = [select[c] if c in select else sorted(sub[c].unique(), key=_natural) for c in columns]
+    if len(columns) > 1:
+        col_index = pd.MultiIndex.from_product(levels, names=columns)
+    elif columns:
+        col_index = pd.Index(levels[0], name=columns[0])
+    counts = sub.groupby(rows + columns, sort=True).size()
+    if not columns:
+        table = counts.to_frame("files")
+    elif counts.empty:
+        table = pd.DataFrame(0, index=pd.MultiIndex.from_tuples([], names=rows) if len(rows) > 1
+                             else pd.Index([], name=rows[0]), columns=col_index)
+    else:
+        table = counts.unstack(columns, fill_value=0).reindex(columns=col_index, fill_value=0)
+    table = table[table.sum(axis=1) > 0]
+
+    if codes and "institute" in rows:
+        names = {lab: label_def(lab)[0] for lab in labs}
+        table = table.rename(index=names, level="institute" if len(rows) > 1 else None)
+    return table.astype(int)
+
+
+def _latex(df:pd.DataFrame):
+    """booktabs tabular of a table (pandas' to_latex needs jinja2)"""
+    def esc(v):
+        return str(v).replace("_", r"\_").replace("%", r"\%").replace("&", r"\&")
+    n_idx = df.index.nlevels
+    lines = [r"\begin{tabular}{" + "l" * n_idx + "r" * df.shape[1] + "}", r"\toprule"]
+    if isinstance(df.columns, pd.MultiIndex):
+        for level in range(df.columns.nlevels - 1):
+            values = df.columns.get_level_values(level)
+            cells, i = [], 0
+            while i < len(values):
+                j = i
+                while j < len(values) and values[j] == values[i]:
+                    j += 1
+                cells.append(rf"\multicolumn{{{j - i}}}{{c}}{{{esc(values[i])}}}")
+                i = j
+            lines.append(" & ".join([esc(df.columns.names[level] or "")] + [""] * (n_idx - 1) + cells) + r" \\")
+        header = df.columns.get_level_values(-1)
+    else:
+        header = df.columns
+    lines.append(" & ".join([esc(n or "") for n in df.index.names] + [esc(c) for c in header]) + r" \\")
+    lines.append(r"\midrule")
+    for idx, row in zip(df.index, df.itertuples(index=False)):
+        idx = idx if isinstance(idx, tuple) else (idx,)
+        lines.append(" & ".join([esc(i) for i in idx] + [esc(v) for v in row]) + r" \\")
+    lines += [r"\bottomrule", r"\end{tabular}"]
+    return "\n".join(lines) + "\n"
+
+
+def render_table(df:pd.DataFrame, fmt:str="console"):
+    """Text of a table for the console, as CSV or as LaTeX tabular"""
+    if fmt == "console":
+        return df.to_string()
+    if fmt == "csv":
+        return df.to_csv()
+    if fmt == "latex":
+        return _latex(df)
+    raise ValueError(f"Unknown table format {fmt}, use console, csv or latex")
+
+
 def make_institution_table(
     paths, materials,
     atmospheres,
@@ -94,82 +273,80 @@ def make_institution_table(
     paths : list[Path]
         List of CSV file paths
     atmospheres : list[str]
-        Atmospheres to include (e.g. ['N2', 'O2-21'])
+        Atmospheres to include (e.g. ['N2', 'O2-21']), fluxes for cone and gasification data
     heating_rates : list[str]
-        Heating rates to include (e.g. ['10K'])
+        Heating rates to include (e.g. ['10K']), orientations for cone and gasification data
 
     Returns
     -------
     pandas.DataFrame
     """
+    # 4th and 5th field of the name of every file (flux and orientation of g-scale data)
+    cat = name_conditions(catalog(paths))
+    first, second = "condition1", "condition2"
+    select = {"material": materials, first: atmospheres, second: heating_rates}
 
-    # counts[(inst_code, atmosphere, heating_rate)] = count
-    counts = defaultdict(int)
-
-    for p in paths:
-        name = p.stem
-        parts = name.split("_")
-        if len(parts) < 5:
-            continue
-
-        inst, mat, _, atm, hr = parts[:5]
-        if mat not in materials:
-            continue
-        if atm not in atmospheres:
-            continue
-        if hr not in heating_rates:
-            continue
-
-        counts[(label_def(inst)[0], mat, atm, hr)] += 1
-        
-    # ---------- Table construction logic ----------
-    inst_codes = [code for code in CODES if any(counts.get((code, mat,atm, hr), 0) > 0 for mat in materials for atm in atmospheres for hr in heating_rates)]
-    print(inst_codes)
     # Case 1: single atmosphere → columns = heating rates
     if len(atmospheres) == 1 and len(heating_rates) > 1:
-        atm = atmospheres[0]
-        data = {
-            hr: [sum(counts.get((inst,m, atm, hr), 0) for m in materials) for inst in inst_codes]
-            for hr in heating_rates
-        }
-        df = pd.DataFrame(data, index=inst_codes)
-
+        df = availability_table(cat, columns=[second], **select)
+        df.columns.name = None
     # Case 2: single heating rate → columns = atmospheres
     elif len(heating_rates) == 1 and len(atmospheres) > 1:
-        hr = heating_rates[0]
-        data = {
-            atm: [sum(counts.get((inst,m, atm, hr), 0) for m in materials) for inst in inst_codes]
-            for atm in atmospheres
-        }
-        df = pd.DataFrame(data, index=inst_codes)
-
+        df = availability_table(cat, columns=[first], **select)
+        df.columns.name = None
     # Case 3: multiple atmospheres AND heating rates
     else:
-        columns = pd.MultiIndex.from_product(
-            [atmospheres, heating_rates],
-            names=["Atmosphere", "Heating Rate"]
-        )
-
-        data = []
-        for inst in inst_codes:
-            row = [
-                sum(counts.get((inst,m, atm, hr), 0) for m in materials)
-                for atm, hr in columns
-            ]
-            data.append(row)
-
-        df = pd.DataFrame(data, index=inst_codes, columns=columns)
+        df = availability_table(cat, columns=[first, second], **select)
+        df.columns.names = ["Atmosphere", "Heating Rate"]
 
     df.index.name = "Institution"
     return df
 
 
-def interpolation(df:pd.DataFrame):
+def replicate_statistics(records):
+    """
+    Mean and sample standard deviation over replicates of each value in `records`
+    (list of dicts of the same keys), as {key: mean, 'std key': std}.
+    """
+    stats = {}
+    for key in (records[0] if records else {}):
+        values = [r[key] for r in records]
+        stats[key] = np.mean(values)
+        stats[f'std {key}'] = np.std(values, ddof=1) if len(values) > 1 else np.nan
+    return stats
+
+
+# temperature step (K) of the common grid of the replicates
+GRID_STEP = 0.5
+
+
+def savgol(values, window:int, order:int):
+    """
+    Savitzky-Golay filter of values with NaN (e.g. the ends of a central difference):
+    the NaN are bridged linearly for the filter and stay NaN in the result
+    """
+    from scipy.signal import savgol_filter
+    values = np.asarray(values, dtype=np.float64)
+    bad = ~np.isfinite(values)
+    if not bad.any() or bad.all():
+        return savgol_filter(values, window, order)
+    index = np.arange(len(values))
+    filled = values.copy()
+    filled[bad] = np.interp(index[bad], index[~bad], values[~bad])
+    result = savgol_filter(filled, window, order)
+    result[bad] = np.nan
+    return result
+
+
+@timed
+def interpolation(df:pd.DataFrame, step:float=GRID_STEP):
+    # only the heating ramp (up to the maximum temperature), some programs end with a cooling segment
+    df = df.iloc[:int(np.nanargmax(df["Temperature (K)"].to_numpy())) + 1]
     T_floor = df["Temperature (K)"].iloc[0]
     T_floor = np.ceil(T_floor) 
     T_ceil = df["Temperature (K)"].iloc[-1]
     T_ceil = np.floor(T_ceil) 
-    InterpT = np.arange(T_floor, T_ceil+0.5, 0.5)
+    InterpT = np.arange(T_floor, T_ceil+step, step)
     length = len(InterpT)
     df_interp = pd.DataFrame(index=range(length))
     for columns in df.columns[:]:
@@ -0,0 +1,40 @@
+# time alignment of replicates (Alignment.py) on synthetic curves and the cone data
+#
+#   python -m pytest test_alignment.py
+#
+# The synthetic replicates are one curve moved by known shifts; the cone replicates
+# are checked against their ignition times (cone_metrics), the registration the
+# analysis reports next to the aligned averages.
+import numpy as np
+import pytest
+
+from Alignment import METHODS, align
+
+
+def peaks(t, shift, second:float=0.5):
+    # ignition peak and a second peak of relative height `second`
+    x = t - shift
+    return np.where(x > 0, 200 * np.exp(-((x - 20) / 10)**2) + 200 * second * np.exp(-((x - 150) / 30)**2), 0)
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_known_shifts(method):
+    t = np.arange(0, 600.0)
+    shifts = [[0, 30, -12, 55], [5, -40]]
+    groups = [[(t, peaks(t, 100 + s)) for s in g] for g in shifts]
+    result = align(groups, 1, method, threshold=24)
+    for found, expected in zip(result, shifts):
+        expected = np.array(expected) - np.rint(np.median(expected))
+        np.testing.assert_array_equal(found, expected)
+
+
+def test_cone_shifts_match_ignition():
+    # aligned ignition times of the replicates of every cone set agree
+    from Cone_functions import Cone_Data, cone_shifts, cone_replicate, cone_metrics
+    from Utils import get_series_names, parse_name
+    sets = get_series_names(Cone_Data)
+    shifts = cone_shifts(sets)
+    for series in sets:
+        aligned = [cone_metrics(cone_replicate(p), parse_name(p)['institute'])['ignition time'] - s
+                   for p, s in shifts.items() if parse_name(p)['series'] == series]
+        assert np.ptp(aligned) <= 2, f"{series}: aligned ignition times {aligned}"
@@ -0,0 +1,84 @@
+# availability tables of the analysis scripts against the output of the original per-file count
+#
+#   python -m pytest test_availability.py
+#
+# The tables of the Wood calibration data as printed by the analysis scripts
+# (make_institution_table with the arguments of Metrics.AVAILABILITY), counted
+# from the 4th and 5th field of the file names. Update the expected tables when
+# files are added to the data tree.
+import importlib
+import pytest
+
+from Metrics import AVAILABILITY
+from Utils import make_institution_table
+
+
+EXPECTED = {
+    ("TGA", 0): """\
+Institution,2K,3K,5K,10K,20K,30K,40K,50K,60K
+Pekin,0,0,0,3,0,0,0,0,0
+Orpington,0,0,0,3,0,0,0,0,0
+Rouen,0,1,0,3,0,3,0,0,0
+Cayuga,1,0,1,1,1,0,0,0,0
+Buff,0,0,0,3,0,0,0,0,0
+Ancona,0,0,4,3,3,0,0,0,0
+Crested,0,0,3,3,3,3,3,3,0
+Call,0,0,0,6,0,0,0,0,0
+Muscovy,0,0,0,0,3,0,0,0,0
+Pomeranian,0,0,2,2,0,0,0,0,0
+Alabio,0,0,0,3,0,0,0,0,0
+Mallard,0,0,0,3,0,0,0,0,0
+""",
+    ("TGA", 1): """\
+Atmosphere,O2-20,O2-20,O2-20,O2-20,O2-20,O2-21,O2-21,O2-21,O2-21,O2-21
+Heating Rate,2K,5K,10K,20K,30K,2K,5K,10K,20K,30K
+Institution,,,,,,,,,,
+Cayuga,1,1,1,1,0,0,0,0,0,0
+Mallard,0,0,0,0,0,0,0,3,0,0
+""",
+    ("MCC", 0): """\
+Institution,30K,45K,60K
+Saxony,2,2,10
+Cayuga,0,0,2
+Bali,0,0,12
+Crested,3,0,0
+Shetland,0,0,3
+""",
+    ("MCC", 1): """\
+Institution,O2-2,O2-5,O2-10,O2-20,O2-21
+Cayuga,2,2,2,2,0
+Bali,0,0,0,3,0
+""",
+    ("MCC", 2): """\
+Institution,O2-20,O2-21
+Bali,3,0
+""",
+    ("DSC", 0): """\
+Institution,3K,5K,10K,20K,30K,40K,50K,60K
+Rouen,1,0,3,0,3,0,0,0
+Ancona,0,4,3,3,0,0,0,0
+""",
+    ("DSC", 1): """\
+Institution,3K,5K,10K,20K,30K,40K,50K,60K
+""",
+    ("Cone", 0): """\
+Institution,25kW,30kW,50kW,60kW,75kW
+Orpington,0,0,6,0,0
+Cayuga,5,0,4,0,3
+Crested,0,3,0,0,0
+Shetland,0,3,0,4,0
+Mallard,0,3,0,3,0
+""",
+    ("Cone", 1): """\
+Institution,30kW,40kW,60kW
+Ancona,6,0,6
+""",
+}
+
+
+@pytest.mark.parametrize("device, index", list(EXPECTED), ids=[f"{d}_{i + 1}" for d, i in EXPECTED])
+def test_institution_table(device, index):
+    data, materials, atmospheres, rates = AVAILABILITY[device][index]
+    paths = getattr(importlib.import_module(f"{device}_functions"), data)
+    table = make_institution_table(paths, materials, atmospheres, rates)
+    assert table.to_csv() == EXPECTED[device, index]
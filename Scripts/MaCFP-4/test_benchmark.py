@@ -0,0 +1,30 @@
+# smoke test of the benchmark harness on a tiny synthetic data set
+#
+#   python -m pytest test_benchmark.py
+#
+# Every kernel of Benchmark.py has to run through on the data of Synthetic_data.py
+# (MACFP_DATA_DIR, without the cache of derived series).
+import json
+import os
+import subprocess
+import sys
+
+from pathlib import Path
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+
+def test_benchmark_tiny(tmp_path):
+    output = tmp_path / "results.jsonl"
+    result = subprocess.run(
+        [sys.executable, str(SCRIPT_DIR / "Benchmark.py"), "-i", "2", "-c", "2", "-r", "2",
+         "--repeat", "1", "-o", str(output)],
+        cwd=tmp_path, capture_output=True, text=True, env=dict(os.environ, MPLBACKEND="Agg"),
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    record = json.loads(output.read_text().splitlines()[-1])
+    assert record["scale"]["institutes"] == 2
+    assert len(record["kernels"]) == 14
+    for name, kernel in record["kernels"].items():
+        assert kernel["seconds"] >= 0 and kernel["peak_MiB"] >= 0, name
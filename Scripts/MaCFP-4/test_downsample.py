@@ -0,0 +1,55 @@
+# visual downsampling of the raw data overlays (Downsample.py)
+#
+#   python -m pytest test_downsample.py
+#
+# The overlays keep the minimum and maximum of every pixel column of the axes, so the
+# number of plotted points is bounded by the pixel width, for one dense series and for
+# the pooled points of many replicates.
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from Downsample import Overlay, minmax, overlay, pixel_width
+
+
+def test_minmax_by_pixel_column():
+    x = np.linspace(0, 10, 10001)
+    y = np.sin(x)
+    xd, yd = minmax(x, y, 100)
+    assert len(xd) <= 200 and np.all(np.diff(xd) >= 0)
+    # extremes of every column are kept
+    column = np.minimum((x / 10 * 100).astype(int), 99)
+    for c in (0, 37, 99):
+        assert yd[np.minimum((xd / 10 * 100).astype(int), 99) == c].max() == y[column == c].max()
+
+
+def test_sparse_series_unchanged():
+    x = np.arange(0, 100.0)
+    xd, yd = minmax(x, x**2, 1000)
+    np.testing.assert_array_equal(xd, x)
+
+
+def test_overlay_of_one_series():
+    fig, ax = plt.subplots(figsize=(6, 4))
+    x = np.linspace(300, 1100, 50000)
+    line, = overlay(ax, x, np.exp(-((x - 600) / 50)**2), '.', color='black')
+    assert len(line.get_xdata()) <= 2 * pixel_width(ax) and line.get_rasterized()
+    plt.close(fig)
+
+
+def test_pooled_overlay_independent_of_replicates():
+    # 0.5 K grid replicates (fewer points than pixels each), one artist per color
+    fig, ax = plt.subplots(figsize=(6, 4))
+    width = pixel_width(ax)
+    rng = np.random.default_rng(0)
+    raw = Overlay()
+    x = np.arange(300, 1100, 0.5)
+    for i in range(60):
+        raw.add(x, np.exp(-((x - 600) / 50)**2) + rng.normal(0, 0.01, len(x)), '.',
+                color=['blue', 'black', 'red'][i % 3], markersize=0.01)
+    artists = raw.draw(ax)
+    assert len(artists) == 3 == len(ax.lines)
+    for line in artists:
+        assert len(line.get_xdata()) <= 2 * width and line.get_rasterized()
+    plt.close(fig)
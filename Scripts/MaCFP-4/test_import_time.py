@@ -0,0 +1,96 @@
+# startup time budget of the command line entry points
+#
+#   python -m pytest test_import_time.py
+#
+# Every entry point is started with -X importtime (with --help, or a catalog query
+# on an empty store); the test fails if its imports take longer than the budget or
+# if it loads one of the heavy modules, which must only be imported on first use.
+# MACFP_IMPORT_BUDGET_SCALE=2 doubles all budgets (slow machines).
+import os
+import subprocess
+import sys
+import pytest
+
+from pathlib import Path
+
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+VERIFICATION_DIR = SCRIPT_DIR.parent.parent / "Verification" / "Scripts"
+
+HEAVY = ("numpy", "pandas", "scipy", "matplotlib", "PIL", "mpmath")
+SCALE = float(os.environ.get("MACFP_IMPORT_BUDGET_SCALE", 1))
+
+# entry point, arguments, budget of the summed top level imports (ms)
+ENTRY_POINTS = [
+    (SCRIPT_DIR / "TGA_analysis.py", ["--help"], 150),
+    (SCRIPT_DIR / "MCC_analysis.py", ["--help"], 150),
+    (SCRIPT_DIR / "DSC_analysis.py", ["--help"], 150),
+    (SCRIPT_DIR / "Cone_analysis.py", ["--help"], 150),
+    (SCRIPT_DIR / "Metrics.py", ["--help"], 150),
+    (SCRIPT_DIR / "Availability.py", ["--help"], 150),
+    (SCRIPT_DIR / "Store.py", ["--help"], 150),
+    (SCRIPT_DIR / "Archive.py", ["--help"], 150),
+    (SCRIPT_DIR / "Screening.py", ["--help"], 150),
+    (SCRIPT_DIR / "Interlab.py", ["--help"], 100),
+    (SCRIPT_DIR / "Bootstrap.py", ["--help"], 100),
+    (SCRIPT_DIR / "Alignment.py", ["--help"], 100),
+    (SCRIPT_DIR / "Deconvolution.py", ["--help"], 100),
+    (SCRIPT_DIR / "Similarity.py", ["--help"], 100),
+    (SCRIPT_DIR / "FunctionalPCA.py", ["--help"], 100),
+    (SCRIPT_DIR / "Cache.py", ["--help"], 100),
+    (SCRIPT_DIR / "Instrument.py", ["--help"], 100),
+    (SCRIPT_DIR / "Synthetic_data.py", ["--help"], 100),
+    (SCRIPT_DIR / "Benchmark.py", ["--help"], 150),
+    (VERIFICATION_DIR / "dynamic_tga.py", ["--help"], 100),
+    (VERIFICATION_DIR / "Master.py", ["--help"], 100),
+]
+
+
+def import_times(script:Path, args):
+    """
+    Cumulative import time (µs) of every top level import when running `script args`,
+    and the names of all imported modules
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(script), *args],
+        cwd=script.parent, capture_output=True, text=True,
+        env=dict(os.environ, MACFP_PROFILE="0"),
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    times, modules = {}, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.add(name.strip())
+        # nested imports are indented below their parent
+        if not name[1:].startswith(" "):
+            times[name.strip()] = int(cumulative)
+    return times, modules
+
+
+def check(script:Path, args, budget_ms:float):
+    times, modules = import_times(script, args)
+    heavy = sorted(m for m in modules if m in HEAVY)
+    assert not heavy, f"{script.name} {' '.join(args)} imports {heavy} at startup"
+    total_ms = sum(times.values()) / 1000
+    slowest = sorted(times.items(), key=lambda t: -t[1])[:5]
+    assert total_ms <= budget_ms * SCALE, (
+        f"{script.name} {' '.join(args)}: imports take {total_ms:.0f} ms, budget {budget_ms * SCALE:.0f} ms "
+        f"(slowest: {', '.join(f'{n} {t / 1000:.0f} ms' for n, t in slowest)})"
+    )
+
+
+@pytest.mark.parametrize("script, args, budget_ms", ENTRY_POINTS, ids=[f"{s.name}" for s, _, _ in ENTRY_POINTS])
+def test_startup(script, args, budget_ms):
+    check(script, args, budget_ms)
+
+
+def test_catalog_query(tmp_path):
+    # a query of the store answers from sqlite alone
+    db_file = tmp_path / "store.sqlite"
+    subprocess.run(
+        [sys.executable, "-c", f"from Store import connect; connect(__import__('pathlib').Path({str(db_file)!r})).close()"],
+        cwd=SCRIPT_DIR, check=True,
+    )
+    check(SCRIPT_DIR / "Store.py", ["--db", str(db_file), "query", "device=TGA", "heating_rate=10K"], 150)
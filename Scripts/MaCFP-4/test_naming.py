@@ -0,0 +1,36 @@
+# metadata of the data files: the store (Store.parse_path) and the analysis (Utils.parse_name)
+#
+#   python -m pytest test_naming.py
+#
+# Institutes and set names of the calibration trees are the keys shared by the store,
+# the archive and the analysis scripts, so both parsers have to agree on them.
+import pytest
+
+from Store import data_files, parse_path
+from Utils import label_def, parse_name
+
+
+def test_store_matches_analysis():
+    files = [p for p in data_files() if parse_path(p)['collection'] == 'Calibration_Data']
+    assert files
+    for path in files:
+        meta, name = parse_path(path), parse_name(path)
+        for field in ('institute', 'device', 'atmosphere', 'heating_rate', 'flux', 'orientation', 'series'):
+            assert meta[field] == name[field], (path.name, field)
+
+
+@pytest.mark.parametrize("path, institute, series", [
+    ("PMMA/Calibration_Data/DBI_Lund/DBI_Lund_TGA_N2_20K_2.csv", "DBI-Lund", "DBI-Lund_PMMA_TGA_N2_20K"),
+    ("PMMA/Calibration_Data/HKPoly/HKPolyU_Cone_25kW_1.CSV", "HKPoly", "HKPoly_PMMA_Cone_25kW_hor"),
+    ("Wood/Calibration_Data/FSRI/FSRI_Wood_TGA_N2_10K_R1.csv", "FSRI", "FSRI_Wood_TGA_N2_10K"),
+])
+def test_store_institutes(path, institute, series):
+    from Utils import PROJECT_ROOT
+    meta = parse_path(PROJECT_ROOT / path)
+    assert (meta['institute'], meta['series']) == (institute, series)
+
+
+def test_label_of_unknown_institute():
+    # e.g. a basis fitted on another material set (FunctionalPCA.labels)
+    label, color = label_def('Not-In-The-Data')
+    assert label == 'Not-In-The-Data' and color == label_def('Not-In-The-Data')[1]
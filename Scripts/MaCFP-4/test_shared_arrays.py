@@ -0,0 +1,84 @@
+# tests of the shared-memory ensembles (SharedArrays.py) and their use by Deconvolution.py
+#
+#   python -m pytest test_shared_arrays.py
+#
+# A published ensemble is read through read-only views in this process and in pool
+# workers, and its block is gone once the parent closes the SharedEnsembles.
+import numpy as np
+import pandas as pd
+import pytest
+
+from multiprocessing import shared_memory
+
+from SharedArrays import SharedEnsembles, attach, map_shared
+
+
+def frame(seed:int=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 1, (50, 3))
+    values[rng.random((50, 3)) < 0.1] = np.nan
+    return pd.DataFrame(values, columns=['x', 'a', 'b'])
+
+
+def sums(views:dict, column:str):
+    # reduction of a worker: sum of the finite values of a column of every view
+    result = {}
+    for name, view in views.items():
+        values, mask = view.column(column)
+        result[name] = float(values[mask].sum())
+    return result
+
+
+def test_views_are_read_only():
+    df = frame()
+    with SharedEnsembles() as shared:
+        descriptor = shared.publish('set', df)
+        assert shared.publish('set', df) is descriptor
+        view = attach(descriptor)
+        np.testing.assert_array_equal(view.values, df.to_numpy())
+        np.testing.assert_array_equal(view.mask, np.isfinite(df.to_numpy()))
+        with pytest.raises(ValueError):
+            view.values[0, 0] = 1
+        values, mask = view.column('b')
+        assert values.base is not None and mask.base is not None
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_map_shared_in_workers(workers):
+    frames = {f'set {i}': frame(i) for i in range(4)}
+    expected = [{name: float(frames[name]['a'].sum()) for name in group}
+                for group in (['set 0', 'set 1'], ['set 2'], ['set 3'])]
+    with SharedEnsembles() as shared:
+        for name, df in frames.items():
+            shared.publish(name, df)
+        result = map_shared(sums, shared, [list(e) for e in expected], 'a', workers=workers)
+    assert [list(r) for r in result] == [list(e) for e in expected]
+    for r, e in zip(result, expected):
+        np.testing.assert_allclose(list(r.values()), list(e.values()), rtol=1e-12)
+
+
+def test_close_unlinks_the_blocks():
+    shared = SharedEnsembles()
+    name = shared.publish('set', frame())['shm']
+    shared.close()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_deconvolution_ensemble_holds_the_curves():
+    # every curve of a TGA set is in its ensemble, on the temperature grid of the set
+    from Deconvolution import ensemble
+    from TGA_functions import TGA_Data, average_tga_series, tga_replicate
+    from Utils import get_series_names, series_paths
+    series = get_series_names(TGA_Data)[0]
+    df = ensemble(series)
+    T = df['Temperature (K)'].to_numpy()
+    curves = {'average': average_tga_series(series).rename(columns={'MLR (1/s)': 'y'})}
+    for path in (p for p in series_paths(series) if p in set(TGA_Data)):
+        curves[path.stem] = tga_replicate(path).rename(columns={'dm/dt': 'y'})
+    assert list(df.columns[:2]) == ['Temperature (K)', 'average'] and set(df.columns[1:]) == set(curves)
+    for name, curve in curves.items():
+        ok = curve['y'].notna().to_numpy()
+        on_grid = np.isin(T, curve['Temperature (K)'].to_numpy()[ok])
+        np.testing.assert_array_equal(df[name].to_numpy()[on_grid], curve['y'].to_numpy()[ok])
+        assert df[name][~on_grid].isna().all()
@@ -0,0 +1,225 @@
+# regression tests of the ensemble statistics (Streaming.py, Interlab.py, Bootstrap.py)
+#
+#   python -m pytest test_statistics.py
+#
+# The published averages are computed by GridStatistics instead of the outer merge of
+# the replicates with a centered rolling window; the reference implementations below
+# are the previous code, so a refactor cannot change the averages unnoticed. The
+# critical values of Mandel's h and k are checked against the tables of ISO 5725-2.
+import numpy as np
+import pandas as pd
+import pytest
+
+from Streaming import GridStatistics, combine
+from Interlab import anova, mandel_critical
+from Bootstrap import ratio_ci, percentiles, resample_counts
+
+
+def replicates(count:int=6, seed:int=0):
+    # replicates on overlapping parts of a grid of step 0.5, with gaps (NaN)
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(count):
+        start, stop = rng.integers(0, 40), rng.integers(160, 200)
+        x = np.arange(start, stop) * 0.5
+        y = np.sin(x / 10) + rng.normal(0, 0.1, len(x))
+        y[rng.random(len(x)) < 0.05] = np.nan
+        frames.append(pd.DataFrame({'Temperature (K)': x, 'mass': y}))
+    return frames
+
+
+def rolling_merge(frames, n:int=2, key:str='Temperature (K)', column:str='mass'):
+    # average and uncertainty of the outer merge of the replicates (before Streaming.py)
+    merged_df = frames[0]
+    for df in frames[1:]:
+        merged_df = pd.merge(merged_df, df, on=key, how='outer',
+                             suffixes=('', f' {len(merged_df.columns)}'))
+    merged_df = merged_df.sort_values(key, ignore_index=True)
+    cols = merged_df.filter(regex=f'^{column}', axis=1).columns
+    rolling = merged_df[cols].rolling(2*n+1, min_periods=1, center=True)
+    cnt = rolling.count().sum(axis=1)
+    average = rolling.sum().sum(axis=1) / cnt
+    diff = merged_df[cols].sub(average, axis=0)**2
+    sum_diff = diff.rolling(2*n+1, min_periods=1, center=True).sum().sum(axis=1)
+    return merged_df, average.to_numpy(), np.sqrt(sum_diff/(cnt*(cnt-1))).to_numpy()
+
+
+def accumulate(frames, capacity=None):
+    stats = GridStatistics('Temperature (K)', 0.5, capacity)
+    for df in frames:
+        stats.add(df['Temperature (K)'], {'mass': df['mass']})
+    return stats
+
+
+def test_smoothed_matches_rolling_merge():
+    frames = replicates()
+    merged_df, average, unc = rolling_merge(frames)
+    stats = accumulate(frames)
+    np.testing.assert_array_equal(stats.grid(), merged_df['Temperature (K)'])
+    avg, u = stats.smoothed('mass', 2)
+    np.testing.assert_allclose(avg, average, rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(u, unc, rtol=1e-9, atol=1e-15)
+
+
+@pytest.mark.parametrize("series", ["Wood_Cone_50kW_hor", "Wood_Cone_25kW_hor"])
+def test_cone_average_matches_rolling_merge(series):
+    # published cone averages (all institutes) against the outer merge of the replicates
+    from Cone_functions import Cone_columns, average_cone_series, cone_paths
+    from Readers import stream_resample
+    frames = [stream_resample(p, 'Time (s)', 1, Cone_columns)[['Time (s)', 'HRR (kW/m2)']]
+              for p in cone_paths(series)]
+    merged_df, average, unc = rolling_merge(frames, key='Time (s)', column='HRR')
+    df = average_cone_series(series)
+    np.testing.assert_array_equal(df['Time (s)'], merged_df['Time (s)'])
+    np.testing.assert_allclose(df['HRR (kW/m2)'], average, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(df['unc HRR (kW/m2)'], unc, rtol=1e-9, atol=1e-9)
+
+
+def test_pointwise_matches_row_statistics():
+    frames = replicates()
+    merged_df, _, _ = rolling_merge(frames)
+    values = merged_df.filter(regex=r'^mass')
+    mean, std = accumulate(frames).pointwise('mass')
+    np.testing.assert_allclose(mean, values.mean(axis=1), rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(std, values.std(axis=1, ddof=0), rtol=1e-9, atol=1e-15)
+
+
+def test_merge_equals_single_pass():
+    frames = replicates(9)
+    whole = accumulate(frames, capacity=4)
+    parts = combine([accumulate(frames[i::3], capacity=4) for i in range(3)])
+    np.testing.assert_array_equal(parts.grid(), whole.grid())
+    for a, b in zip(parts.smoothed('mass'), whole.smoothed('mass')):
+        np.testing.assert_allclose(a, b, rtol=1e-12, atol=1e-15)
+    for a, b in zip(parts.pointwise('mass'), whole.pointwise('mass')):
+        np.testing.assert_allclose(a, b, rtol=1e-12, atol=1e-15)
+
+
+def test_combine_keeps_the_parts():
+    # a part can be pooled again (e.g. one institute in several cross-institute pools)
+    frames = replicates(6)
+    parts = [accumulate(frames[i::2], capacity=4) for i in range(2)]
+    before = [(p.grid(), *p.pointwise('mass'), p.quantiles('mass', [0.5])) for p in parts]
+    pooled = combine(parts)
+    assert pooled is not parts[0]
+    for part, arrays in zip(parts, before):
+        for a, b in zip((part.grid(), *part.pointwise('mass'), part.quantiles('mass', [0.5])), arrays):
+            np.testing.assert_array_equal(a, b)
+    for a, b in zip(combine(parts).smoothed('mass'), pooled.smoothed('mass')):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_merge_of_different_grids():
+    with pytest.raises(ValueError):
+        GridStatistics('Time (s)', 1).add([0, 1], {'HRR': [1, 2]}).merge(
+            GridStatistics('Time (s)', 0.5).add([0, 0.5], {'HRR': [1, 2]}))
+
+
+def test_off_grid_values():
+    with pytest.raises(ValueError):
+        GridStatistics('Time (s)', 1).add([0, 1.5], {'HRR': [1, 2]})
+
+
+def test_quantiles_exact_up_to_capacity():
+    frames = replicates(8)
+    merged_df, _, _ = rolling_merge(frames)
+    values = merged_df.filter(regex=r'^mass').to_numpy()
+    q = [0.05, 0.25, 0.5, 0.75, 0.95]
+    result = accumulate(frames, capacity=10).quantiles('mass', q)
+    with np.errstate(invalid='ignore'):
+        expected = np.nanquantile(values, q, axis=1, method='hazen').T
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-15)
+
+
+def test_quantiles_of_compacted_sketch():
+    # 2000 samples per grid point in a sketch of 50 centroids
+    rng = np.random.default_rng(1)
+    stats = GridStatistics('Time (s)', 1, capacity=50)
+    samples = rng.normal(0, 1, (3, 2000))
+    for column in samples.T:
+        stats.add([0, 1, 2], {'HRR': column})
+    q = [0.05, 0.25, 0.5, 0.75, 0.95]
+    np.testing.assert_allclose(stats.quantiles('HRR', q), np.quantile(samples, q, axis=1).T, atol=0.05)
+
+
+# ISO 5725-2, tables 6 and 7: h and k at 1 % and 5 % for p laboratories (k: n = 2 and 3)
+ISO_H = {3: (1.15, 1.15), 4: (1.49, 1.42), 5: (1.72, 1.57), 6: (1.87, 1.66), 8: (2.06, 1.75), 10: (2.18, 1.80)}
+ISO_K = {
+    2: {3: (1.71, 1.65), 4: (1.92, 1.76), 5: (2.05, 1.81), 6: (2.14, 1.85), 8: (2.26, 1.88), 10: (2.32, 1.90)},
+    3: {3: (1.64, 1.53), 4: (1.77, 1.59), 5: (1.85, 1.62), 6: (1.90, 1.64), 8: (1.96, 1.67), 10: (2.00, 1.68)},
+}
+
+
+@pytest.mark.parametrize("labs", sorted(ISO_H))
+def test_mandel_critical_values(labs):
+    for n, table in ISO_K.items():
+        for alpha, h_table, k_table in zip((0.01, 0.05), ISO_H[labs], table[labs]):
+            h, k = mandel_critical(labs, n, alpha)
+            assert abs(h - h_table) <= 0.0051 and abs(k - k_table) <= 0.0051, (labs, n, alpha, h, k)
+
+
+def test_anova_matches_iso_formulas():
+    # unbalanced design, replicates of every laboratory directly
+    rng = np.random.default_rng(2)
+    data = [rng.normal(10 + rng.normal(0, 1), 0.5, n) for n in (3, 4, 2, 5, 3)]
+    n = np.array([len(d) for d in data])
+    mean = np.array([d.mean() for d in data])
+    m2 = np.array([((d - d.mean())**2).sum() for d in data])
+    result = anova(n, mean, m2)
+
+    p, N = len(data), n.sum()
+    s_r2 = sum(((d - d.mean())**2).sum() for d in data) / (N - p)
+    grand = np.concatenate(data).mean()
+    s_d2 = (n * (mean - grand)**2).sum() / (p - 1)
+    n_bar = (N - (n**2).sum() / N) / (p - 1)
+    s_L2 = max((s_d2 - s_r2) / n_bar, 0)
+    s = np.array([d.std(ddof=1) for d in data])
+    assert result['labs'] == p
+    np.testing.assert_allclose(result['mean'], grand)
+    np.testing.assert_allclose(result['s_r'], np.sqrt(s_r2))
+    np.testing.assert_allclose(result['s_L'], np.sqrt(s_L2))
+    np.testing.assert_allclose(result['s_R'], np.sqrt(s_r2 + s_L2))
+    np.testing.assert_allclose(result['h'], (mean - mean.mean()) / mean.std(ddof=1))
+    np.testing.assert_allclose(result['k'], s / np.sqrt((s**2).mean()))
+
+
+def test_anova_vectorized_with_missing_laboratories():
+    # the ANOVA of each column equals that of its laboratories with data alone
+    rng = np.random.default_rng(3)
+    n = rng.integers(0, 5, (6, 4)).astype(float)
+    mean, m2 = rng.normal(0, 1, (6, 4)), rng.random((6, 4)) * np.maximum(n - 1, 0)
+    result = anova(n, mean, m2)
+    for j in range(4):
+        has = n[:, j] > 0
+        column = anova(n[has, j], mean[has, j], m2[has, j])
+        for name in ('labs', 'mean', 's_r', 's_L', 's_R'):
+            np.testing.assert_allclose(result[name][j], column[name], equal_nan=True)
+        np.testing.assert_allclose(result['h'][has, j], column['h'], equal_nan=True)
+        assert np.isnan(result['h'][~has, j]).all()
+
+
+def test_ratio_ci_matches_loop_over_samples():
+    rng = np.random.default_rng(4)
+    numerator, denominator = rng.normal(5, 1, (7, 30)), rng.integers(1, 4, (7, 30)).astype(float)
+    numerator[2, 5], denominator[2, 5] = 0, 0   # no value of a replicate
+    counts = resample_counts(7, 500, seed=1)
+    low, high = ratio_ci(counts, numerator, denominator, 0.9)
+    estimates = np.array([(c @ numerator) / (c @ denominator) for c in counts])
+    np.testing.assert_allclose(low, np.percentile(estimates, 5, axis=0), rtol=1e-12)
+    np.testing.assert_allclose(high, np.percentile(estimates, 95, axis=0), rtol=1e-12)
+    # processed in blocks of a few points
+    for a, b in zip(ratio_ci(counts, numerator, denominator, 0.9, max_elements=1000), (low, high)):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_resample_counts():
+    counts = resample_counts(5, 100, seed=7)
+    assert counts.shape == (100, 5) and (counts.sum(axis=1) == 5).all()
+    np.testing.assert_array_equal(counts, resample_counts(5, 100, seed=7))
+
+
+def test_percentiles_without_nan():
+    samples = np.array([[1.0, np.nan], [3.0, np.nan], [np.nan, np.nan], [2.0, 4.0]])
+    low, high = percentiles(samples, (0.25, 0.75))
+    np.testing.assert_allclose(low, [1.5, 4.0])
+    np.testing.assert_allclose(high, [2.5, 4.0])
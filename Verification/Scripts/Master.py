@@ -5,10 +5,9 @@ Master script to run verification cases
 """
 
 import subprocess
+import sys
 import argparse
 import json
-import numpy as np
-import matplotlib.pyplot as     plt
 
 # create the parser
 parser = argparse.ArgumentParser()
@@ -51,18 +50,22 @@ matl_set_list = [
 if args.compare_all is True or args.generate_all_fds is True:
     error_list = []
     if args.compare_all is True:
+        # in this process: numpy, pandas, scipy and matplotlib are loaded once, not once per set
+        from dynamic_tga import run
         for matl_set in matl_set_list:
             try:
-                subprocess.run(["python", "dynamic_tga" + ".py", str(matl_set), str(2021),"-co"])
-            except:
-                pass
+                run(str(matl_set), str(2021), True)
+            except Exception as e:
+                print("error running", matl_set, e)
     if args.generate_all_fds is True:
         for matl_set in matl_set_list:
             try:
-                subprocess.run(["python","testing"+".py",str(matl_set)])
+                subprocess.run([sys.executable,"testing"+".py",str(matl_set)])
             except:
                 pass
             
+import numpy as np
+
 with open('comparison_data.json','r') as file:
             data = json.load(file)
 #print(data)
@@ -6,37 +6,20 @@ using the solution from Coheur et al., J Mater Sci, 2021
 
 import json
 import csv
-import numpy             as     np
-import matplotlib.pyplot as     plt
-import pandas            as     pd
-from   scipy.special     import expi
 import argparse
-from   mpmath            import mp, findroot
+
+# numpy, pandas, scipy and matplotlib are imported in run(), so that --help
+# answers at once and Master.py can import this module cheaply
 
 # constants
 R       = 8.314     # gas constant, J/mol-K
 beta    = 10/60     # heating rate, K/s
 
-# create the parser
-parser  = argparse.ArgumentParser()
-
-# add arguments
-parser.add_argument('matl_set')
-parser.add_argument('matl_set_year')
-
-# ONLY WORKS WITH MASTER.py (maybe clean up...) compare argument must come from Master.py
-parser.add_argument('--compare_all', "-co", action = "store_true")
-
-# parse arguments
-args          = parser.parse_args()
-
-matl_set      = args.matl_set
-matl_set_year = args.matl_set_year
-
-# only for MASTER.py
-compare = args.compare_all
-
 def run(matl_set, matl_set_year, compare_all_boolean):
+    import numpy             as     np
+    import matplotlib.pyplot as     plt
+    import pandas            as     pd
+    from   scipy.special     import expi
     
     # retrieve kinetic values for given material property set
     json_file_path  = ( '../../PMMA/Material_Properties/' + str(matl_set_year)  
@@ -127,6 +110,7 @@ def run(matl_set, matl_set_year, compare_all_boolean):
     #                 f_z        = (1 - n_i)
     #                 B_z        = (A / beta) * T_0 * np.exp( - E / (R * T_0) ) + expi( - E / (R * T_0)) * \
     #                              (A * E) / (beta * R)
+    #                 from mpmath import mp, findroot
     #                 # set the number of significant figures for the solution to the non-linear equation to 50
     #                 mp.dps = 50
     #                 # solves the non-linear equation for alpha
@@ -150,12 +134,33 @@ def run(matl_set, matl_set_year, compare_all_boolean):
     #     
     # rms_err           = plot_and_rms(total_mass, n_reactions,T_m, m_m, N, compare,A,E)
     rms_err = 1
+    plt.figure()
     plt.plot(T_m, alpha)
     plt.show()
 
     return rms_err
 
-run(matl_set, matl_set_year, compare)
+if __name__ == "__main__":
+    # create the parser
+    parser  = argparse.ArgumentParser()
+
+    # add arguments
+    parser.add_argument('matl_set')
+    parser.add_argument('matl_set_year')
+
+    # ONLY WORKS WITH MASTER.py (maybe clean up...) compare argument must come from Master.py
+    parser.add_argument('--compare_all', "-co", action = "store_true")
+
+    # parse arguments
+    args          = parser.parse_args()
+
+    matl_set      = args.matl_set
+    matl_set_year = args.matl_set_year
+
+    # only for MASTER.py
+    compare = args.compare_all
+
+    run(matl_set, matl_set_year, compare)
 
 #      
 # def plot_and_rms(total_mass, n_reactions, T_m, m_m, N, compare,A,E):